@@ -0,0 +1,83 @@
+import bisect
+import ipaddress
+import os
+import threading
+from collections.abc import Iterable
+
+IPNetwork = ipaddress.IPv4Network | ipaddress.IPv6Network
+
+
+def parse_address_list(lines: Iterable[str]) -> list[IPNetwork]:
+    networks: list[IPNetwork] = []
+    for line in lines:
+        entry = line.strip()
+        if not entry:
+            raise ValueError("Rate limit address list contains a blank line")
+        networks.append(ipaddress.ip_network(entry, strict=False))
+    return networks
+
+
+class AddressMatcher:
+    def __init__(self, networks: Iterable[IPNetwork]) -> None:
+        self.size = 0
+        ranges: dict[int, list[tuple[int, int]]] = {4: [], 6: []}
+        for network in networks:
+            ranges[network.version].append(
+                (int(network.network_address), int(network.broadcast_address))
+            )
+            self.size += 1
+        self._starts: dict[int, list[int]] = {}
+        self._ends: dict[int, list[int]] = {}
+        for version, intervals in ranges.items():
+            merged: list[tuple[int, int]] = []
+            for start, end in sorted(intervals):
+                if merged and start <= merged[-1][1] + 1:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+                else:
+                    merged.append((start, end))
+            self._starts[version] = [start for start, _ in merged]
+            self._ends[version] = [end for _, end in merged]
+
+    def __contains__(self, address: str) -> bool:
+        if not self.size:
+            return False
+        try:
+            parsed = ipaddress.ip_address(address)
+        except ValueError:
+            # X-Forwarded-For is client-controlled and may hold anything
+            return False
+        if parsed.version == 6 and parsed.ipv4_mapped is not None:
+            parsed = parsed.ipv4_mapped
+        value = int(parsed)
+        starts = self._starts[parsed.version]
+        index = bisect.bisect_right(starts, value) - 1
+        return index >= 0 and value <= self._ends[parsed.version][index]
+
+
+class AddressListFile:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.reloads = 0
+        self._matcher = AddressMatcher(())
+        self._identity: tuple[int, int, int, int] | None = None
+        self._lock = threading.Lock()
+
+    def matcher(self) -> AddressMatcher:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            identity = None
+        else:
+            identity = (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if identity == self._identity:
+            return self._matcher
+        with self._lock:
+            if identity != self._identity:
+                if identity is None:
+                    self._matcher = AddressMatcher(())
+                else:
+                    with open(self.path, "r", encoding="utf-8") as handle:
+                        self._matcher = AddressMatcher(parse_address_list(handle))
+                self._identity = identity
+                self.reloads += 1
+            return self._matcher
@@ -0,0 +1,1066 @@
+import asyncio
+import os
+import re
+import time
+from collections.abc import AsyncGenerator, Awaitable, Callable, Iterator
+from contextlib import aclosing, contextmanager
+from dataclasses import dataclass, field
+from urllib.parse import parse_qsl
+
+from limits import RateLimitItem
+from limits.storage import storage_from_string
+from limits.strategies import STRATEGIES, RateLimiter
+from werkzeug.datastructures import Headers, MultiDict
+from werkzeug.http import is_resource_modified
+
+from backend import (
+    CONTENT_SECURITY_POLICY,
+    CORS_ALLOWED_METHODS,
+    COVERART_MAX_HOPS,
+    IMAGE_CACHE_CONTROL,
+    IMAGE_FALLBACK_CACHE_CONTROL,
+    IMAGE_STREAM_CHUNK_BYTES,
+    MAX_REQUEST_BODY_BYTES,
+    RATE_LIMIT_STORAGE_URI,
+    RATE_LIMIT_STRATEGY,
+    RESPONSE_CACHE_POLICIES,
+    THUMBNAIL_FORMATS,
+    UPSTREAM_JSON_CHUNK_BYTES,
+    UPSTREAM_RATE_LIMIT,
+    ImageSource,
+    accel_image_headers,
+    cached_image_validators,
+    check_upstream_json_size,
+    client_address_from_headers,
+    coverart_image_path,
+    coverart_image_source,
+    coverart_metadata_path,
+    coverart_redirect,
+    coverart_resolution,
+    coverart_resolution_key,
+    gamesdb_image_source,
+    get_image_cache,
+    get_metrics,
+    get_redirect_cache,
+    get_response_cache,
+    get_thumbnail_renderer,
+    get_upstream_scheduler,
+    googlebooks_image_params,
+    googlebooks_image_source,
+    image_fill_metadata,
+    image_variant_key,
+    is_internal_address,
+    is_rate_limit_exempt_address,
+    is_share_view,
+    is_upstream_image_unchanged,
+    record_share_view_image,
+    requested_image_variant,
+    trusted_address_from_headers,
+    upstream_error,
+    upstream_image_headers,
+    upstream_json_content_type,
+    upstream_scheduler_stats,
+    upstream_was_called,
+    with_upstream_key,
+)
+from imagecache import CachedImage, ImageCacheFill
+from jsoncodec import is_json_content_type, json_dumps, json_loads
+from redirectcache import ResolvedLocation
+from responsecache import CachedResponse, response_cache_key
+from searchfanout import (
+    SEARCH_CONTENT_TYPE,
+    SearchFanout,
+    SearchSource,
+    parse_search_query,
+    parse_search_sources,
+    search_failure,
+    search_outcome,
+)
+from upstream import (
+    aiohttp,
+    async_upstream_session,
+    close_async_upstream_sessions,
+    finish_upstream_request,
+    start_upstream_request,
+    upstream_breaker_stats,
+    upstream_url,
+)
+from upstreamscheduler import PRIORITY_HEADER, PRIORITY_INTERACTIVE, request_priority
+
+
+@dataclass
+class AsyncRequest:
+    method: str
+    path: str
+    args: MultiDict
+    headers: Headers
+    client_address: str | None
+    body: bytes = b""
+    trusted_address: str | None = None
+
+    def conditional_environ(self) -> dict[str, str]:
+        environ = {"REQUEST_METHOD": self.method}
+        for name in ("If-None-Match", "If-Modified-Since"):
+            if name in self.headers:
+                environ[f"HTTP_{name.upper().replace('-', '_')}"] = self.headers[name]
+        return environ
+
+    def conditional_headers(self) -> dict[str, str]:
+        return {
+            name: self.headers[name]
+            for name in ("If-None-Match", "If-Modified-Since")
+            if name in self.headers
+        }
+
+
+@dataclass
+class AsyncResponse:
+    status: int
+    body: bytes | AsyncGenerator[bytes] = b""
+    headers: dict[str, str] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class Route:
+    pattern: re.Pattern
+    methods: frozenset[str]
+    handler: Callable[[AsyncRequest, re.Match], Awaitable[AsyncResponse]]
+    rate_limit: RateLimitItem | None = None
+    deduct_on_cache_hit: bool = True
+
+
+AsyncImageFetch = Callable[[dict[str, str]], Awaitable[aiohttp.ClientResponse]]
+
+
+def json_response(data: object, status: int = 200) -> AsyncResponse:
+    return AsyncResponse(
+        status,
+        json_dumps(data),
+        {"Content-Type": "application/json"},
+    )
+
+
+def text_response(text: str, status: int) -> AsyncResponse:
+    return AsyncResponse(
+        status, text.encode("utf-8"), {"Content-Type": "text/html; charset=utf-8"}
+    )
+
+
+# Rate limits are keyed by client address, so a request without one is refused
+def missing_address_response() -> AsyncResponse:
+    return json_response({"error": "Client address is required"}, 400)
+
+
+_RATE_LIMITER: RateLimiter | None = None
+_IN_FLIGHT = 0
+_PEAK_IN_FLIGHT = 0
+_SEARCH_TASKS: set[asyncio.Task] = set()
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _RATE_LIMITER
+    if _RATE_LIMITER is None:
+        _RATE_LIMITER = STRATEGIES[RATE_LIMIT_STRATEGY](
+            storage_from_string(RATE_LIMIT_STORAGE_URI)
+        )
+    return _RATE_LIMITER
+
+
+@contextmanager
+def translate_upstream_errors() -> Iterator[None]:
+    try:
+        yield
+    except TimeoutError:
+        raise
+    except aiohttp.ClientError as exc:
+        raise ConnectionError(str(exc)) from exc
+
+
+async def open_upstream(
+    provider: str,
+    method: str,
+    url: str,
+    params: dict[str, str | None] | None = None,
+    headers: dict[str, str] | None = None,
+    body: bytes | None = None,
+    allow_redirects: bool = False,
+) -> aiohttp.ClientResponse:
+    session = async_upstream_session(provider)
+    probe = start_upstream_request(provider)
+    started = time.perf_counter()
+    status = "error"
+    try:
+        with translate_upstream_errors():
+            resp = await session.request(
+                method,
+                url,
+                params={
+                    name: value
+                    for name, value in (params or {}).items()
+                    if value is not None
+                },
+                headers=headers,
+                data=body,
+                allow_redirects=allow_redirects,
+            )
+        status = str(resp.status)
+        return resp
+    except TimeoutError:
+        status = "timeout"
+        raise
+    finally:
+        finish_upstream_request(provider, status, time.perf_counter() - started, probe)
+
+
+async def read_upstream(
+    provider: str,
+    method: str,
+    url: str,
+    params: dict[str, str | None] | None = None,
+) -> tuple[aiohttp.ClientResponse, bytes]:
+    resp = await open_upstream(provider, method, url, params)
+    try:
+        with translate_upstream_errors():
+            return resp, await resp.read()
+    finally:
+        resp.release()
+
+
+async def read_upstream_json(resp: aiohttp.ClientResponse) -> tuple[int, bytes, str]:
+    chunks = []
+    size = 0
+    try:
+        check_upstream_json_size(int(resp.headers.get("Content-Length") or 0))
+        with translate_upstream_errors():
+            async for chunk in resp.content.iter_chunked(UPSTREAM_JSON_CHUNK_BYTES):
+                size += len(chunk)
+                check_upstream_json_size(size)
+                chunks.append(chunk)
+    except BaseException:
+        resp.close()
+        raise
+    resp.release()
+    body = b"".join(chunks)
+    return (
+        resp.status,
+        body,
+        upstream_json_content_type(resp.headers.get("Content-Type"), body),
+    )
+
+
+async def stream_upstream_json(resp: aiohttp.ClientResponse) -> AsyncResponse:
+    content_type = resp.headers.get("Content-Type")
+    if not content_type or not is_json_content_type(content_type):
+        status, body, content_type = await read_upstream_json(resp)
+        return AsyncResponse(status, body, {"Content-Type": content_type})
+    try:
+        check_upstream_json_size(int(resp.headers.get("Content-Length") or 0))
+    except ValueError:
+        resp.close()
+        raise
+
+    async def generate() -> AsyncGenerator[bytes]:
+        size = 0
+        try:
+            async for chunk in resp.content.iter_chunked(UPSTREAM_JSON_CHUNK_BYTES):
+                size += len(chunk)
+                check_upstream_json_size(size)
+                yield chunk
+            resp.release()
+        finally:
+            resp.close()
+
+    return AsyncResponse(resp.status, generate(), {"Content-Type": content_type})
+
+
+def upstream_error_response(exc: OSError) -> AsyncResponse:
+    body, status, headers = upstream_error(exc)
+    response = json_response(body, status)
+    response.headers.update(headers)
+    return response
+
+
+async def json_upstream_errors(call: Awaitable[AsyncResponse]) -> AsyncResponse:
+    try:
+        return await call
+    except (TimeoutError, ConnectionError) as exc:
+        return upstream_error_response(exc)
+    except ValueError as exc:
+        return json_response({"error": str(exc)}, 502)
+
+
+async def fetch_cached_upstream(
+    provider: str,
+    path: str,
+    params: dict[str, str | None],
+    priority: int = PRIORITY_INTERACTIVE,
+) -> tuple[CachedResponse, str]:
+    async def load() -> tuple[int, bytes, str]:
+        scheduler = get_upstream_scheduler(provider)
+        if scheduler is not None:
+            await scheduler.acquire_async(priority)
+        return await read_upstream_json(
+            await open_upstream(
+                provider, "GET", upstream_url(provider, path), params=params
+            )
+        )
+
+    return await get_response_cache().fetch_async(
+        response_cache_key(provider, path, params),
+        provider,
+        RESPONSE_CACHE_POLICIES[provider],
+        load,
+    )
+
+
+async def cached_upstream_response(
+    provider: str,
+    path: str,
+    params: dict[str, str | None],
+    priority: int = PRIORITY_INTERACTIVE,
+) -> AsyncResponse:
+    entry, state = await fetch_cached_upstream(provider, path, params, priority)
+    return AsyncResponse(
+        entry.status,
+        entry.body,
+        {"Content-Type": entry.content_type, "X-Cache": state},
+    )
+
+
+async def resolve_coverart(path: str, with_body: bool) -> tuple[ResolvedLocation, str]:
+    cache = get_redirect_cache()
+    key = coverart_resolution_key(path, with_body)
+    entry = await asyncio.to_thread(cache.get, key)
+    if entry is not None:
+        return entry, "HIT"
+    url = upstream_url("coverart", path)
+    for _ in range(COVERART_MAX_HOPS):
+        resp, body = await read_upstream(
+            "coverart", "GET" if with_body else "HEAD", url
+        )
+        next_url = coverart_redirect(url, resp.status, resp.headers.get("Location"))
+        if next_url is not None:
+            url = next_url
+            continue
+        status, body, ttl = coverart_resolution(
+            resp.status,
+            resp.headers.get("Content-Type", ""),
+            body if with_body else None,
+        )
+        entry = await asyncio.to_thread(
+            cache.put, key, status, url if status == 200 else None, body, ttl
+        )
+        return entry, "MISS"
+    return ResolvedLocation(404, None, None, 0), "MISS"
+
+
+async def stream_upstream_image(
+    request: AsyncRequest,
+    resp: aiohttp.ClientResponse,
+    fill: ImageCacheFill | None = None,
+) -> AsyncResponse:
+    headers = upstream_image_headers(resp.headers)
+    if is_upstream_image_unchanged(
+        resp.status, resp.headers, request.conditional_environ()
+    ):
+        resp.close()
+        if fill is not None:
+            fill.abort()
+        headers.pop("Content-Length", None)
+        return AsyncResponse(304, b"", headers)
+
+    async def generate() -> AsyncGenerator[bytes]:
+        pending = fill
+        try:
+            async for chunk in resp.content.iter_chunked(IMAGE_STREAM_CHUNK_BYTES):
+                if pending is not None:
+                    pending.write(chunk)
+                yield chunk
+            resp.release()
+            if pending is not None:
+                await asyncio.to_thread(pending.commit)
+                pending = None
+        finally:
+            if pending is not None:
+                pending.abort()
+            resp.close()
+
+    return AsyncResponse(resp.status, generate(), headers)
+
+
+def send_cached_image(
+    request: AsyncRequest, entry: CachedImage
+) -> AsyncResponse | None:
+    if entry.status == 404:
+        return text_response("Not found", 404)
+    headers = accel_image_headers(entry)
+    if headers is not None:
+        return AsyncResponse(200, b"", headers)
+    try:
+        stat = os.stat(entry.path)
+    except FileNotFoundError:
+        return None
+    etag, last_modified = cached_image_validators(entry, stat)
+    headers = {
+        "Content-Type": entry.content_type,
+        "ETag": f'"{etag}"',
+        "Last-Modified": last_modified,
+        "Cache-Control": IMAGE_CACHE_CONTROL,
+    }
+    if not is_resource_modified(
+        request.conditional_environ(), etag=etag, last_modified=last_modified
+    ):
+        return AsyncResponse(304, b"", headers)
+    headers["Content-Length"] = str(stat.st_size)
+
+    async def generate() -> AsyncGenerator[bytes]:
+        handle = await asyncio.to_thread(open, entry.path, "rb")
+        with handle:
+            while chunk := await asyncio.to_thread(
+                handle.read, IMAGE_STREAM_CHUNK_BYTES
+            ):
+                yield chunk
+
+    return AsyncResponse(200, generate(), headers)
+
+
+async def proxy_cached_image(
+    request: AsyncRequest, key: str, fetch: AsyncImageFetch
+) -> AsyncResponse:
+    cache = get_image_cache()
+    if cache is None:
+        return await stream_upstream_image(
+            request, await fetch(request.conditional_headers())
+        )
+
+    entry = await asyncio.to_thread(cache.get, key)
+    if entry is not None:
+        response = send_cached_image(request, entry)
+        if response is not None:
+            return response
+        await asyncio.to_thread(cache.forget, key)
+
+    resp = await fetch({})
+    if resp.status == 404:
+        resp.close()
+        await asyncio.to_thread(cache.remember_missing, key)
+        return text_response("Not found", 404)
+    if resp.status != 200:
+        return await stream_upstream_image(request, resp)
+    fill = cache.open_fill(key, *image_fill_metadata(resp.headers))
+    return await stream_upstream_image(request, resp, fill)
+
+
+def read_cached_file(path: str) -> bytes:
+    with open(path, "rb") as handle:
+        return handle.read()
+
+
+async def load_source_image(key: str, fetch: AsyncImageFetch) -> tuple[int, bytes, str]:
+    cache = get_image_cache()
+    if cache is not None:
+        entry = await asyncio.to_thread(cache.get, key)
+        if entry is not None and entry.status == 404:
+            return 404, b"", ""
+        if entry is not None:
+            try:
+                body = await asyncio.to_thread(read_cached_file, entry.path)
+                return 200, body, entry.content_type
+            except FileNotFoundError:
+                await asyncio.to_thread(cache.forget, key)
+
+    resp = await fetch({})
+    try:
+        if resp.status != 200:
+            if resp.status == 404 and cache is not None:
+                await asyncio.to_thread(cache.remember_missing, key)
+            return resp.status, b"", ""
+        with translate_upstream_errors():
+            body = await resp.read()
+        metadata = image_fill_metadata(resp.headers)
+        if cache is not None:
+            await asyncio.to_thread(cache.put, key, *metadata, body)
+        return 200, body, metadata[0]
+    finally:
+        resp.release()
+
+
+async def proxy_image_variant(
+    request: AsyncRequest,
+    key: str,
+    fetch: AsyncImageFetch,
+    width: int,
+    image_format: str,
+) -> AsyncResponse:
+    cache = get_image_cache()
+    variant_key = image_variant_key(key, width, image_format)
+    if cache is not None:
+        entry = await asyncio.to_thread(cache.get, variant_key)
+        if entry is not None:
+            response = send_cached_image(request, entry)
+            if response is not None:
+                response.headers["Vary"] = "Accept"
+                return response
+            await asyncio.to_thread(cache.forget, variant_key)
+
+    status, source, content_type = await load_source_image(key, fetch)
+    if status == 404:
+        return text_response("Not found", 404)
+    if status != 200:
+        return json_response({"error": "Cover image unavailable"}, 502)
+
+    variant = await asyncio.to_thread(
+        get_thumbnail_renderer().render, source, width, image_format
+    )
+    if variant is None:
+        return AsyncResponse(
+            200,
+            source,
+            {
+                "Content-Type": content_type,
+                "Cache-Control": IMAGE_FALLBACK_CACHE_CONTROL,
+                "Vary": "Accept",
+            },
+        )
+
+    mimetype = THUMBNAIL_FORMATS[image_format][1]
+    if cache is not None:
+        await asyncio.to_thread(cache.put, variant_key, mimetype, None, None, variant)
+    return AsyncResponse(
+        200,
+        variant,
+        {
+            "Content-Type": mimetype,
+            "Cache-Control": IMAGE_CACHE_CONTROL,
+            "Vary": "Accept",
+        },
+    )
+
+
+async def open_image_source(
+    source: ImageSource, headers: dict[str, str]
+) -> aiohttp.ClientResponse:
+    location = None
+    if source.resolve_location:
+        location = (await resolve_coverart(source.path, with_body=False))[0].location
+    resp = await open_upstream(
+        source.provider,
+        "GET",
+        location or upstream_url(source.provider, source.path),
+        params=source.params,
+        headers=headers,
+        allow_redirects=True,
+    )
+    if location and resp.status >= 400:
+        await asyncio.to_thread(
+            get_redirect_cache().forget,
+            coverart_resolution_key(source.path, with_body=False),
+        )
+    return resp
+
+
+async def proxy_image(request: AsyncRequest, source: ImageSource) -> AsyncResponse:
+    fetched = False
+
+    async def fetch_upstream(headers: dict[str, str]) -> aiohttp.ClientResponse:
+        nonlocal fetched
+        fetched = True
+        return await open_image_source(source, headers)
+
+    variant = requested_image_variant(request.args, request.headers)
+    try:
+        if variant is not None:
+            response = await proxy_image_variant(
+                request, source.key, fetch_upstream, *variant
+            )
+        else:
+            response = await proxy_cached_image(request, source.key, fetch_upstream)
+        response.headers["X-Cache"] = "MISS" if fetched else "HIT"
+        return response
+    finally:
+        if is_share_view(request.headers.get("Referer")):
+            record_share_view_image(not fetched)
+
+
+# Proxy TMDB requests
+async def proxy_tmdb(request: AsyncRequest, match: re.Match) -> AsyncResponse:
+    params = with_upstream_key("tmdb", request.args.to_dict())
+    return await json_upstream_errors(
+        cached_upstream_response("tmdb", match["subpath"], params)
+    )
+
+
+# Proxy OpenLibrary requests
+async def proxy_openlibrary(request: AsyncRequest, match: re.Match) -> AsyncResponse:
+    params: dict[str, str | None] = request.args.to_dict()
+    return await json_upstream_errors(
+        cached_upstream_response("openlibrary", match["subpath"], params)
+    )
+
+
+# Proxy GamesDB requests
+async def proxy_gamesdb(request: AsyncRequest, match: re.Match) -> AsyncResponse:
+    subpath = match["subpath"]
+    params = with_upstream_key("gamesdb", request.args.to_dict())
+    if request.method != "POST":
+        return await json_upstream_errors(
+            cached_upstream_response("gamesdb", subpath, params)
+        )
+
+    try:
+        json_loads(request.body)
+    except ValueError:
+        return json_response({"error": "Request body must be valid JSON"}, 400)
+
+    async def post() -> AsyncResponse:
+        return await stream_upstream_json(
+            await open_upstream(
+                "gamesdb",
+                "POST",
+                upstream_url("gamesdb", subpath),
+                params=params,
+                headers={"Content-Type": "application/json"},
+                body=request.body,
+            )
+        )
+
+    return await json_upstream_errors(post())
+
+
+# Proxy MusicBrainz requests, paced to its one request per second
+async def proxy_musicbrainz(request: AsyncRequest, match: re.Match) -> AsyncResponse:
+    params: dict[str, str | None] = {**request.args.to_dict(), "fmt": "json"}
+    priority = request_priority(request.headers.get(PRIORITY_HEADER))
+    return await json_upstream_errors(
+        cached_upstream_response("musicbrainz", match["subpath"], params, priority)
+    )
+
+
+# Proxy iTunes Search requests, paced to its twenty requests per minute
+async def proxy_itunes(request: AsyncRequest, match: re.Match) -> AsyncResponse:
+    params: dict[str, str | None] = request.args.to_dict()
+    priority = request_priority(request.headers.get(PRIORITY_HEADER))
+    return await json_upstream_errors(
+        cached_upstream_response("itunes", match["subpath"], params, priority)
+    )
+
+
+# Proxy GamesDB CDN images
+async def proxy_gamesdb_images(request: AsyncRequest, match: re.Match) -> AsyncResponse:
+    return await json_upstream_errors(
+        proxy_image(request, gamesdb_image_source(match["subpath"]))
+    )
+
+
+async def proxy_coverart_image(request: AsyncRequest, match: re.Match) -> AsyncResponse:
+    try:
+        image_path = coverart_image_path(
+            request.args.get("type"),
+            request.args.get("id"),
+            request.args.get("size", "500"),
+        )
+    except ValueError as exc:
+        return json_response({"error": str(exc)}, 400)
+
+    try:
+        if get_image_cache() is not None or requested_image_variant(
+            request.args, request.headers
+        ):
+            return await proxy_image(request, coverart_image_source(image_path))
+        entry, state = await resolve_coverart(image_path, with_body=False)
+        if entry.location is None:
+            response = text_response("Not found", 404)
+            response.headers["X-Cache"] = state
+            return response
+        return AsyncResponse(307, b"", {"Location": entry.location, "X-Cache": state})
+    except (TimeoutError, ConnectionError) as exc:
+        return upstream_error_response(exc)
+
+
+async def proxy_coverart_metadata(
+    request: AsyncRequest, match: re.Match
+) -> AsyncResponse:
+    try:
+        metadata_path = coverart_metadata_path(
+            request.args.get("type"), request.args.get("id")
+        )
+    except ValueError as exc:
+        return json_response({"error": str(exc)}, 400)
+
+    async def request_metadata() -> AsyncResponse:
+        entry, state = await resolve_coverart(metadata_path, with_body=True)
+        if entry.body is None:
+            response = json_response({"error": "Cover art metadata unavailable"}, 404)
+        else:
+            response = AsyncResponse(
+                entry.status, entry.body, {"Content-Type": "application/json"}
+            )
+        response.headers["X-Cache"] = state
+        return response
+
+    return await json_upstream_errors(request_metadata())
+
+
+async def proxy_googlebooks_image(
+    request: AsyncRequest, match: re.Match
+) -> AsyncResponse:
+    try:
+        params = googlebooks_image_params(
+            request.args.get("id"), request.args.get("zoom", "2")
+        )
+    except ValueError as exc:
+        return json_response({"error": str(exc)}, 400)
+
+    try:
+        return await proxy_image(request, googlebooks_image_source(params))
+    except (TimeoutError, ConnectionError) as exc:
+        return upstream_error_response(exc)
+
+
+async def search_upstream(source: SearchSource, query: str) -> dict:
+    params = with_upstream_key(source.provider, source.params(query))
+    try:
+        entry, state = await fetch_cached_upstream(source.provider, source.path, params)
+    except (TimeoutError, ConnectionError, ValueError) as exc:
+        return search_failure(source, exc)
+    return search_outcome(source, entry.status, entry.body, state)
+
+
+async def stream_search(
+    sources: list[SearchSource], query: str, address: str | None
+) -> AsyncGenerator[bytes]:
+    limiter = get_rate_limiter()
+    fanout: SearchFanout[asyncio.Task[dict]] = SearchFanout()
+    for source in sources:
+        if address is not None and not await asyncio.to_thread(
+            limiter.test, UPSTREAM_RATE_LIMIT, address, source.endpoint
+        ):
+            yield fanout.rate_limited(source)
+            continue
+        task = asyncio.get_running_loop().create_task(search_upstream(source, query))
+        # Late legs keep running and still fill the response cache
+        _SEARCH_TASKS.add(task)
+        task.add_done_callback(_SEARCH_TASKS.discard)
+        fanout.start(task, source)
+
+    while fanout.pending:
+        done, _ = await asyncio.wait(
+            fanout.pending,
+            timeout=fanout.timeout(),
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        for task in done:
+            line, charged = fanout.finish(task, task.result())
+            if address is not None and charged is not None:
+                await asyncio.to_thread(
+                    limiter.hit, UPSTREAM_RATE_LIMIT, address, charged.endpoint
+                )
+            yield line
+        for line, charged in fanout.expire():
+            if address is not None:
+                await asyncio.to_thread(
+                    limiter.hit, UPSTREAM_RATE_LIMIT, address, charged.endpoint
+                )
+            yield line
+    yield fanout.done()
+
+
+# Fan one query out to several providers and stream results as they arrive
+async def search(request: AsyncRequest, match: re.Match) -> AsyncResponse:
+    try:
+        query = parse_search_query(request.args.get("q"))
+        sources = parse_search_sources(request.args.get("sources"))
+    except ValueError as exc:
+        return json_response({"error": str(exc)}, 400)
+    address = request.client_address
+    if not address:
+        return missing_address_response()
+    return AsyncResponse(
+        200,
+        stream_search(
+            sources,
+            query,
+            None if is_rate_limit_exempt_address(address) else address,
+        ),
+        {
+            "Content-Type": SEARCH_CONTENT_TYPE,
+            "Cache-Control": "no-store",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+async def get_stats(request: AsyncRequest, match: re.Match) -> AsyncResponse:
+    if not is_internal_address(request.trusted_address):
+        return json_response({"error": "Not found"}, 404)
+    image_cache = get_image_cache()
+    return json_response(
+        {
+            "pid": os.getpid(),
+            "mode": "asgi",
+            "inFlight": _IN_FLIGHT,
+            "peakInFlight": _PEAK_IN_FLIGHT,
+            "responseCache": await asyncio.to_thread(get_response_cache().stats),
+            "imageCache": (
+                await asyncio.to_thread(image_cache.stats) if image_cache else None
+            ),
+            "redirectCache": await asyncio.to_thread(get_redirect_cache().stats),
+            "thumbnails": get_thumbnail_renderer().stats(),
+            "upstreamBreakers": upstream_breaker_stats(),
+            "upstreamSchedulers": upstream_scheduler_stats(),
+        }
+    )
+
+
+ROUTES = (
+    Route(
+        re.compile(r"/api/tmdb/(?P<subpath>.+)"),
+        frozenset({"GET"}),
+        proxy_tmdb,
+        UPSTREAM_RATE_LIMIT,
+        deduct_on_cache_hit=False,
+    ),
+    Route(
+        re.compile(r"/api/openlibrary/(?P<subpath>.+)"),
+        frozenset({"GET"}),
+        proxy_openlibrary,
+        UPSTREAM_RATE_LIMIT,
+        deduct_on_cache_hit=False,
+    ),
+    Route(
+        re.compile(r"/api/gamesdb/images/(?P<subpath>.+)"),
+        frozenset({"GET"}),
+        proxy_gamesdb_images,
+        UPSTREAM_RATE_LIMIT,
+        deduct_on_cache_hit=False,
+    ),
+    Route(
+        re.compile(r"/api/gamesdb/(?P<subpath>.+)"),
+        frozenset({"GET", "POST"}),
+        proxy_gamesdb,
+        UPSTREAM_RATE_LIMIT,
+        deduct_on_cache_hit=False,
+    ),
+    Route(
+        re.compile(r"/api/coverart/image"),
+        frozenset({"GET"}),
+        proxy_coverart_image,
+        UPSTREAM_RATE_LIMIT,
+        deduct_on_cache_hit=False,
+    ),
+    Route(
+        re.compile(r"/api/coverart/metadata"),
+        frozenset({"GET"}),
+        proxy_coverart_metadata,
+        UPSTREAM_RATE_LIMIT,
+        deduct_on_cache_hit=False,
+    ),
+    Route(
+        re.compile(r"/api/googlebooks/image"),
+        frozenset({"GET"}),
+        proxy_googlebooks_image,
+        UPSTREAM_RATE_LIMIT,
+        deduct_on_cache_hit=False,
+    ),
+    Route(
+        re.compile(r"/api/musicbrainz/(?P<subpath>.+)"),
+        frozenset({"GET"}),
+        proxy_musicbrainz,
+        UPSTREAM_RATE_LIMIT,
+        deduct_on_cache_hit=False,
+    ),
+    Route(
+        re.compile(r"/api/itunes/(?P<subpath>.+)"),
+        frozenset({"GET"}),
+        proxy_itunes,
+        UPSTREAM_RATE_LIMIT,
+        deduct_on_cache_hit=False,
+    ),
+    Route(re.compile(r"/api/search/stream"), frozenset({"GET"}), search),
+    Route(re.compile(r"/api/stats"), frozenset({"GET"}), get_stats),
+)
+
+
+def preflight_response(request: AsyncRequest, route: Route) -> AsyncResponse:
+    headers = {"Allow": ", ".join(sorted(route.methods | {"HEAD", "OPTIONS"}))}
+    if "Origin" in request.headers:
+        headers["Access-Control-Allow-Methods"] = ", ".join(CORS_ALLOWED_METHODS)
+        requested_headers = request.headers.get("Access-Control-Request-Headers")
+        if requested_headers:
+            headers["Access-Control-Allow-Headers"] = requested_headers
+    return AsyncResponse(200, b"", headers)
+
+
+async def dispatch(request: AsyncRequest) -> AsyncResponse:
+    for route in ROUTES:
+        match = route.pattern.fullmatch(request.path)
+        if match is None:
+            continue
+        started = time.perf_counter()
+        response = await dispatch_route(request, route, match)
+        metrics = get_metrics()
+        if metrics is not None:
+            metrics.request_finished(
+                route.handler.__name__,
+                request.method,
+                response.status,
+                time.perf_counter() - started,
+            )
+        return response
+    return json_response({"error": "Not found"}, 404)
+
+
+def rate_limit_rejection(route: Route) -> AsyncResponse:
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.rate_limited(route.handler.__name__)
+    return text_response(f"Too Many Requests: {route.rate_limit}", 429)
+
+
+async def dispatch_route(
+    request: AsyncRequest, route: Route, match: re.Match
+) -> AsyncResponse:
+    if request.method == "OPTIONS":
+        return preflight_response(request, route)
+    method = "GET" if request.method == "HEAD" else request.method
+    if method not in route.methods:
+        return text_response("Method Not Allowed", 405)
+    if route.rate_limit is None:
+        return await route.handler(request, match)
+
+    address = request.client_address
+    if not address:
+        return missing_address_response()
+    if is_rate_limit_exempt_address(address):
+        return await route.handler(request, match)
+    limiter = get_rate_limiter()
+    identifiers = (address, route.handler.__name__)
+    if route.deduct_on_cache_hit:
+        if not await asyncio.to_thread(limiter.hit, route.rate_limit, *identifiers):
+            return rate_limit_rejection(route)
+        return await route.handler(request, match)
+    if not await asyncio.to_thread(limiter.test, route.rate_limit, *identifiers):
+        return rate_limit_rejection(route)
+    response = await route.handler(request, match)
+    if upstream_was_called(response):
+        await asyncio.to_thread(limiter.hit, route.rate_limit, *identifiers)
+    return response
+
+
+def read_request(scope: dict) -> AsyncRequest:
+    headers = Headers(
+        [
+            (name.decode("latin-1"), value.decode("latin-1"))
+            for name, value in scope["headers"]
+        ]
+    )
+    client = scope.get("client")
+    return AsyncRequest(
+        scope["method"],
+        scope["path"],
+        MultiDict(
+            parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True)
+        ),
+        headers,
+        client_address_from_headers(headers, client[0] if client else None),
+        trusted_address=trusted_address_from_headers(
+            headers, client[0] if client else None
+        ),
+    )
+
+
+# None when the body is over the limit Flask enforces with MAX_CONTENT_LENGTH
+async def read_body(request: AsyncRequest, receive: Callable) -> bytes | None:
+    if request.headers.get("Content-Length", 0, type=int) > MAX_REQUEST_BODY_BYTES:
+        return None
+    chunks: list[bytes] = []
+    size = 0
+    more_body = True
+    while more_body:
+        message = await receive()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_REQUEST_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        more_body = message.get("more_body", False)
+    return b"".join(chunks)
+
+
+async def send_response(
+    send: Callable, request: AsyncRequest, response: AsyncResponse
+) -> None:
+    headers = dict(response.headers)
+    headers["Content-Security-Policy"] = CONTENT_SECURITY_POLICY
+    if "Origin" in request.headers:
+        headers["Access-Control-Allow-Origin"] = "*"
+    body = response.body
+    if isinstance(body, bytes) and response.status != 304:
+        headers.setdefault("Content-Length", str(len(body)))
+    await send(
+        {
+            "type": "http.response.start",
+            "status": response.status,
+            "headers": [
+                (name.lower().encode("latin-1"), value.encode("latin-1"))
+                for name, value in headers.items()
+            ],
+        }
+    )
+    if isinstance(body, bytes):
+        await send(
+            {
+                "type": "http.response.body",
+                "body": b"" if request.method == "HEAD" else body,
+            }
+        )
+        return
+    async with aclosing(body) as chunks:
+        if request.method != "HEAD":
+            async for chunk in chunks:
+                await send(
+                    {"type": "http.response.body", "body": chunk, "more_body": True}
+                )
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def run_lifespan(receive: Callable, send: Callable) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            if aiohttp is None:
+                await send(
+                    {
+                        "type": "lifespan.startup.failed",
+                        "message": "aiohttp is required for the async backend",
+                    }
+                )
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await close_async_upstream_sessions()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope: dict, receive: Callable, send: Callable) -> None:
+    global _IN_FLIGHT, _PEAK_IN_FLIGHT
+    if scope["type"] == "lifespan":
+        await run_lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    request = read_request(scope)
+    body = await read_body(request, receive)
+    if body is None:
+        await send_response(
+            send, request, text_response("Request Entity Too Large", 413)
+        )
+        return
+    request.body = body
+    _IN_FLIGHT += 1
+    _PEAK_IN_FLIGHT = max(_PEAK_IN_FLIGHT, _IN_FLIGHT)
+    try:
+        await send_response(send, request, await dispatch(request))
+    finally:
+        _IN_FLIGHT -= 1
@@ -1,20 +1,102 @@
-import fcntl
+import gc
+import hashlib
 import ipaddress
 import json
 import os
-import random
-import tempfile
+import threading
 import time
-from collections.abc import Iterator
-from contextlib import contextmanager
-from typing import IO
-from urllib.parse import urljoin, urlparse
-
+from collections.abc import Callable, Iterator, Mapping
+from compression import zstd
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from functools import partial
+from urllib.parse import parse_qs, unquote, urljoin, urlparse
+
+import click
 import requests
 from dotenv import load_dotenv
-from flask import Flask, jsonify, redirect, request, send_from_directory
+from flask import (
+    Flask,
+    Response,
+    g,
+    jsonify,
+    make_response,
+    redirect,
+    request,
+    send_file,
+    url_for,
+)
 from flask_cors import CORS
 from flask_limiter import Limiter
+from limits import parse as parse_rate_limit
+from werkzeug.http import http_date, is_resource_modified, parse_date, unquote_etag
+
+from addresslist import AddressListFile, AddressMatcher
+from circuitbreaker import UpstreamUnavailable
+from imagecache import CachedImage, ImageCache, ImageCacheFill
+from imageprefetch import (
+    PREFETCH_CACHED,
+    PREFETCH_FAILED,
+    PREFETCH_FETCHED,
+    PREFETCH_MISSING,
+    ImagePrefetcher,
+)
+from jsoncodec import is_json_content_type, json_loads
+from metrics import METRICS_CONTENT_TYPE, Gauge, MetricsRegistry, ServiceMetrics
+from ratelimitstore import SqliteRateLimitStorage
+from redirectcache import RedirectCache, ResolvedLocation
+from responsecache import (
+    CachePolicy,
+    ResponseCache,
+    UpstreamLoader,
+    response_cache_key,
+)
+from searchfanout import (
+    SEARCH_CONTENT_TYPE,
+    SearchFanout,
+    SearchSource,
+    parse_search_query,
+    parse_search_sources,
+    search_failure,
+    search_outcome,
+)
+from sharecodec import (
+    SHARE_CONTENT_ENCODING,
+    SHARE_DICTIONARY_BYTES,
+    ShareCodec,
+    train_share_dictionary,
+)
+from sharestore import (
+    ShareReadCache,
+    ShareStore,
+    SqliteShareStore,
+    migrate_json_share_store,
+    open_share_store,
+    share_content_digest,
+)
+from slugallocator import SlugAllocator
+from staticassets import StaticAsset, StaticManifest
+from thumbnails import (
+    THUMBNAIL_FORMATS,
+    ThumbnailRenderer,
+    snap_thumbnail_width,
+    thumbnail_formats,
+)
+from upstream import (
+    UPSTREAM_SCHEDULES,
+    observe_breaker_events,
+    observe_upstream_requests,
+    upstream_breaker_stats,
+    upstream_session,
+    upstream_timeout,
+    upstream_url,
+)
+from upstreamscheduler import (
+    PRIORITY_HEADER,
+    PRIORITY_INTERACTIVE,
+    UpstreamScheduler,
+    request_priority,
+)
 
 load_dotenv()
 
@@ -31,26 +113,74 @@ def resolve_project_root() -> str:
 
 
 PROJECT_ROOT = resolve_project_root()
-DIST_PATH = os.path.join(PROJECT_ROOT, "dist")
-DATA_DIRECTORY_PATH = os.path.join(PROJECT_ROOT, "data")
+DIST_PATH = os.getenv("AOIFE_DIST_DIRECTORY", os.path.join(PROJECT_ROOT, "dist"))
+DATA_DIRECTORY_PATH = os.getenv(
+    "AOIFE_DATA_DIRECTORY", os.path.join(PROJECT_ROOT, "data")
+)
+
+CORS_ALLOWED_METHODS = ("DELETE", "GET", "HEAD", "OPTIONS", "PATCH", "POST", "PUT")
 
-app = Flask(__name__, static_folder=DIST_PATH, static_url_path="")
-CORS(app)
+app = Flask(__name__, static_folder=None)
+CORS(app, methods=CORS_ALLOWED_METHODS)
 
+PRELOAD_SHARED_DATA = os.getenv("AOIFE_PRELOAD", "0") == "1"
+SHARE_STORE_BACKEND = os.getenv("AOIFE_SHARE_STORE", "sqlite")
 SHARE_STORE_PATH = os.path.join(DATA_DIRECTORY_PATH, "share.json")
+SHARE_DATABASE_PATH = os.path.join(DATA_DIRECTORY_PATH, "share.db")
 SHARE_STORE_LOCK_PATH = os.path.join(DATA_DIRECTORY_PATH, "share.lock")
+SHARE_READ_CACHE_SIZE = int(os.getenv("AOIFE_SHARE_READ_CACHE_SIZE", "4096"))
+SHARE_DICTIONARY_DIRECTORY_PATH = os.path.join(
+    DATA_DIRECTORY_PATH, "share-dictionaries"
+)
+SHARE_COMPRESSION_LEVEL = int(os.getenv("AOIFE_SHARE_COMPRESSION_LEVEL", "9"))
 SLUG_WORDS_PATH = os.path.join(DATA_DIRECTORY_PATH, "slugs.json")
+SLUG_ALLOCATOR_PATH = os.path.join(DATA_DIRECTORY_PATH, "slugs.db")
 RATE_LIMIT_EXEMPT_ADDRESSES_PATH = os.path.join(DATA_DIRECTORY_PATH, "whitelist.txt")
-
-
-def load_share_store() -> dict:
-    if not os.path.exists(SHARE_STORE_PATH):
-        return {}
-    with open(SHARE_STORE_PATH, "r", encoding="utf-8") as handle:
-        data = json.load(handle)
-        if not isinstance(data, dict):
-            raise TypeError("Share store file is invalid")
-        return data
+RATE_LIMIT_STORAGE_URI = os.getenv("AOIFE_RATE_LIMIT_STORAGE_URI") or (
+    f"{SqliteRateLimitStorage.STORAGE_SCHEME[0]}://"
+    f"{os.path.join(DATA_DIRECTORY_PATH, 'ratelimits')}"
+)
+RATE_LIMIT_STRATEGY = "sliding-window-counter"
+CACHE_DIRECTORY_PATH = os.getenv(
+    "AOIFE_CACHE_DIRECTORY", os.path.join(DATA_DIRECTORY_PATH, "cache")
+)
+RESPONSE_CACHE_MAX_BYTES = int(
+    os.getenv("AOIFE_RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+)
+RESPONSE_CACHE_SERVE_STALE = os.getenv("AOIFE_RESPONSE_CACHE_SERVE_STALE", "1") != "0"
+IMAGE_CACHE_MAX_BYTES = int(
+    os.getenv("AOIFE_IMAGE_CACHE_MAX_BYTES", str(1024 * 1024 * 1024))
+)
+IMAGE_CACHE_NEGATIVE_TTL_SECONDS = int(
+    os.getenv("AOIFE_IMAGE_CACHE_NEGATIVE_TTL", "3600")
+)
+IMAGE_CACHE_ACCEL_PREFIX = os.getenv("AOIFE_IMAGE_CACHE_ACCEL_PREFIX", "")
+IMAGE_CACHE_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+IMAGE_CACHE_CONTROL = f"public, max-age={IMAGE_CACHE_MAX_AGE_SECONDS}"
+# The original image stands in when a variant fails to render; keep it briefly
+IMAGE_FALLBACK_CACHE_CONTROL = "public, max-age=300"
+IMAGE_PREFETCH_WORKERS = int(os.getenv("AOIFE_IMAGE_PREFETCH_WORKERS", "2"))
+IMAGE_PREFETCH_QUEUE_DEPTH = int(os.getenv("AOIFE_IMAGE_PREFETCH_QUEUE", "256"))
+REDIRECT_CACHE_MAX_ENTRIES = int(
+    os.getenv("AOIFE_REDIRECT_CACHE_MAX_ENTRIES", "100000")
+)
+COVERART_RESOLVED_TTL_SECONDS = 24 * 60 * 60
+COVERART_NEGATIVE_TTL_SECONDS = int(os.getenv("AOIFE_COVERART_NEGATIVE_TTL", "3600"))
+COVERART_MAX_HOPS = 4
+METRICS_PATH = os.path.join(DATA_DIRECTORY_PATH, "metrics.db")
+UPSTREAM_PACING_DIRECTORY_PATH = os.path.join(DATA_DIRECTORY_PATH, "pacing")
+METRICS_FLUSH_INTERVAL_SECONDS = float(os.getenv("AOIFE_METRICS_FLUSH_INTERVAL", "1"))
+SHARE_MAX_AGE_SECONDS = 365 * 24 * 60 * 60
+STATIC_IMMUTABLE_MAX_AGE_SECONDS = 365 * 24 * 60 * 60
+THUMBNAIL_PROCESSES = int(os.getenv("AOIFE_THUMBNAIL_PROCESSES", "2"))
+THUMBNAIL_TIMEOUT_SECONDS = 10
+RESPONSE_CACHE_POLICIES = {
+    "tmdb": CachePolicy(ttl_seconds=600, stale_seconds=3600),
+    "openlibrary": CachePolicy(ttl_seconds=3600, stale_seconds=86400),
+    "gamesdb": CachePolicy(ttl_seconds=600, stale_seconds=3600),
+    "musicbrainz": CachePolicy(ttl_seconds=86400, stale_seconds=7 * 86400),
+    "itunes": CachePolicy(ttl_seconds=21600, stale_seconds=7 * 86400),
+}
 
 
 def load_slug_words() -> list[str]:
@@ -66,22 +196,6 @@ def load_slug_words() -> list[str]:
         return words
 
 
-def persist_share_store(store: dict) -> None:
-    if not os.path.isdir(DATA_DIRECTORY_PATH):
-        raise FileNotFoundError(f"Missing data directory at {DATA_DIRECTORY_PATH}")
-    with tempfile.NamedTemporaryFile(
-        mode="w",
-        encoding="utf-8",
-        dir=DATA_DIRECTORY_PATH,
-        prefix="share-",
-        suffix=".tmp",
-        delete=False,
-    ) as handle:
-        json.dump(store, handle)
-        temporary_path = handle.name
-    os.replace(temporary_path, SHARE_STORE_PATH)
-
-
 _SLUG_WORDS: list[str] | None = None
 
 
@@ -92,61 +206,359 @@ def get_slug_words() -> list[str]:
     return _SLUG_WORDS
 
 
-def generate_slug(existing: set[str]) -> str:
+_INITIALIZATION_LOCK = threading.Lock()
+_METRICS: ServiceMetrics | None = None
+
+
+def get_metrics() -> ServiceMetrics | None:
+    global _METRICS
+    if METRICS_FLUSH_INTERVAL_SECONDS <= 0:
+        return None
+    if _METRICS is not None:
+        return _METRICS
+    with _INITIALIZATION_LOCK:
+        if _METRICS is None:
+            os.makedirs(os.path.dirname(METRICS_PATH), exist_ok=True)
+            _METRICS = ServiceMetrics(
+                MetricsRegistry(METRICS_PATH, METRICS_FLUSH_INTERVAL_SECONDS)
+            )
+        return _METRICS
+
+
+def record_upstream_request(provider: str, status: str, seconds: float) -> None:
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.upstream_finished(provider, status, seconds)
+
+
+def record_breaker_event(provider: str, event: str) -> None:
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.breaker_event(provider, event)
+
+
+def record_image_prefetch(result: str) -> None:
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.image_prefetched(result)
+
+
+def record_share_view_image(warm: bool) -> None:
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.share_view_image(warm)
+
+
+def record_upstream_schedule(provider: str, result: str, seconds: float) -> None:
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.upstream_scheduled(provider, result, seconds)
+
+
+observe_upstream_requests(record_upstream_request)
+observe_breaker_events(record_breaker_event)
+
+_SLUG_ALLOCATOR: SlugAllocator | None = None
+
+
+def get_slug_allocator() -> SlugAllocator:
+    global _SLUG_ALLOCATOR
+    if _SLUG_ALLOCATOR is not None:
+        return _SLUG_ALLOCATOR
+    store = get_share_store()
+    with _INITIALIZATION_LOCK:
+        if _SLUG_ALLOCATOR is None:
+            _SLUG_ALLOCATOR = SlugAllocator(
+                get_slug_words(), SLUG_ALLOCATOR_PATH, store.count
+            )
+        return _SLUG_ALLOCATOR
+
+
+_SHARE_CODEC: ShareCodec | None = None
+
+
+def get_share_codec() -> ShareCodec:
+    global _SHARE_CODEC
+    if _SHARE_CODEC is not None:
+        return _SHARE_CODEC
+    with _INITIALIZATION_LOCK:
+        if _SHARE_CODEC is None:
+            _SHARE_CODEC = ShareCodec(
+                SHARE_DICTIONARY_DIRECTORY_PATH, SHARE_COMPRESSION_LEVEL
+            )
+        return _SHARE_CODEC
+
+
+_SHARE_STORE: ShareReadCache | None = None
+
+
+def get_share_store() -> ShareReadCache:
+    global _SHARE_STORE
+    if _SHARE_STORE is not None:
+        return _SHARE_STORE
+    metrics = get_metrics()
+    codec = get_share_codec()
+    with _INITIALIZATION_LOCK:
+        if _SHARE_STORE is None:
+            _SHARE_STORE = ShareReadCache(
+                open_share_store(
+                    SHARE_STORE_BACKEND,
+                    SHARE_STORE_PATH,
+                    SHARE_DATABASE_PATH,
+                    SHARE_STORE_LOCK_PATH,
+                    metrics,
+                    codec,
+                ),
+                SHARE_READ_CACHE_SIZE,
+            )
+        return _SHARE_STORE
+
+
+def insert_share_record(store: ShareStore, record: dict) -> str:
+    digest = share_content_digest(record["payload"], record["title"])
+    existing = store.find(digest)
+    if existing is not None:
+        return existing
+    allocator = get_slug_allocator()
     for _ in range(10):
-        slug_words = get_slug_words()
-        slug = "-".join(random.choice(slug_words) for _ in range(3))
-        if slug not in existing:
+        slug = allocator.allocate()
+        if store.insert(slug, record):
             return slug
+        # A concurrent create of the same grid may have claimed the digest
+        existing = store.find(digest)
+        if existing is not None:
+            return existing
+        allocator.collided()
     raise RuntimeError("Unable to generate unique share slug")
 
 
-@contextmanager
-def acquire_share_store_lock(exclusive: bool) -> Iterator[IO[str]]:
-    if not os.path.isdir(DATA_DIRECTORY_PATH):
-        raise FileNotFoundError(f"Missing data directory at {DATA_DIRECTORY_PATH}")
-    with open(SHARE_STORE_LOCK_PATH, "a", encoding="utf-8") as lock_handle:
-        lock_type = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
-        fcntl.flock(lock_handle.fileno(), lock_type)
-        yield lock_handle
+_RESPONSE_CACHE: ResponseCache | None = None
 
 
-def get_rate_limit_exempt_addresses() -> set[str]:
-    if not os.path.exists(RATE_LIMIT_EXEMPT_ADDRESSES_PATH):
-        return set()
-    with open(RATE_LIMIT_EXEMPT_ADDRESSES_PATH, "r", encoding="utf-8") as handle:
-        addresses: set[str] = set()
-        for line in handle:
-            address = line.strip()
-            if not address:
-                raise ValueError("Rate limit address list contains a blank line")
-            ipaddress.ip_address(address)
-            addresses.add(address)
-        return addresses
+def get_response_cache() -> ResponseCache:
+    global _RESPONSE_CACHE
+    if _RESPONSE_CACHE is not None:
+        return _RESPONSE_CACHE
+    with _INITIALIZATION_LOCK:
+        if _RESPONSE_CACHE is None:
+            os.makedirs(CACHE_DIRECTORY_PATH, exist_ok=True)
+            _RESPONSE_CACHE = ResponseCache(
+                CACHE_DIRECTORY_PATH,
+                RESPONSE_CACHE_MAX_BYTES,
+                RESPONSE_CACHE_SERVE_STALE,
+            )
+        return _RESPONSE_CACHE
 
 
-def get_client_address() -> str | None:
-    forwarded_for = request.headers.get("X-Forwarded-For")
+_IMAGE_CACHE: ImageCache | None = None
+
+
+def get_image_cache() -> ImageCache | None:
+    global _IMAGE_CACHE
+    if IMAGE_CACHE_MAX_BYTES <= 0:
+        return None
+    if _IMAGE_CACHE is not None:
+        return _IMAGE_CACHE
+    with _INITIALIZATION_LOCK:
+        if _IMAGE_CACHE is None:
+            os.makedirs(CACHE_DIRECTORY_PATH, exist_ok=True)
+            _IMAGE_CACHE = ImageCache(
+                os.path.join(CACHE_DIRECTORY_PATH, "images"),
+                IMAGE_CACHE_MAX_BYTES,
+                IMAGE_CACHE_NEGATIVE_TTL_SECONDS,
+            )
+        return _IMAGE_CACHE
+
+
+_IMAGE_PREFETCHER: ImagePrefetcher | None = None
+
+
+def get_image_prefetcher() -> ImagePrefetcher | None:
+    global _IMAGE_PREFETCHER
+    if IMAGE_PREFETCH_WORKERS <= 0 or get_image_cache() is None:
+        return None
+    if _IMAGE_PREFETCHER is not None:
+        return _IMAGE_PREFETCHER
+    with _INITIALIZATION_LOCK:
+        if _IMAGE_PREFETCHER is None:
+            _IMAGE_PREFETCHER = ImagePrefetcher(
+                IMAGE_PREFETCH_WORKERS,
+                IMAGE_PREFETCH_QUEUE_DEPTH,
+                record_image_prefetch,
+            )
+        return _IMAGE_PREFETCHER
+
+
+_UPSTREAM_SCHEDULERS: dict[str, UpstreamScheduler] = {}
+
+
+def get_upstream_scheduler(provider: str) -> UpstreamScheduler | None:
+    policy = UPSTREAM_SCHEDULES.get(provider)
+    if policy is None or policy.rate <= 0:
+        return None
+    scheduler = _UPSTREAM_SCHEDULERS.get(provider)
+    if scheduler is not None:
+        return scheduler
+    with _INITIALIZATION_LOCK:
+        scheduler = _UPSTREAM_SCHEDULERS.get(provider)
+        if scheduler is None:
+            os.makedirs(UPSTREAM_PACING_DIRECTORY_PATH, exist_ok=True)
+            scheduler = UpstreamScheduler(
+                provider,
+                policy,
+                os.path.join(UPSTREAM_PACING_DIRECTORY_PATH, provider),
+                record_upstream_schedule,
+            )
+            _UPSTREAM_SCHEDULERS[provider] = scheduler
+        return scheduler
+
+
+def upstream_scheduler_stats() -> dict:
+    return {
+        provider: scheduler.stats()
+        for provider in UPSTREAM_SCHEDULES
+        if (scheduler := get_upstream_scheduler(provider)) is not None
+    }
+
+
+_SEARCH_EXECUTOR: ThreadPoolExecutor | None = None
+
+
+def get_search_executor() -> ThreadPoolExecutor:
+    global _SEARCH_EXECUTOR
+    if _SEARCH_EXECUTOR is not None:
+        return _SEARCH_EXECUTOR
+    with _INITIALIZATION_LOCK:
+        if _SEARCH_EXECUTOR is None:
+            _SEARCH_EXECUTOR = ThreadPoolExecutor(
+                SEARCH_THREADS, thread_name_prefix="search"
+            )
+        return _SEARCH_EXECUTOR
+
+
+_REDIRECT_CACHE: RedirectCache | None = None
+
+
+def get_redirect_cache() -> RedirectCache:
+    global _REDIRECT_CACHE
+    if _REDIRECT_CACHE is not None:
+        return _REDIRECT_CACHE
+    with _INITIALIZATION_LOCK:
+        if _REDIRECT_CACHE is None:
+            os.makedirs(CACHE_DIRECTORY_PATH, exist_ok=True)
+            _REDIRECT_CACHE = RedirectCache(
+                CACHE_DIRECTORY_PATH, REDIRECT_CACHE_MAX_ENTRIES
+            )
+        return _REDIRECT_CACHE
+
+
+_THUMBNAIL_RENDERER: ThumbnailRenderer | None = None
+
+
+def get_thumbnail_renderer() -> ThumbnailRenderer:
+    global _THUMBNAIL_RENDERER
+    if _THUMBNAIL_RENDERER is not None:
+        return _THUMBNAIL_RENDERER
+    with _INITIALIZATION_LOCK:
+        if _THUMBNAIL_RENDERER is None:
+            _THUMBNAIL_RENDERER = ThumbnailRenderer(
+                THUMBNAIL_PROCESSES,
+                THUMBNAIL_PROCESSES * 8,
+                THUMBNAIL_TIMEOUT_SECONDS,
+            )
+        return _THUMBNAIL_RENDERER
+
+
+_STATIC_MANIFEST: StaticManifest | None = None
+
+
+def get_static_manifest() -> StaticManifest:
+    global _STATIC_MANIFEST
+    if _STATIC_MANIFEST is not None:
+        return _STATIC_MANIFEST
+    with _INITIALIZATION_LOCK:
+        if _STATIC_MANIFEST is None:
+            _STATIC_MANIFEST = StaticManifest(DIST_PATH)
+        return _STATIC_MANIFEST
+
+
+_RATE_LIMIT_EXEMPT_ADDRESSES: AddressListFile | None = None
+
+
+def get_rate_limit_exempt_addresses() -> AddressMatcher:
+    global _RATE_LIMIT_EXEMPT_ADDRESSES
+    if _RATE_LIMIT_EXEMPT_ADDRESSES is None:
+        with _INITIALIZATION_LOCK:
+            if _RATE_LIMIT_EXEMPT_ADDRESSES is None:
+                _RATE_LIMIT_EXEMPT_ADDRESSES = AddressListFile(
+                    RATE_LIMIT_EXEMPT_ADDRESSES_PATH
+                )
+    return _RATE_LIMIT_EXEMPT_ADDRESSES.matcher()
+
+
+def client_address_from_headers(
+    headers: Mapping[str, str], remote_address: str | None
+) -> str | None:
+    forwarded_for = headers.get("X-Forwarded-For")
     if forwarded_for:
         return forwarded_for.split(",")[0].strip() or None
-    real_ip = request.headers.get("X-Real-IP")
+    real_ip = headers.get("X-Real-IP")
     if real_ip:
         return real_ip.strip() or None
-    return request.remote_addr
+    return remote_address
 
 
-def get_rate_limit_address() -> str:
-    address = get_client_address()
+def trusted_address_from_headers(
+    headers: Mapping[str, str], remote_address: str | None
+) -> str | None:
+    # X-Forwarded-For keeps whatever the client sent ahead of nginx's hop, so
+    # only the X-Real-IP nginx overwrites is trusted, and only from loopback
+    if remote_address and is_loopback_address(remote_address):
+        real_ip = (headers.get("X-Real-IP") or "").strip()
+        if real_ip:
+            return real_ip
+    return remote_address
+
+
+def get_client_address() -> str | None:
+    return client_address_from_headers(request.headers, request.remote_addr)
+
+
+def require_rate_limit_address(address: str | None) -> str:
     if not address:
         raise ValueError("Client address is required for rate limiting")
     return address
 
 
-def is_rate_limit_exempt() -> bool:
-    exempt_addresses = get_rate_limit_exempt_addresses()
-    if not exempt_addresses:
+def get_rate_limit_address() -> str:
+    return require_rate_limit_address(get_client_address())
+
+
+def is_rate_limit_exempt_address(address: str) -> bool:
+    return address in get_rate_limit_exempt_addresses()
+
+
+def is_loopback_address(address: str) -> bool:
+    try:
+        return ipaddress.ip_address(address).is_loopback
+    except ValueError:
+        return False
+
+
+def is_internal_address(address: str | None) -> bool:
+    if not address:
         return False
-    return get_rate_limit_address() in exempt_addresses
+    return is_loopback_address(address) or is_rate_limit_exempt_address(address)
+
+
+def is_rate_limit_exempt() -> bool:
+    return is_rate_limit_exempt_address(get_rate_limit_address())
+
+
+def is_internal_request() -> bool:
+    return is_internal_address(
+        trusted_address_from_headers(request.headers, request.remote_addr)
+    )
 
 
 def resolve_rate_limit_key() -> str:
@@ -160,10 +572,19 @@ def get_user_agent() -> str | None:
     return None
 
 
+def record_rate_limit_rejection(_limit) -> None:
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.rate_limited(request.endpoint or "unmatched")
+
+
 limiter = Limiter(
     key_func=resolve_rate_limit_key,
     app=app,
     default_limits=[],
+    storage_uri=RATE_LIMIT_STORAGE_URI,
+    strategy=RATE_LIMIT_STRATEGY,
+    on_breach=record_rate_limit_rejection,
 )
 
 
@@ -172,24 +593,76 @@ def rate_limit_exempt_request() -> bool:
     return is_rate_limit_exempt()
 
 
+CONTENT_SECURITY_POLICY = "default-src 'self'; script-src 'self' 'wasm-unsafe-eval'; style-src 'self' 'unsafe-inline'; img-src 'self' data: blob: https:; connect-src 'self' https://api.themoviedb.org https://thegamesdb.net https://api.thegamesdb.net https://coverartarchive.org https://openlibrary.org https://www.googleapis.com https://archive.org https://*.archive.org; font-src 'self' data:"
+
+
 @app.after_request
 def set_csp_header(response):
-    response.headers["Content-Security-Policy"] = (
-        "default-src 'self'; script-src 'self' 'wasm-unsafe-eval'; style-src 'self' 'unsafe-inline'; img-src 'self' data: blob: https:; connect-src 'self' https://api.themoviedb.org https://musicbrainz.org https://thegamesdb.net https://api.thegamesdb.net https://coverartarchive.org https://itunes.apple.com https://openlibrary.org https://www.googleapis.com https://archive.org https://*.archive.org; font-src 'self' data:"
-    )
+    response.headers["Content-Security-Policy"] = CONTENT_SECURITY_POLICY
+    return response
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    metrics = get_metrics()
+    started = g.get("request_started")
+    if metrics is not None and started is not None:
+        metrics.request_finished(
+            request.endpoint or "unmatched",
+            request.method,
+            response.status_code,
+            time.perf_counter() - started,
+        )
     return response
 
 
 TMDB_KEY = os.getenv("TMDB_API_KEY")
 GAMESDB_KEY = os.getenv("GAMESDB_PUBLIC_KEY")
-UPSTREAM_TIMEOUT_SECONDS = 10
+UPSTREAM_API_KEYS = {"tmdb": ("api_key", TMDB_KEY), "gamesdb": ("apikey", GAMESDB_KEY)}
+UPSTREAM_MAX_JSON_BYTES = int(
+    os.getenv("AOIFE_UPSTREAM_MAX_JSON_BYTES", str(16 * 1024 * 1024))
+)
+UPSTREAM_JSON_CHUNK_BYTES = 64 * 1024
 MAX_SHARE_PAYLOAD_BYTES = 200_000
+# The share payload arrives as an escaped JSON string inside the body
+MAX_REQUEST_BODY_BYTES = 2 * MAX_SHARE_PAYLOAD_BYTES
 MAX_SHARE_ITEMS = 24
 MAX_ALTERNATE_COVERS = 32
 RATE_LIMIT_UPSTREAM = "120 per minute"
 RATE_LIMIT_SHARE_CREATE = "20 per minute"
 RATE_LIMIT_SHARE_READ = "240 per hour"
 RATE_LIMIT_LOG_EVENT = "60 per minute"
+UPSTREAM_RATE_LIMIT = parse_rate_limit(RATE_LIMIT_UPSTREAM)
+SEARCH_THREADS = int(os.getenv("AOIFE_SEARCH_THREADS", "16"))
+IMAGE_STREAM_CHUNK_BYTES = 64 * 1024
+GAMESDB_IMAGES_ROUTE = "/api/gamesdb/images/"
+SHARE_QUERY_PARAM = "share"
+IMAGE_PASSTHROUGH_HEADERS = (
+    "Content-Type",
+    "Content-Length",
+    "ETag",
+    "Last-Modified",
+    "Cache-Control",
+)
+
+app.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_BODY_BYTES
+
+ImageFetch = Callable[[dict[str, str]], requests.Response]
+
+
+@dataclass(frozen=True)
+class ImageSource:
+    key: str
+    provider: str
+    path: str
+    params: dict[str, str] | None = None
+    # Cover Art Archive paths are fetched from the location they resolve to
+    resolve_location: bool = False
 
 
 def is_allowed_cover_url(value: str) -> bool:
@@ -207,12 +680,12 @@ def is_uploaded_cover(value: str) -> bool:
     return value.startswith("img-")
 
 
-def validate_and_canonicalize_share_payload(payload: str) -> str:
+def validate_and_canonicalize_share_payload(payload: str) -> tuple[str, list[dict]]:
     payload_bytes = payload.encode("utf-8")
     if len(payload_bytes) > MAX_SHARE_PAYLOAD_BYTES:
         raise ValueError("Share payload is too large")
 
-    data = json.loads(payload)
+    data = json_loads(payload)
     if not isinstance(data, dict):
         raise TypeError("Share payload must be a JSON object")
 
@@ -333,197 +806,816 @@ def validate_and_canonicalize_share_payload(payload: str) -> str:
         "captionEditsOnly": caption_edits_only,
     }
 
-    return json.dumps(canonical_payload, separators=(",", ":"))
+    return json.dumps(canonical_payload, separators=(",", ":")), canonical_items
+
+
+def coverart_image_path(
+    cover_type: str | None, cover_id: str | None, size: str | None
+) -> str:
+    if cover_type != "release":
+        raise ValueError("Invalid cover type")
+    if not cover_id:
+        raise ValueError("Missing cover id")
+    if size not in ("250", "500"):
+        size = "500"
+    return f"release/{cover_id}/front-{size}"
+
+
+def coverart_metadata_path(cover_type: str | None, cover_id: str | None) -> str:
+    if cover_type not in ("release", "release-group"):
+        raise ValueError("Invalid cover type")
+    if not cover_id:
+        raise ValueError("Missing cover id")
+    return f"{cover_type}/{cover_id}"
+
+
+def is_json_document(content_type: str, body: bytes) -> bool:
+    if "application/json" not in content_type.lower():
+        return False
+    try:
+        json_loads(body)
+    except ValueError:
+        return False
+    return True
+
+
+def coverart_resolution_key(path: str, with_body: bool) -> str:
+    return f"{'metadata' if with_body else 'image'}:{path}"
+
+
+def coverart_redirect(url: str, status: int, location: str | None) -> str | None:
+    if 300 <= status < 400 and location:
+        return urljoin(url, location)
+    return None
+
+
+def coverart_resolution(
+    status: int, content_type: str, body: bytes | None
+) -> tuple[int, bytes | None, float | None]:
+    if body is not None and not is_json_document(content_type, body):
+        status, body = (404 if status == 200 else status), None
+    if status == 200:
+        return status, body, COVERART_RESOLVED_TTL_SECONDS
+    if status == 404:
+        return status, None, COVERART_NEGATIVE_TTL_SECONDS
+    return status, body, None
+
+
+def googlebooks_image_params(volume_id: str | None, zoom: str | None) -> dict:
+    if not volume_id:
+        raise ValueError("Missing volume id")
+    if zoom not in ("1", "2", "3"):
+        zoom = "2"
+    return {"id": volume_id, "printsec": "frontcover", "img": "1", "zoom": zoom}
+
+
+def upstream_was_called(response) -> bool:
+    return response.headers.get("X-Cache") != "HIT"
+
+
+def share_was_sent(response) -> bool:
+    return response.status_code != 304
+
+
+def with_upstream_key(
+    provider: str, params: dict[str, str | None]
+) -> dict[str, str | None]:
+    if provider in UPSTREAM_API_KEYS:
+        name, value = UPSTREAM_API_KEYS[provider]
+        params[name] = value
+    return params
+
+
+def check_upstream_json_size(size: int) -> None:
+    if size > UPSTREAM_MAX_JSON_BYTES:
+        raise ValueError("Upstream response is too large")
+
+
+def upstream_error(exc: OSError) -> tuple[dict, int, dict[str, str]]:
+    if isinstance(exc, UpstreamUnavailable):
+        return {"error": str(exc)}, 503, {"Retry-After": str(exc.retry_after)}
+    if isinstance(exc, (TimeoutError, requests.exceptions.Timeout)):
+        return {"error": "Upstream request timed out"}, 504, {}
+    return {"error": str(exc)}, 502, {}
+
+
+def upstream_error_response(exc: requests.exceptions.RequestException):
+    body, status, headers = upstream_error(exc)
+    return jsonify(body), status, headers
+
+
+def upstream_json_content_type(content_type: str | None, body: bytes) -> str:
+    if content_type and is_json_content_type(content_type):
+        return content_type
+    json_loads(body)
+    return "application/json"
+
+
+def read_upstream_json(resp: requests.Response) -> tuple[int, bytes, str]:
+    chunks = []
+    size = 0
+    try:
+        check_upstream_json_size(int(resp.headers.get("Content-Length") or 0))
+        for chunk in resp.iter_content(UPSTREAM_JSON_CHUNK_BYTES):
+            size += len(chunk)
+            check_upstream_json_size(size)
+            chunks.append(chunk)
+    finally:
+        resp.close()
+    body = b"".join(chunks)
+    return (
+        resp.status_code,
+        body,
+        upstream_json_content_type(resp.headers.get("Content-Type"), body),
+    )
+
+
+def stream_upstream_json(resp: requests.Response):
+    content_type = resp.headers.get("Content-Type")
+    if not content_type or not is_json_content_type(content_type):
+        status, body, content_type = read_upstream_json(resp)
+        return Response(body, status=status, content_type=content_type)
+    try:
+        check_upstream_json_size(int(resp.headers.get("Content-Length") or 0))
+    except ValueError:
+        resp.close()
+        raise
+
+    def generate() -> Iterator[bytes]:
+        size = 0
+        try:
+            for chunk in resp.iter_content(UPSTREAM_JSON_CHUNK_BYTES):
+                size += len(chunk)
+                check_upstream_json_size(size)
+                yield chunk
+        finally:
+            resp.close()
+
+    return Response(generate(), status=resp.status_code, content_type=content_type)
+
+
+def upstream_json_loader(
+    provider: str,
+    path: str,
+    params: dict[str, str | None],
+    priority: int = PRIORITY_INTERACTIVE,
+) -> UpstreamLoader:
+    def load():
+        scheduler = get_upstream_scheduler(provider)
+        if scheduler is not None:
+            scheduler.acquire(priority)
+        resp = upstream_session(provider).get(
+            upstream_url(provider, path),
+            params=params,
+            timeout=upstream_timeout(provider),
+            stream=True,
+        )
+        return read_upstream_json(resp)
+
+    return load
+
+
+def cached_upstream_response(
+    provider: str,
+    path: str,
+    params: dict[str, str | None],
+    loader: UpstreamLoader,
+):
+    entry, state = get_response_cache().fetch(
+        response_cache_key(provider, path, params),
+        provider,
+        RESPONSE_CACHE_POLICIES[provider],
+        loader,
+    )
+    return (
+        entry.body,
+        entry.status,
+        {"Content-Type": entry.content_type, "X-Cache": state},
+    )
+
+
+def resolve_coverart(path: str, with_body: bool) -> tuple[ResolvedLocation, str]:
+    cache = get_redirect_cache()
+    key = coverart_resolution_key(path, with_body)
+    entry = cache.get(key)
+    if entry is not None:
+        return entry, "HIT"
+    url = upstream_url("coverart", path)
+    session = upstream_session("coverart")
+    for _ in range(COVERART_MAX_HOPS):
+        resp = session.request(
+            "GET" if with_body else "HEAD",
+            url,
+            timeout=upstream_timeout("coverart"),
+            allow_redirects=False,
+        )
+        next_url = coverart_redirect(
+            url, resp.status_code, resp.headers.get("Location")
+        )
+        if next_url is not None:
+            url = next_url
+            continue
+        status, body, ttl = coverart_resolution(
+            resp.status_code,
+            resp.headers.get("Content-Type", ""),
+            resp.content if with_body else None,
+        )
+        return cache.put(key, status, url if status == 200 else None, body, ttl), "MISS"
+    return ResolvedLocation(404, None, None, 0), "MISS"
+
+
+def conditional_request_headers() -> dict[str, str]:
+    return {
+        name: request.headers[name]
+        for name in ("If-None-Match", "If-Modified-Since")
+        if name in request.headers
+    }
+
+
+def upstream_image_headers(headers: Mapping[str, str]) -> dict[str, str]:
+    selected = {
+        name: headers[name] for name in IMAGE_PASSTHROUGH_HEADERS if name in headers
+    }
+    selected.setdefault("Content-Type", "image/jpeg")
+    if "Content-Encoding" in headers:
+        selected.pop("Content-Length", None)
+    return selected
+
+
+def is_upstream_image_unchanged(
+    status: int, headers: Mapping[str, str], environ: dict
+) -> bool:
+    etag = headers.get("ETag")
+    return status == 304 or (
+        status == 200
+        and not is_resource_modified(
+            environ,
+            etag=unquote_etag(etag)[0] if etag else None,
+            last_modified=headers.get("Last-Modified"),
+        )
+    )
+
+
+def stream_upstream_image(
+    resp: requests.Response, fill: ImageCacheFill | None = None
+) -> Response:
+    headers = upstream_image_headers(resp.headers)
+    if is_upstream_image_unchanged(resp.status_code, resp.headers, request.environ):
+        resp.close()
+        if fill is not None:
+            fill.abort()
+        headers.pop("Content-Length", None)
+        return Response(status=304, headers=headers)
+
+    def generate() -> Iterator[bytes]:
+        pending = fill
+        try:
+            for chunk in resp.iter_content(IMAGE_STREAM_CHUNK_BYTES):
+                if pending is not None:
+                    pending.write(chunk)
+                yield chunk
+            if pending is not None:
+                pending.commit()
+                pending = None
+        finally:
+            if pending is not None:
+                pending.abort()
+            resp.close()
+
+    return Response(generate(), status=resp.status_code, headers=headers)
+
+
+def image_variant(
+    width: str, image_format: str | None, accept: str
+) -> tuple[int, str] | None:
+    formats = thumbnail_formats()
+    if not width.isdigit() or int(width) < 1 or not formats:
+        return None
+    if image_format not in formats:
+        image_format = next(
+            (name for name in formats if THUMBNAIL_FORMATS[name][1] in accept),
+            "jpeg",
+        )
+    return snap_thumbnail_width(int(width)), image_format
+
+
+def requested_image_variant(
+    args: Mapping[str, str], headers: Mapping[str, str]
+) -> tuple[int, str] | None:
+    return image_variant(
+        args.get("w", ""), args.get("format"), headers.get("Accept", "")
+    )
+
+
+def image_variant_key(key: str, width: int, image_format: str) -> str:
+    return f"{key}@{width}.{image_format}"
+
+
+def image_fill_metadata(
+    headers: Mapping[str, str],
+) -> tuple[str, str | None, str | None]:
+    return (
+        headers.get("Content-Type", "image/jpeg"),
+        headers.get("ETag"),
+        headers.get("Last-Modified"),
+    )
+
+
+def accel_image_headers(entry: CachedImage) -> dict[str, str] | None:
+    if not IMAGE_CACHE_ACCEL_PREFIX:
+        return None
+    return {
+        "X-Accel-Redirect": f"{IMAGE_CACHE_ACCEL_PREFIX}{entry.relative_path}",
+        "Content-Type": entry.content_type,
+        "Cache-Control": IMAGE_CACHE_CONTROL,
+    }
+
+
+def cached_image_validators(
+    entry: CachedImage, stat: os.stat_result
+) -> tuple[str, str]:
+    etag = (
+        unquote_etag(entry.etag)[0]
+        if entry.etag
+        else f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    )
+    return etag, entry.last_modified or http_date(stat.st_mtime)
+
+
+def send_cached_image(entry: CachedImage):
+    if entry.status == 404:
+        return ("Not found", 404)
+    headers = accel_image_headers(entry)
+    if headers is not None:
+        return Response(status=200, headers=headers)
+    etag, last_modified = cached_image_validators(entry, os.stat(entry.path))
+    response = send_file(
+        entry.path,
+        mimetype=entry.content_type,
+        conditional=True,
+        etag=etag,
+        last_modified=parse_date(last_modified),
+        max_age=IMAGE_CACHE_MAX_AGE_SECONDS,
+    )
+    response.headers["Cache-Control"] = IMAGE_CACHE_CONTROL
+    return response
+
+
+def proxy_cached_image(key: str, fetch: ImageFetch):
+    cache = get_image_cache()
+    if cache is None:
+        return stream_upstream_image(fetch(conditional_request_headers()))
+
+    entry = cache.get(key)
+    if entry is not None:
+        try:
+            return send_cached_image(entry)
+        except FileNotFoundError:
+            cache.forget(key)
+
+    resp = fetch({})
+    if resp.status_code == 404:
+        resp.close()
+        cache.remember_missing(key)
+        return ("Not found", 404)
+    if resp.status_code != 200:
+        return stream_upstream_image(resp)
+    fill = cache.open_fill(key, *image_fill_metadata(resp.headers))
+    return stream_upstream_image(resp, fill)
+
+
+def load_source_image(key: str, fetch: ImageFetch) -> tuple[int, bytes, str]:
+    cache = get_image_cache()
+    if cache is not None:
+        entry = cache.get(key)
+        if entry is not None and entry.status == 404:
+            return 404, b"", ""
+        if entry is not None:
+            try:
+                with open(entry.path, "rb") as handle:
+                    return 200, handle.read(), entry.content_type
+            except FileNotFoundError:
+                cache.forget(key)
+
+    resp = fetch({})
+    try:
+        if resp.status_code != 200:
+            if resp.status_code == 404 and cache is not None:
+                cache.remember_missing(key)
+            return resp.status_code, b"", ""
+        body = resp.content
+        metadata = image_fill_metadata(resp.headers)
+        if cache is not None:
+            cache.put(key, *metadata, body)
+        return 200, body, metadata[0]
+    finally:
+        resp.close()
+
+
+def proxy_image_variant(key: str, fetch: ImageFetch, width: int, image_format: str):
+    cache = get_image_cache()
+    variant_key = image_variant_key(key, width, image_format)
+    if cache is not None:
+        entry = cache.get(variant_key)
+        if entry is not None:
+            try:
+                response = send_cached_image(entry)
+                response.headers["Vary"] = "Accept"
+                return response
+            except FileNotFoundError:
+                cache.forget(variant_key)
+
+    status, source, content_type = load_source_image(key, fetch)
+    if status == 404:
+        return ("Not found", 404)
+    if status != 200:
+        return jsonify({"error": "Cover image unavailable"}), 502
+
+    variant = get_thumbnail_renderer().render(source, width, image_format)
+    if variant is None:
+        response = Response(source, mimetype=content_type)
+        response.headers["Cache-Control"] = IMAGE_FALLBACK_CACHE_CONTROL
+        response.headers["Vary"] = "Accept"
+        return response
+
+    mimetype = THUMBNAIL_FORMATS[image_format][1]
+    entry = None
+    if cache is not None:
+        cache.put(variant_key, mimetype, None, None, variant)
+        entry = cache.get(variant_key)
+    if entry is None:
+        response = Response(variant, mimetype=mimetype)
+        response.headers["Cache-Control"] = IMAGE_CACHE_CONTROL
+    else:
+        response = send_cached_image(entry)
+    response.headers["Vary"] = "Accept"
+    return response
+
+
+def is_share_view(referer: str | None) -> bool:
+    return bool(referer) and SHARE_QUERY_PARAM in parse_qs(urlparse(referer).query)
+
+
+def gamesdb_image_source(subpath: str) -> ImageSource:
+    return ImageSource(
+        f"gamesdb-images:{subpath}", "gamesdb-images", f"images/large/{subpath}"
+    )
+
+
+def coverart_image_source(image_path: str) -> ImageSource:
+    return ImageSource(
+        f"coverart:{image_path}", "coverart", image_path, resolve_location=True
+    )
+
+
+def googlebooks_image_source(params: dict) -> ImageSource:
+    return ImageSource(
+        f"googlebooks:{params['id']}:{params['zoom']}",
+        "googlebooks",
+        "books/content",
+        params,
+    )
+
+
+def cover_image_source(url: str) -> ImageSource | None:
+    parsed = urlparse(url)
+    if parsed.netloc:
+        return None
+    args = {name: values[0] for name, values in parse_qs(parsed.query).items()}
+    try:
+        if parsed.path.startswith(GAMESDB_IMAGES_ROUTE):
+            subpath = unquote(parsed.path.removeprefix(GAMESDB_IMAGES_ROUTE))
+            return gamesdb_image_source(subpath) if subpath else None
+        if parsed.path == "/api/coverart/image":
+            return coverart_image_source(
+                coverart_image_path(
+                    args.get("type"), args.get("id"), args.get("size", "500")
+                )
+            )
+        if parsed.path == "/api/googlebooks/image":
+            return googlebooks_image_source(
+                googlebooks_image_params(args.get("id"), args.get("zoom", "2"))
+            )
+    except ValueError:
+        return None
+    return None
+
+
+def open_image_source(
+    source: ImageSource, headers: dict[str, str]
+) -> requests.Response:
+    location = None
+    if source.resolve_location:
+        location = resolve_coverart(source.path, with_body=False)[0].location
+    resp = upstream_session(source.provider).get(
+        location or upstream_url(source.provider, source.path),
+        params=source.params,
+        headers=headers,
+        timeout=upstream_timeout(source.provider),
+        stream=True,
+    )
+    if location and resp.status_code >= 400:
+        get_redirect_cache().forget(
+            coverart_resolution_key(source.path, with_body=False)
+        )
+    return resp
+
+
+def proxy_image(source: ImageSource):
+    fetched = False
+
+    def fetch_upstream(headers: dict[str, str]) -> requests.Response:
+        nonlocal fetched
+        fetched = True
+        return open_image_source(source, headers)
+
+    variant = requested_image_variant(request.args, request.headers)
+    try:
+        if variant is not None:
+            response = make_response(
+                proxy_image_variant(source.key, fetch_upstream, *variant)
+            )
+        else:
+            response = make_response(proxy_cached_image(source.key, fetch_upstream))
+        response.headers["X-Cache"] = "MISS" if fetched else "HIT"
+        return response
+    finally:
+        if is_share_view(request.headers.get("Referer")):
+            record_share_view_image(not fetched)
+
+
+def prefetch_cover_image(cache: ImageCache, source: ImageSource) -> str:
+    if cache.contains(source.key):
+        return PREFETCH_CACHED
+    resp = open_image_source(source, {})
+    try:
+        if resp.status_code == 404:
+            cache.remember_missing(source.key)
+            return PREFETCH_MISSING
+        if resp.status_code != 200:
+            return PREFETCH_FAILED
+        fill = cache.open_fill(source.key, *image_fill_metadata(resp.headers))
+        try:
+            for chunk in resp.iter_content(IMAGE_STREAM_CHUNK_BYTES):
+                fill.write(chunk)
+        except BaseException:
+            fill.abort()
+            raise
+        fill.commit()
+        return PREFETCH_FETCHED
+    finally:
+        resp.close()
+
+
+def prefetch_share_covers(items: list[dict]) -> None:
+    prefetcher = get_image_prefetcher()
+    cache = get_image_cache()
+    if prefetcher is None or cache is None:
+        return
+    sources: dict[str, ImageSource] = {}
+    for item in items:
+        for url in (item.get("coverUrl"), item.get("coverThumbnailUrl")):
+            if isinstance(url, str) and url.startswith("/api/"):
+                source = cover_image_source(url)
+                if source is not None:
+                    sources.setdefault(source.key, source)
+    for key, source in sources.items():
+        prefetcher.submit(key, partial(prefetch_cover_image, cache, source))
 
 
 # Proxy TMDB requests
 @app.route("/api/tmdb/<path:subpath>", methods=["GET"])
-@limiter.limit(RATE_LIMIT_UPSTREAM)
+@limiter.limit(RATE_LIMIT_UPSTREAM, deduct_when=upstream_was_called)
 def proxy_tmdb(subpath):
-    params: dict[str, str | None] = dict(request.args)
-    params["api_key"] = TMDB_KEY
+    params = with_upstream_key("tmdb", dict(request.args))
     try:
-        resp = requests.get(
-            f"https://api.themoviedb.org/{subpath}",
-            params=params,
-            timeout=UPSTREAM_TIMEOUT_SECONDS,
+        return cached_upstream_response(
+            "tmdb", subpath, params, upstream_json_loader("tmdb", subpath, params)
         )
-        return jsonify(resp.json()), resp.status_code
-    except requests.exceptions.Timeout:
-        return jsonify({"error": "Upstream request timed out"}), 504
     except requests.exceptions.RequestException as exc:
-        return jsonify({"error": str(exc)}), 500
+        return upstream_error_response(exc)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 502
 
 
 # Proxy OpenLibrary requests
 @app.route("/api/openlibrary/<path:subpath>", methods=["GET"])
-@limiter.limit(RATE_LIMIT_UPSTREAM)
+@limiter.limit(RATE_LIMIT_UPSTREAM, deduct_when=upstream_was_called)
 def proxy_openlibrary(subpath):
+    params: dict[str, str | None] = dict(request.args)
     try:
-        resp = requests.get(
-            f"https://openlibrary.org/{subpath}",
-            params=dict(request.args),
-            timeout=UPSTREAM_TIMEOUT_SECONDS,
+        return cached_upstream_response(
+            "openlibrary",
+            subpath,
+            params,
+            upstream_json_loader("openlibrary", subpath, params),
         )
-        return jsonify(resp.json()), resp.status_code
-    except requests.exceptions.Timeout:
-        return jsonify({"error": "Upstream request timed out"}), 504
     except requests.exceptions.RequestException as exc:
-        return jsonify({"error": str(exc)}), 500
+        return upstream_error_response(exc)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 502
 
 
 # Proxy GamesDB requests
 @app.route("/api/gamesdb/<path:subpath>", methods=["GET", "POST"])
-@limiter.limit(RATE_LIMIT_UPSTREAM)
+@limiter.limit(RATE_LIMIT_UPSTREAM, deduct_when=upstream_was_called)
 def proxy_gamesdb(subpath):
     try:
-        params: dict[str, str | None] = dict(request.args)
+        params = with_upstream_key("gamesdb", dict(request.args))
         if request.method == "POST":
-            params["apikey"] = GAMESDB_KEY
-            resp = requests.post(
-                f"https://api.thegamesdb.net/{subpath}",
-                json=request.json,
-                params=params,
-                timeout=UPSTREAM_TIMEOUT_SECONDS,
-            )
-        else:
-            params["apikey"] = GAMESDB_KEY
-            resp = requests.get(
-                f"https://api.thegamesdb.net/{subpath}",
+            body = request.get_data()
+            try:
+                json_loads(body)
+            except ValueError:
+                return jsonify({"error": "Request body must be valid JSON"}), 400
+            resp = upstream_session("gamesdb").post(
+                upstream_url("gamesdb", subpath),
+                data=body,
+                headers={"Content-Type": "application/json"},
                 params=params,
-                timeout=UPSTREAM_TIMEOUT_SECONDS,
+                timeout=upstream_timeout("gamesdb"),
+                stream=True,
             )
-        return jsonify(resp.json()), resp.status_code
-    except requests.exceptions.Timeout:
-        return jsonify({"error": "Upstream request timed out"}), 504
+            return stream_upstream_json(resp)
+        return cached_upstream_response(
+            "gamesdb", subpath, params, upstream_json_loader("gamesdb", subpath, params)
+        )
     except requests.exceptions.RequestException as exc:
-        return jsonify({"error": str(exc)}), 500
+        return upstream_error_response(exc)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 502
 
 
 # Proxy GamesDB CDN images
 @app.route("/api/gamesdb/images/<path:subpath>", methods=["GET"])
-@limiter.limit(RATE_LIMIT_UPSTREAM)
+@limiter.limit(RATE_LIMIT_UPSTREAM, deduct_when=upstream_was_called)
 def proxy_gamesdb_images(subpath):
     try:
-        resp = requests.get(
-            f"https://cdn.thegamesdb.net/images/large/{subpath}",
-            timeout=UPSTREAM_TIMEOUT_SECONDS,
-        )
-        return (
-            resp.content,
-            resp.status_code,
-            {
-                "Content-Type": resp.headers.get("Content-Type", "image/jpeg"),
-            },
-        )
-    except requests.exceptions.Timeout:
-        return jsonify({"error": "Upstream request timed out"}), 504
+        return proxy_image(gamesdb_image_source(subpath))
     except requests.exceptions.RequestException as exc:
-        return jsonify({"error": str(exc)}), 500
+        return upstream_error_response(exc)
 
 
 @app.route("/api/coverart/image", methods=["GET"])
-@limiter.limit(RATE_LIMIT_UPSTREAM)
+@limiter.limit(RATE_LIMIT_UPSTREAM, deduct_when=upstream_was_called)
 def proxy_coverart_image():
-    cover_type = request.args.get("type")
-    cover_id = request.args.get("id")
-    size = request.args.get("size", "500")
-    if cover_type != "release":
-        return jsonify({"error": "Invalid cover type"}), 400
-    if not cover_id:
-        return jsonify({"error": "Missing cover id"}), 400
-    if size not in ("250", "500"):
-        size = "500"
-
     try:
-        resp = requests.get(
-            f"https://coverartarchive.org/release/{cover_id}/front-{size}",
-            timeout=UPSTREAM_TIMEOUT_SECONDS,
-            allow_redirects=False,
+        image_path = coverart_image_path(
+            request.args.get("type"),
+            request.args.get("id"),
+            request.args.get("size", "500"),
         )
-        location = resp.headers.get("Location")
-        if 300 <= resp.status_code < 400 and location:
-            return redirect(location, code=resp.status_code)
-        return (
-            resp.content,
-            resp.status_code,
-            {"Content-Type": resp.headers.get("Content-Type", "image/jpeg")},
-        )
-    except requests.exceptions.Timeout:
-        return ("Not found", 404)
-    except requests.exceptions.RequestException:
-        return ("Not found", 404)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    try:
+        if get_image_cache() is not None or requested_image_variant(
+            request.args, request.headers
+        ):
+            return proxy_image(coverart_image_source(image_path))
+        entry, state = resolve_coverart(image_path, with_body=False)
+        if entry.location is None:
+            return ("Not found", 404, {"X-Cache": state})
+        response = redirect(entry.location, code=307)
+        response.headers["X-Cache"] = state
+        return response
+    except requests.exceptions.RequestException as exc:
+        return upstream_error_response(exc)
 
 
 @app.route("/api/coverart/metadata", methods=["GET"])
-@limiter.limit(RATE_LIMIT_UPSTREAM)
+@limiter.limit(RATE_LIMIT_UPSTREAM, deduct_when=upstream_was_called)
 def proxy_coverart_metadata():
-    cover_type = request.args.get("type")
-    cover_id = request.args.get("id")
-    if cover_type not in ("release", "release-group"):
-        return jsonify({"error": "Invalid cover type"}), 400
-    if not cover_id:
-        return jsonify({"error": "Missing cover id"}), 400
-
-    target_url = f"https://coverartarchive.org/{cover_type}/{cover_id}"
-
-    def request_metadata(url, depth=0):
-        if depth > 2:
-            return jsonify({"error": "Cover art metadata unavailable"}), 404
-        resp = requests.get(
-            url, timeout=UPSTREAM_TIMEOUT_SECONDS, allow_redirects=False
+    try:
+        metadata_path = coverart_metadata_path(
+            request.args.get("type"), request.args.get("id")
         )
-        if 300 <= resp.status_code < 400 and resp.headers.get("Location"):
-            next_url = urljoin(url, resp.headers["Location"])
-            return request_metadata(next_url, depth + 1)
-        content_type = resp.headers.get("Content-Type", "")
-        if "application/json" not in content_type.lower():
-            return jsonify({"error": "Cover art metadata unavailable"}), 404
-        try:
-            payload = resp.json()
-        except ValueError:
-            return jsonify({"error": "Cover art metadata unavailable"}), 404
-        return jsonify(payload), resp.status_code
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
 
     try:
-        return request_metadata(target_url)
-    except requests.exceptions.Timeout:
-        return jsonify({"error": "Upstream request timed out"}), 504
+        entry, state = resolve_coverart(metadata_path, with_body=True)
+        if entry.body is None:
+            return (
+                jsonify({"error": "Cover art metadata unavailable"}),
+                404,
+                {"X-Cache": state},
+            )
+        return Response(
+            entry.body,
+            status=entry.status,
+            headers={"Content-Type": "application/json", "X-Cache": state},
+        )
     except requests.exceptions.RequestException as exc:
-        return jsonify({"error": str(exc)}), 500
+        return upstream_error_response(exc)
 
 
 @app.route("/api/googlebooks/image", methods=["GET"])
-@limiter.limit(RATE_LIMIT_UPSTREAM)
+@limiter.limit(RATE_LIMIT_UPSTREAM, deduct_when=upstream_was_called)
 def proxy_googlebooks_image():
-    volume_id = request.args.get("id")
-    zoom = request.args.get("zoom", "2")
-    if not volume_id:
-        return jsonify({"error": "Missing volume id"}), 400
-    if zoom not in ("1", "2", "3"):
-        zoom = "2"
+    try:
+        params = googlebooks_image_params(
+            request.args.get("id"), request.args.get("zoom", "2")
+        )
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
 
     try:
-        resp = requests.get(
-            "https://books.google.com/books/content",
-            params={
-                "id": volume_id,
-                "printsec": "frontcover",
-                "img": "1",
-                "zoom": zoom,
-            },
-            timeout=UPSTREAM_TIMEOUT_SECONDS,
-            allow_redirects=True,
+        return proxy_image(googlebooks_image_source(params))
+    except requests.exceptions.RequestException as exc:
+        return upstream_error_response(exc)
+
+
+def paced_upstream_response(provider: str, subpath: str, params: dict[str, str | None]):
+    loader = upstream_json_loader(
+        provider,
+        subpath,
+        params,
+        request_priority(request.headers.get(PRIORITY_HEADER)),
+    )
+    try:
+        return cached_upstream_response(provider, subpath, params, loader)
+    except requests.exceptions.RequestException as exc:
+        return upstream_error_response(exc)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 502
+
+
+# Proxy MusicBrainz requests, paced to its one request per second
+@app.route("/api/musicbrainz/<path:subpath>", methods=["GET"])
+@limiter.limit(RATE_LIMIT_UPSTREAM, deduct_when=upstream_was_called)
+def proxy_musicbrainz(subpath):
+    return paced_upstream_response(
+        "musicbrainz", subpath, {**dict(request.args), "fmt": "json"}
+    )
+
+
+# Proxy iTunes Search requests, paced to its twenty requests per minute
+@app.route("/api/itunes/<path:subpath>", methods=["GET"])
+@limiter.limit(RATE_LIMIT_UPSTREAM, deduct_when=upstream_was_called)
+def proxy_itunes(subpath):
+    return paced_upstream_response("itunes", subpath, dict(request.args))
+
+
+def search_upstream(source: SearchSource, query: str) -> dict:
+    params = with_upstream_key(source.provider, source.params(query))
+    try:
+        entry, state = get_response_cache().fetch(
+            response_cache_key(source.provider, source.path, params),
+            source.provider,
+            RESPONSE_CACHE_POLICIES[source.provider],
+            upstream_json_loader(source.provider, source.path, params),
         )
-        return (
-            resp.content,
-            resp.status_code,
-            {"Content-Type": resp.headers.get("Content-Type", "image/jpeg")},
+    except (requests.exceptions.RequestException, ValueError) as exc:
+        return search_failure(source, exc)
+    return search_outcome(source, entry.status, entry.body, state)
+
+
+def stream_search(
+    sources: list[SearchSource], query: str, address: str | None
+) -> Iterator[bytes]:
+    rate_limiter = limiter.limiter
+    fanout: SearchFanout[Future[dict]] = SearchFanout()
+    for source in sources:
+        if address is not None and not rate_limiter.test(
+            UPSTREAM_RATE_LIMIT, address, source.endpoint
+        ):
+            yield fanout.rate_limited(source)
+            continue
+        fanout.start(
+            get_search_executor().submit(search_upstream, source, query), source
         )
-    except requests.exceptions.Timeout:
-        return ("Not found", 404)
-    except requests.exceptions.RequestException:
-        return ("Not found", 404)
+
+    while fanout.pending:
+        done, _ = wait(
+            fanout.pending, timeout=fanout.timeout(), return_when=FIRST_COMPLETED
+        )
+        for future in done:
+            line, charged = fanout.finish(future, future.result())
+            if address is not None and charged is not None:
+                rate_limiter.hit(UPSTREAM_RATE_LIMIT, address, charged.endpoint)
+            yield line
+        for line, charged in fanout.expire():
+            if address is not None:
+                rate_limiter.hit(UPSTREAM_RATE_LIMIT, address, charged.endpoint)
+            yield line
+    yield fanout.done()
+
+
+# Fan one query out to several providers and stream results as they arrive
+@app.route("/api/search/stream", methods=["GET"])
+def search():
+    try:
+        query = parse_search_query(request.args.get("q"))
+        sources = parse_search_sources(request.args.get("sources"))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    address = None if is_rate_limit_exempt() else get_rate_limit_address()
+    return Response(
+        stream_search(sources, query, address),
+        mimetype=SEARCH_CONTENT_TYPE,
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.route("/api/share", methods=["POST"])
@@ -541,35 +1633,47 @@ def create_share():
         return jsonify({"error": "title must be a non-empty string"}), 400
 
     try:
-        canonical_payload = validate_and_canonicalize_share_payload(payload)
+        canonical_payload, grid_items = validate_and_canonicalize_share_payload(payload)
     except json.JSONDecodeError:
         return jsonify({"error": "payload must be valid JSON"}), 400
     except (TypeError, ValueError) as exc:
         return jsonify({"error": str(exc)}), 400
 
-    with acquire_share_store_lock(exclusive=True):
-        store = load_share_store()
-        slug = generate_slug(set(store.keys()))
-        store[slug] = {
+    slug = insert_share_record(
+        get_share_store(),
+        {
             "payload": canonical_payload,
             "createdAt": int(time.time()),
             "title": title,
             "clientAddress": get_client_address(),
             "userAgent": get_user_agent(),
-        }
-        persist_share_store(store)
+        },
+    )
+    prefetch_share_covers(grid_items)
 
     return jsonify({"slug": slug, "id": slug})
 
 
 @app.route("/api/share/<slug>", methods=["GET"])
-@limiter.limit(RATE_LIMIT_SHARE_READ)
+@limiter.limit(RATE_LIMIT_SHARE_READ, deduct_when=share_was_sent)
 def get_share(slug: str):
-    with acquire_share_store_lock(exclusive=False):
-        store = load_share_store()
-    record = store.get(slug)
+    share_store = get_share_store()
+    record = share_store.get(slug)
     if not record:
         return jsonify({"error": "Share not found"}), 404
+    if isinstance(record.get("document"), bytes):
+        try:
+            return send_compressed_share(record["document"], record["dictionary"])
+        except OSError, ValueError:
+            # compress-shares can prune the dictionary of a frame still held in
+            # the read cache; the stored row was recompressed against a live one
+            share_store.forget(slug)
+            record = share_store.get(slug) or {}
+    if isinstance(record.get("document"), bytes):
+        try:
+            return send_compressed_share(record["document"], record["dictionary"])
+        except OSError, ValueError:
+            return jsonify({"error": "Share dictionary is missing"}), 500
 
     payload = record.get("payload")
     if not isinstance(payload, str):
@@ -579,20 +1683,276 @@ def get_share(slug: str):
     if title is not None and not isinstance(title, str):
         return jsonify({"error": "Share title is invalid"}), 500
 
-    return jsonify({"slug": slug, "payload": payload, "title": title})
+    response = jsonify({"slug": slug, "payload": payload, "title": title})
+    response.set_etag(hashlib.blake2b(response.get_data(), digest_size=16).hexdigest())
+    response.headers["Cache-Control"] = (
+        f"public, max-age={SHARE_MAX_AGE_SECONDS}, immutable"
+    )
+    return response.make_conditional(request)
+
+
+def send_compressed_share(frame: bytes, digest: str) -> Response:
+    codec = get_share_codec()
+    dictionary = codec.dictionary(digest)
+    # A browser holding the dictionary gets the stored frame untouched
+    passthrough = (
+        request.accept_encodings.quality(SHARE_CONTENT_ENCODING) > 0
+        and request.headers.get("Available-Dictionary") == dictionary.available
+    )
+    etag = hashlib.blake2b(frame, digest_size=16).hexdigest()
+    if passthrough:
+        etag = f"{etag}-{SHARE_CONTENT_ENCODING}"
+    response = Response(mimetype="application/json")
+    response.set_etag(etag)
+    response.vary.update(("Accept-Encoding", "Available-Dictionary"))
+    response.headers["Cache-Control"] = (
+        f"public, max-age={SHARE_MAX_AGE_SECONDS}, immutable"
+    )
+    current = codec.current()
+    if current is not None and request.headers.get("Available-Dictionary") != (
+        current.available
+    ):
+        response.headers["Link"] = (
+            f"<{url_for('get_share_dictionary', digest=current.digest)}>; "
+            'rel="compression-dictionary"'
+        )
+    if not is_resource_modified(request.environ, etag=etag):
+        return response.make_conditional(request)
+    if passthrough:
+        response.set_data(codec.encode(frame, digest))
+        response.headers["Content-Encoding"] = SHARE_CONTENT_ENCODING
+    else:
+        response.set_data(codec.decompress(frame, digest))
+    return response.make_conditional(request)
+
+
+@app.route("/api/share/dictionary/<digest>", methods=["GET"])
+def get_share_dictionary(digest: str):
+    try:
+        dictionary = get_share_codec().dictionary(digest)
+    except OSError, ValueError:
+        return jsonify({"error": "Dictionary not found"}), 404
+    response = Response(dictionary.content, mimetype="application/octet-stream")
+    response.headers["Use-As-Dictionary"] = (
+        f'match="/api/share/*", id="{dictionary.digest}"'
+    )
+    response.set_etag(dictionary.digest)
+    response.headers["Cache-Control"] = (
+        f"public, max-age={SHARE_MAX_AGE_SECONDS}, immutable"
+    )
+    return response.make_conditional(request)
+
+
+@app.route("/api/stats", methods=["GET"])
+def get_stats():
+    if not is_internal_request():
+        return jsonify({"error": "Not found"}), 404
+    image_cache = get_image_cache()
+    image_prefetcher = get_image_prefetcher()
+    return jsonify(
+        {
+            "pid": os.getpid(),
+            "shareReadCache": get_share_store().stats(),
+            "shareCodec": get_share_codec().stats(),
+            "slugs": get_slug_allocator().stats(),
+            "responseCache": get_response_cache().stats(),
+            "imageCache": image_cache.stats() if image_cache else None,
+            "imagePrefetch": image_prefetcher.stats() if image_prefetcher else None,
+            "redirectCache": get_redirect_cache().stats(),
+            "thumbnails": get_thumbnail_renderer().stats(),
+            "upstreamBreakers": upstream_breaker_stats(),
+            "upstreamSchedulers": upstream_scheduler_stats(),
+            "staticAssets": get_static_manifest().stats(),
+        }
+    )
+
+
+def share_store_bytes() -> int:
+    if SHARE_STORE_BACKEND == "json":
+        paths = [SHARE_STORE_PATH]
+    else:
+        paths = [SHARE_DATABASE_PATH, f"{SHARE_DATABASE_PATH}-wal"]
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics_text():
+    metrics = get_metrics()
+    if metrics is None or not is_internal_request():
+        return jsonify({"error": "Not found"}), 404
+    image_cache = get_image_cache()
+    gauges = [
+        Gauge(
+            "aoife_share_store_shares", "Shares in the store", get_share_store().count()
+        ),
+        Gauge(
+            "aoife_share_store_bytes", "Share store size on disk", share_store_bytes()
+        ),
+        Gauge(
+            "aoife_response_cache_bytes",
+            "Upstream response cache size",
+            get_response_cache().stats()["bytes"],
+        ),
+    ]
+    if image_cache is not None:
+        gauges.append(
+            Gauge(
+                "aoife_image_cache_bytes",
+                "Image cache size",
+                image_cache.stats()["bytes"],
+            )
+        )
+    return Response(metrics.registry.render(gauges), content_type=METRICS_CONTENT_TYPE)
 
 
 # Serve static files and SPA
+def send_static_asset(asset: StaticAsset) -> Response:
+    encoding = next(
+        (
+            encoding
+            for encoding in ("br", "gzip")
+            if encoding in asset.encodings
+            and request.accept_encodings.quality(encoding) > 0
+        ),
+        None,
+    )
+    body = asset.encodings[encoding] if encoding else asset.body
+    response = Response(body, content_type=asset.content_type)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    if asset.encodings:
+        response.vary.add("Accept-Encoding")
+    response.set_etag(f"{asset.etag}-{encoding}" if encoding else asset.etag)
+    response.last_modified = asset.last_modified
+    response.headers["Cache-Control"] = (
+        f"public, max-age={STATIC_IMMUTABLE_MAX_AGE_SECONDS}, immutable"
+        if asset.immutable
+        else "no-cache"
+    )
+    return response.make_conditional(
+        request, accept_ranges=True, complete_length=len(body)
+    )
+
+
 @app.route("/")
 def serve_root():
-    return send_from_directory(DIST_PATH, "index.html")
+    return serve_static("index.html")
 
 
 @app.route("/<path:path>")
 def serve_static(path):
-    if os.path.exists(os.path.join(DIST_PATH, path)):
-        return send_from_directory(DIST_PATH, path)
-    return send_from_directory(DIST_PATH, "index.html")
+    asset = get_static_manifest().resolve(path)
+    if asset is None:
+        return jsonify({"error": "Not found"}), 404
+    return send_static_asset(asset)
+
+
+def preload_shared_data() -> None:
+    # Built once in the gunicorn master under --preload; workers inherit these
+    # read-only structures copy-on-write instead of each loading their own
+    get_slug_words()
+    get_rate_limit_exempt_addresses()
+    get_static_manifest()
+    get_share_codec().current()
+    # Keeps the collector from writing to inherited objects and copying pages
+    gc.freeze()
+
+
+def reset_worker_resources() -> None:
+    # Anything holding threads, sockets, queues or per-worker counters starts
+    # over in each forked worker; only the preloaded data above is inherited
+    global _INITIALIZATION_LOCK, _METRICS, _SLUG_ALLOCATOR, _SHARE_STORE
+    global _RESPONSE_CACHE, _IMAGE_CACHE, _IMAGE_PREFETCHER, _SEARCH_EXECUTOR
+    global _REDIRECT_CACHE, _THUMBNAIL_RENDERER
+    _INITIALIZATION_LOCK = threading.Lock()
+    _METRICS = None
+    _SLUG_ALLOCATOR = None
+    _SHARE_STORE = None
+    _RESPONSE_CACHE = None
+    _IMAGE_CACHE = None
+    _IMAGE_PREFETCHER = None
+    _SEARCH_EXECUTOR = None
+    _REDIRECT_CACHE = None
+    _THUMBNAIL_RENDERER = None
+    _UPSTREAM_SCHEDULERS.clear()
+
+
+os.register_at_fork(after_in_child=reset_worker_resources)
+
+if PRELOAD_SHARED_DATA:
+    preload_shared_data()
+
+
+@app.cli.command("migrate-shares")
+def migrate_shares_command():
+    if SHARE_STORE_BACKEND != "sqlite":
+        raise click.UsageError("migrate-shares requires AOIFE_SHARE_STORE=sqlite")
+    store = SqliteShareStore(SHARE_DATABASE_PATH, codec=get_share_codec())
+    inserted = migrate_json_share_store(SHARE_STORE_PATH, SHARE_STORE_LOCK_PATH, store)
+    click.echo(f"Migrated {inserted} shares; store now holds {store.count()}")
+
+
+@app.cli.command("export-shares")
+@click.option(
+    "--database",
+    type=click.Path(exists=True, dir_okay=False),
+    help="read this share.db instead of the configured store",
+)
+def export_shares_command(database: str | None):
+    # Prints the store as one share.json object, compressed rows inflated
+    if database is not None:
+        store: ShareStore = SqliteShareStore(database, codec=get_share_codec())
+    else:
+        store = get_share_store()
+    separator = "{"
+    for slug, record in store.items():
+        click.echo(f"{separator}{json.dumps(slug)}:{json.dumps(record)}", nl=False)
+        separator = ","
+    click.echo("{}" if separator == "{" else "}")
+
+
+@app.cli.command("train-share-dictionary")
+@click.option("--size", default=SHARE_DICTIONARY_BYTES, show_default=True)
+@click.option("--samples", default=20_000, show_default=True)
+def train_share_dictionary_command(size: int, samples: int):
+    if SHARE_STORE_BACKEND != "sqlite":
+        raise click.UsageError("share compression requires AOIFE_SHARE_STORE=sqlite")
+    codec = get_share_codec()
+    store = SqliteShareStore(SHARE_DATABASE_PATH, codec=codec)
+    documents = list(store.documents(samples))
+    try:
+        content = train_share_dictionary(documents, size)
+    except zstd.ZstdError as exc:
+        raise click.UsageError(
+            f"Unable to train on {len(documents)} shares: {exc}"
+        ) from exc
+    dictionary = codec.install(content)
+    click.echo(
+        f"Trained {len(content)} byte dictionary {dictionary.digest} "
+        f"on {len(documents)} shares; run compress-shares to apply it"
+    )
+
+
+@app.cli.command("compress-shares")
+@click.option("--prune", is_flag=True, help="delete dictionaries no share uses")
+@click.option("--vacuum", is_flag=True, help="return freed pages to the filesystem")
+def compress_shares_command(prune: bool, vacuum: bool):
+    if SHARE_STORE_BACKEND != "sqlite":
+        raise click.UsageError("share compression requires AOIFE_SHARE_STORE=sqlite")
+    codec = get_share_codec()
+    if codec.current() is None:
+        raise click.UsageError("no share dictionary; run train-share-dictionary")
+    store = SqliteShareStore(SHARE_DATABASE_PATH, codec=codec)
+    before = share_store_bytes()
+    recompressed = store.recompress()
+    if vacuum:
+        store.vacuum()
+    click.echo(
+        f"Recompressed {recompressed} shares; store {before} -> "
+        f"{share_store_bytes()} bytes"
+    )
+    if prune:
+        click.echo(f"Removed {codec.prune(store.dictionaries())} dictionaries")
 
 
 if __name__ == "__main__":
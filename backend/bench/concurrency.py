@@ -0,0 +1,139 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+import aiohttp
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench.server import AsgiServer, BackendServer
+from bench.stubs import AsyncStubUpstream
+
+
+async def fetch(
+    session: aiohttp.ClientSession, url: str, slots: asyncio.Semaphore
+) -> float | None:
+    async with slots:
+        started = time.perf_counter()
+        try:
+            async with session.get(url) as resp:
+                await resp.read()
+                if resp.status != 200:
+                    return None
+        except aiohttp.ClientError, TimeoutError:
+            return None
+        return time.perf_counter() - started
+
+
+async def run_load(
+    base_url: str, label: str, concurrency: int, requests_per_level: int, timeout: float
+) -> tuple[list[float | None], float]:
+    slots = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(
+        connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)
+    ) as session:
+        started = time.perf_counter()
+        latencies = await asyncio.gather(
+            *(
+                fetch(
+                    session,
+                    f"{base_url}/api/tmdb/3/search/movie"
+                    f"?query={label}-{concurrency}-{index}",
+                    slots,
+                )
+                for index in range(requests_per_level)
+            )
+        )
+        return latencies, time.perf_counter() - started
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Proxy concurrency and tail latency: gthread workers vs. ASGI"
+    )
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--concurrency", default="64,256,512")
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    stub = AsyncStubUpstream(latency=args.latency)
+    base_url = stub.start()
+    environment = {
+        "AOIFE_UPSTREAM_TMDB_URL": base_url,
+        "AOIFE_UPSTREAM_OPENLIBRARY_URL": base_url,
+        "AOIFE_UPSTREAM_GAMESDB_URL": base_url,
+    }
+    servers = {
+        "threads": BackendServer(args.workers, args.threads, environment),
+        "asgi": AsgiServer(args.workers, args.threads, environment),
+    }
+    results = []
+    try:
+        for mode, server in servers.items():
+            server.start()
+            try:
+                for concurrency in (
+                    int(value) for value in args.concurrency.split(",")
+                ):
+                    latencies, elapsed = asyncio.run(
+                        run_load(
+                            server.url,
+                            mode,
+                            concurrency,
+                            concurrency * args.rounds,
+                            args.timeout,
+                        )
+                    )
+                    completed = [value for value in latencies if value is not None]
+                    stats = requests.get(
+                        f"{server.url}/api/stats", timeout=args.timeout
+                    ).json()
+                    result = {
+                        "mode": mode,
+                        "concurrency": concurrency,
+                        "requests": len(latencies),
+                        "completed": len(completed),
+                        "failed": len(latencies) - len(completed),
+                        "requests_per_second": round(len(completed) / elapsed, 1),
+                        "p50_ms": round(statistics.median(completed) * 1000, 1)
+                        if completed
+                        else None,
+                        "p99_ms": round(percentile(completed, 0.99) * 1000, 1)
+                        if completed
+                        else None,
+                        "peak_in_flight": stats.get("peakInFlight"),
+                    }
+                    results.append(result)
+                    print(
+                        f"{mode:>7}  {concurrency:>5} concurrent  "
+                        f"{result['completed']:>5}/{result['requests']} ok  "
+                        f"{result['requests_per_second']:>7.1f} req/s  "
+                        f"p50 {result['p50_ms']} ms  p99 {result['p99_ms']} ms"
+                    )
+            finally:
+                server.stop()
+    finally:
+        stub.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
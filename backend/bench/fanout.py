@@ -0,0 +1,155 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench.server import AsgiServer, BackendServer
+from bench.stubs import StubUpstream
+
+PROVIDER_LATENCIES = {"tmdb": 0.15, "gamesdb": 0.4, "openlibrary": 0.8}
+PROXY_SEARCHES = (
+    "/api/tmdb/3/search/movie?query={query}",
+    "/api/tmdb/3/search/tv?query={query}",
+    "/api/gamesdb/v1/Games/ByGameName?name={query}&include=boxart",
+    "/api/openlibrary/search.json?q={query}&limit=20",
+)
+
+
+def proxy_search(
+    session: requests.Session, base_url: str, path: str, rtt: float
+) -> None:
+    time.sleep(rtt)
+    session.get(f"{base_url}{path}", timeout=60).raise_for_status()
+
+
+def sequential(base_url: str, query: str, rtt: float) -> tuple[float, float]:
+    session = requests.Session()
+    started = time.perf_counter()
+    first = None
+    for path in PROXY_SEARCHES:
+        proxy_search(session, base_url, path.format(query=query), rtt)
+        first = first or time.perf_counter() - started
+    return first or 0.0, time.perf_counter() - started
+
+
+def parallel(base_url: str, query: str, rtt: float) -> tuple[float, float]:
+    started = time.perf_counter()
+    first = None
+    with ThreadPoolExecutor(len(PROXY_SEARCHES)) as pool:
+        futures = [
+            pool.submit(
+                proxy_search,
+                requests.Session(),
+                base_url,
+                path.format(query=query),
+                rtt,
+            )
+            for path in PROXY_SEARCHES
+        ]
+        for future in as_completed(futures):
+            future.result()
+            first = first or time.perf_counter() - started
+    return first or 0.0, time.perf_counter() - started
+
+
+def fanout(base_url: str, query: str, rtt: float) -> tuple[float, float]:
+    started = time.perf_counter()
+    first = None
+    time.sleep(rtt)
+    with requests.get(
+        f"{base_url}/api/search/stream", params={"q": query}, stream=True, timeout=60
+    ) as resp:
+        resp.raise_for_status()
+        for line in resp.iter_lines():
+            outcome = json.loads(line)
+            if outcome["status"] == "done":
+                break
+            if outcome["status"] != "ok":
+                raise RuntimeError(f"search leg failed: {outcome}")
+            first = first or time.perf_counter() - started
+    return first or 0.0, time.perf_counter() - started
+
+
+MODES = {"sequential": sequential, "parallel": parallel, "fanout": fanout}
+
+
+def run(server_class: type[BackendServer], stubs: dict[str, str], args) -> dict:
+    server = server_class(
+        workers=args.workers,
+        threads=args.threads,
+        environment={
+            f"AOIFE_UPSTREAM_{provider.upper()}_URL": url
+            for provider, url in stubs.items()
+        },
+    ).start()
+    results = {}
+    try:
+        for name, mode in MODES.items():
+            timings = [
+                mode(server.url, f"{name}-{index}", args.rtt)
+                for index in range(args.searches)
+            ]
+            results[name] = {
+                "first_p50_ms": round(
+                    statistics.median(first for first, _ in timings) * 1000, 1
+                ),
+                "all_p50_ms": round(
+                    statistics.median(total for _, total in timings) * 1000, 1
+                ),
+            }
+    finally:
+        server.stop()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Time to first and to all search results: one proxy request "
+        "per provider against a single streamed /api/search/stream"
+    )
+    parser.add_argument(
+        "--rtt", type=float, default=0.1, help="emulated client round trip"
+    )
+    parser.add_argument("--searches", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--asgi", action="store_true", help="also run under uvicorn")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    stubs = {
+        provider: StubUpstream(latency=latency)
+        for provider, latency in PROVIDER_LATENCIES.items()
+    }
+    urls = {provider: stub.start() for provider, stub in stubs.items()}
+    servers = {"gunicorn": BackendServer}
+    if args.asgi:
+        servers["uvicorn"] = AsgiServer
+    results = {}
+    try:
+        for server_name, server_class in servers.items():
+            results[server_name] = run(server_class, urls, args)
+            for mode, result in results[server_name].items():
+                print(
+                    f"{server_name:>8}  {mode:>10}  "
+                    f"first p50 {result['first_p50_ms']} ms  "
+                    f"all p50 {result['all_p50_ms']} ms"
+                )
+    finally:
+        for stub in stubs.values():
+            stub.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench.server import BackendServer
+from bench.stubs import StubUpstream
+
+
+def fetch_image(session: requests.Session, base_url: str, index: int) -> int:
+    resp = session.get(
+        f"{base_url}/api/gamesdb/images/boxart/front/{index}-1.jpg",
+        timeout=60,
+    )
+    resp.raise_for_status()
+    return len(resp.content)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Peak worker RSS while proxying growing numbers of images"
+    )
+    parser.add_argument("--counts", default="24,96,384")
+    parser.add_argument("--image-bytes", type=int, default=1024 * 1024)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    stub = StubUpstream(image_bytes=args.image_bytes)
+    base_url = stub.start()
+    results = []
+    try:
+        for count in (int(value) for value in args.counts.split(",")):
+            server = BackendServer(
+                workers=1,
+                threads=args.threads,
+                environment={
+                    "AOIFE_UPSTREAM_GAMESDB_IMAGES_URL": base_url,
+                    "AOIFE_UPSTREAM_COVERART_URL": base_url,
+                    "AOIFE_UPSTREAM_GOOGLEBOOKS_URL": base_url,
+                },
+            ).start()
+            try:
+                baseline = max(server.memory_kib()["rss"])
+                session = requests.Session()
+                with ThreadPoolExecutor(max_workers=args.threads) as executor:
+                    received = sum(
+                        executor.map(
+                            partial(fetch_image, session, server.url), range(count)
+                        )
+                    )
+                peak = max(server.memory_kib()["peak"])
+            finally:
+                server.stop()
+            result = {
+                "images": count,
+                "bytes_proxied": received,
+                "baseline_rss_kib": baseline,
+                "peak_rss_kib": peak,
+                "growth_kib": peak - baseline,
+            }
+            results.append(result)
+            print(
+                f"{count:>6} images  {received / 1_048_576:>8.1f} MiB proxied  "
+                f"peak RSS {peak / 1024:>7.1f} MiB  "
+                f"(+{result['growth_kib'] / 1024:.1f} MiB over idle)"
+            )
+    finally:
+        stub.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
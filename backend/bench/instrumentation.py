@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench.server import BackendServer
+from bench.stubs import StubUpstream
+from metrics import MetricsRegistry, ServiceMetrics
+
+PROXY_PATH = "/api/tmdb/3/search/movie?query=bench"
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure_recording(observations: int) -> dict:
+    with tempfile.TemporaryDirectory(prefix="aoife-bench-") as directory:
+        metrics = ServiceMetrics(MetricsRegistry(os.path.join(directory, "metrics.db")))
+        started = time.perf_counter()
+        for index in range(observations):
+            metrics.request_finished("proxy_tmdb", "GET", 200, (index % 100) / 1000)
+        elapsed = time.perf_counter() - started
+        metrics.registry.flush()
+    return {"ns_per_request": round(elapsed / observations * 1e9)}
+
+
+def fetch(session: requests.Session, url: str) -> float:
+    started = time.perf_counter()
+    resp = session.get(url, timeout=30)
+    resp.raise_for_status()
+    return time.perf_counter() - started
+
+
+def drive(url: str, requests_count: int, threads: int) -> dict:
+    session = requests.Session()
+    fetch(session, url)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        timings = list(pool.map(lambda _: fetch(session, url), range(requests_count)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests_per_second": round(requests_count / elapsed),
+        "p50_ms": round(statistics.median(timings) * 1000, 2),
+        "p99_ms": round(percentile(timings, 0.99) * 1000, 2),
+    }
+
+
+def scraped_requests(server: BackendServer) -> int:
+    text = requests.get(f"{server.url}/metrics", timeout=30).text
+    pattern = re.compile(
+        r'^aoife_http_requests_total\{endpoint="proxy_tmdb",.*\} (\S+)$'
+    )
+    return sum(
+        int(float(match[1]))
+        for match in (pattern.match(line) for line in text.splitlines())
+        if match
+    )
+
+
+def run(enabled: bool, base_url: str, args: argparse.Namespace) -> dict:
+    server = BackendServer(
+        workers=args.workers,
+        threads=args.threads,
+        environment={
+            "AOIFE_UPSTREAM_TMDB_URL": base_url,
+            "AOIFE_METRICS_FLUSH_INTERVAL": "1" if enabled else "0",
+        },
+    ).start()
+    try:
+        result = {
+            "metrics": enabled,
+            "workers": args.workers,
+            **drive(f"{server.url}{PROXY_PATH}", args.requests, args.threads),
+        }
+        if enabled:
+            time.sleep(2.5)
+            result["sent"] = args.requests + 1
+            result["scraped"] = scraped_requests(server)
+        return result
+    finally:
+        server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Metrics overhead on the cached proxy path and worker aggregation"
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--observations", type=int, default=200_000)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    recording = measure_recording(args.observations)
+    print(f"recording a request: {recording['ns_per_request']} ns in-process")
+
+    stub = StubUpstream()
+    base_url = stub.start()
+    runs = []
+    try:
+        for enabled in (False, True, False, True):
+            result = run(enabled, base_url, args)
+            runs.append(result)
+            print(
+                f"metrics {'on ' if enabled else 'off'}  {args.workers} workers  "
+                f"{result['requests_per_second']:>6} req/s  "
+                f"p50 {result['p50_ms']:>6.2f} ms  p99 {result['p99_ms']:>7.2f} ms"
+                + (
+                    f"  scraped {result['scraped']}/{result['sent']} requests"
+                    if enabled
+                    else ""
+                )
+            )
+    finally:
+        stub.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump({"recording": recording, "runs": runs}, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from jsoncodec import is_json_content_type, orjson
+
+DEFAULT_ROUTES = "tmdb-search,openlibrary-search,openlibrary-works,gamesdb-search"
+
+
+def tmdb_search(generator: random.Random) -> dict:
+    return {
+        "page": 1,
+        "results": [
+            {
+                "adult": False,
+                "backdrop_path": f"/{generator.getrandbits(64):x}.jpg",
+                "genre_ids": [generator.randint(1, 10000) for _ in range(3)],
+                "id": generator.randint(1, 10**6),
+                "original_language": "en",
+                "original_title": f"Movie title {index}",
+                "overview": "A story about something. " * 12,
+                "popularity": round(generator.random() * 100, 3),
+                "poster_path": f"/{generator.getrandbits(64):x}.jpg",
+                "release_date": "1999-03-31",
+                "title": f"Movie title {index}",
+                "video": False,
+                "vote_average": round(generator.random() * 10, 1),
+                "vote_count": generator.randint(0, 30000),
+            }
+            for index in range(20)
+        ],
+        "total_pages": 12,
+        "total_results": 231,
+    }
+
+
+def openlibrary_search(generator: random.Random) -> dict:
+    return {
+        "numFound": 4120,
+        "start": 0,
+        "docs": [
+            {
+                "key": f"/works/OL{generator.randint(1, 10**7)}W",
+                "title": f"Book title {index}",
+                "author_name": ["Some Author"],
+                "author_key": [f"OL{generator.randint(1, 10**6)}A"],
+                "cover_i": generator.randint(1, 10**7),
+                "edition_count": generator.randint(1, 400),
+                "first_publish_year": generator.randint(1800, 2024),
+                "isbn": [str(generator.randint(10**12, 10**13)) for _ in range(25)],
+                "language": ["eng", "fre", "ger"],
+                "subject": [f"Subject {value}" for value in range(30)],
+            }
+            for index in range(100)
+        ],
+    }
+
+
+def openlibrary_works(generator: random.Random) -> dict:
+    return {
+        "links": {"self": "/authors/OL23919A/works.json?limit=500"},
+        "size": 500,
+        "entries": [
+            {
+                "key": f"/works/OL{generator.randint(1, 10**7)}W",
+                "title": f"Work title {index}",
+                "covers": [generator.randint(1, 10**7) for _ in range(4)],
+                "authors": [{"author": {"key": "/authors/OL23919A"}}],
+                "subjects": [f"Subject {value}" for value in range(12)],
+                "description": {"type": "/type/text", "value": "Description. " * 20},
+                "revision": generator.randint(1, 40),
+            }
+            for index in range(500)
+        ],
+    }
+
+
+def gamesdb_search(generator: random.Random) -> dict:
+    return {
+        "code": 200,
+        "status": "Success",
+        "data": {
+            "count": 20,
+            "games": [
+                {
+                    "id": generator.randint(1, 10**5),
+                    "game_title": f"Game title {index}",
+                    "release_date": "2004-11-16",
+                    "platform": generator.randint(1, 5000),
+                    "players": generator.randint(1, 4),
+                    "overview": "An adventure. " * 15,
+                    "developers": [generator.randint(1, 9000)],
+                    "genres": [generator.randint(1, 30)],
+                }
+                for index in range(20)
+            ],
+        },
+        "include": {
+            "boxart": {
+                "base_url": {"large": "https://cdn.thegamesdb.net/images/large/"},
+                "data": {
+                    str(index): [
+                        {
+                            "id": generator.randint(1, 10**6),
+                            "type": "boxart",
+                            "side": "front",
+                            "filename": f"boxart/front/{index}-1.jpg",
+                        }
+                    ]
+                    for index in range(20)
+                },
+            }
+        },
+    }
+
+
+ROUTES = {
+    "tmdb-search": tmdb_search,
+    "openlibrary-search": openlibrary_search,
+    "openlibrary-works": openlibrary_works,
+    "gamesdb-search": gamesdb_search,
+}
+
+
+def reencode_json(body: bytes) -> bytes:
+    return json.dumps(json.loads(body)).encode("utf-8")
+
+
+def validate_json(body: bytes) -> bytes:
+    json.loads(body)
+    return body
+
+
+def validate_orjson(body: bytes) -> bytes:
+    orjson.loads(body)
+    return body
+
+
+def passthrough(body: bytes) -> bytes:
+    if not is_json_content_type("application/json; charset=utf-8"):
+        raise ValueError("Upstream response is not JSON")
+    return body
+
+
+def strategies() -> dict:
+    available = {
+        "reencode-json": reencode_json,
+        "validate-json": validate_json,
+        "passthrough": passthrough,
+    }
+    if orjson is not None:
+        available["validate-orjson"] = validate_orjson
+    return available
+
+
+def measure(handle, body: bytes, requests: int) -> dict:
+    timings = []
+    started_at = time.process_time()
+    for _ in range(requests):
+        started = time.process_time()
+        handle(body)
+        timings.append(time.process_time() - started)
+    elapsed = time.process_time() - started_at
+    return {
+        "cpu_us_per_request": round(elapsed / requests * 1e6, 1),
+        "p50_us": round(statistics.median(timings) * 1e6, 1),
+        "requests_per_cpu_second": round(requests / elapsed) if elapsed else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="CPU spent per proxied JSON response by handling strategy"
+    )
+    parser.add_argument("--routes", default=DEFAULT_ROUTES)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = []
+    for route in args.routes.split(","):
+        body = json.dumps(ROUTES[route](random.Random(args.seed))).encode("utf-8")
+        for strategy, handle in strategies().items():
+            result = {
+                "route": route,
+                "bytes": len(body),
+                "strategy": strategy,
+                **measure(handle, body, args.requests),
+            }
+            results.append(result)
+            print(
+                f"{route:>18}  {len(body):>8} bytes  {strategy:>15}  "
+                f"{result['cpu_us_per_request']:>9.1f} us cpu/request"
+            )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench.server import BackendServer
+from bench.shares import populate
+from bench.stubs import StubUpstream
+
+SEEDED_SHARES = 100
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(outcomes: list[tuple[str, float]], seconds: float) -> dict:
+    statuses: dict[str, int] = {}
+    for status, _ in outcomes:
+        statuses[status] = statuses.get(status, 0) + 1
+    timings = [elapsed for _, elapsed in outcomes]
+    return {
+        "requests_per_second": round(len(outcomes) / seconds, 1),
+        "p50_ms": round(statistics.median(timings) * 1000, 1) if timings else None,
+        "p99_ms": round(percentile(timings, 0.99) * 1000, 1) if timings else None,
+        "statuses": statuses,
+    }
+
+
+def search_path(client: int, index: int) -> str:
+    return f"/api/tmdb/3/search/movie?query={client}-{index}"
+
+
+def share_path(index: int) -> str:
+    return f"/api/share/seed-{index % SEEDED_SHARES}"
+
+
+def hammer(
+    base_url: str,
+    path: Callable[[int], str],
+    deadline: float,
+    outcomes: list[tuple[str, float]],
+) -> None:
+    session = requests.Session()
+    index = 0
+    while time.monotonic() < deadline:
+        index += 1
+        started = time.perf_counter()
+        try:
+            status = str(
+                session.get(f"{base_url}{path(index)}", timeout=60).status_code
+            )
+        except requests.exceptions.RequestException:
+            status = "error"
+        outcomes.append((status, time.perf_counter() - started))
+
+
+def run(breakers: bool, base_url: str, args: argparse.Namespace) -> dict:
+    server = BackendServer(
+        workers=args.workers,
+        threads=args.threads,
+        environment={
+            "AOIFE_UPSTREAM_TMDB_URL": base_url,
+            "AOIFE_UPSTREAM_TMDB_READ_TIMEOUT": str(args.read_timeout),
+            "AOIFE_UPSTREAM_BREAKERS": "1" if breakers else "0",
+        },
+    )
+    populate("sqlite", server.data_directory, SEEDED_SHARES)
+    server.start()
+    searches: list[tuple[str, float]] = []
+    shares: list[tuple[str, float]] = []
+    try:
+        deadline = time.monotonic() + args.seconds
+        clients = [
+            (partial(search_path, client), searches)
+            for client in range(args.search_clients)
+        ] + [(share_path, shares)] * args.share_clients
+        with ThreadPoolExecutor(len(clients)) as pool:
+            for path, outcomes in clients:
+                pool.submit(hammer, server.url, path, deadline, outcomes)
+        breaker = requests.get(f"{server.url}/api/stats", timeout=30).json()[
+            "upstreamBreakers"
+        ]
+    finally:
+        server.stop()
+    return {
+        "breakers": breakers,
+        "search": summarize(searches, args.seconds),
+        "share_read": summarize(shares, args.seconds),
+        "tmdb_breaker": breaker.get("tmdb"),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Share reads and searches while TMDB hangs, "
+        "with and without circuit breakers"
+    )
+    parser.add_argument("--latency", type=float, default=5.0)
+    parser.add_argument("--read-timeout", type=float, default=2.0)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--search-clients", type=int, default=16)
+    parser.add_argument("--share-clients", type=int, default=2)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    stub = StubUpstream(latency=args.latency)
+    base_url = stub.start()
+    results = []
+    try:
+        for breakers in (False, True):
+            result = run(breakers, base_url, args)
+            results.append(result)
+            for name in ("search", "share_read"):
+                summary = result[name]
+                print(
+                    f"breakers {'on ' if breakers else 'off'}  {name:>10}  "
+                    f"{summary['requests_per_second']:>7.1f} req/s  "
+                    f"p50 {summary['p50_ms']} ms  p99 {summary['p99_ms']} ms  "
+                    f"{summary['statuses']}"
+                )
+    finally:
+        stub.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench.server import BackendServer
+from bench.stubs import StubUpstream
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def session_requests(
+    client: int, args: argparse.Namespace
+) -> list[tuple[float, str, str]]:
+    # A user typing artist names: debounced suggestion searches, each followed
+    # by release-group pages fetched in the background
+    generator = random.Random(client)
+    plan = []
+    for index in range(args.searches):
+        started = index * args.typing_interval
+        artist = generator.randrange(args.distinct)
+        plan.append(
+            (started, INTERACTIVE, f"ws/2/artist?query=artist-{artist}&fmt=json")
+        )
+        for page in range(args.pages):
+            path = f"ws/2/release-group?artist=artist-{artist}&offset={page * 100}"
+            plan.append((started + 0.05, BACKGROUND, f"{path}&fmt=json"))
+    return plan
+
+
+def send(
+    session: requests.Session, base_url: str, started: float, entry: tuple
+) -> tuple[str, int, float]:
+    delay, kind, path = entry
+    time.sleep(max(0, started + delay - time.perf_counter()))
+    sent = time.perf_counter()
+    headers = {"X-Aoife-Priority": BACKGROUND} if kind == BACKGROUND else {}
+    try:
+        status = session.get(f"{base_url}/{path}", headers=headers, timeout=60)
+        code = status.status_code
+    except requests.exceptions.RequestException:
+        code = 0
+    return kind, code, time.perf_counter() - sent
+
+
+def summarize(outcomes: list[tuple[str, int, float]], kind: str) -> dict:
+    selected = [(code, seconds) for name, code, seconds in outcomes if name == kind]
+    ok = [seconds for code, seconds in selected if code == 200]
+    statuses: dict[str, int] = {}
+    for code, _ in selected:
+        statuses[str(code)] = statuses.get(str(code), 0) + 1
+    return {
+        "requests": len(selected),
+        "ok_ratio": round(len(ok) / max(1, len(selected)), 3),
+        "ok_p50_ms": round(statistics.median(ok) * 1000, 1) if ok else None,
+        "ok_p95_ms": round(percentile(ok, 0.95) * 1000, 1) if ok else None,
+        "statuses": statuses,
+    }
+
+
+def run(mode: str, args: argparse.Namespace) -> dict:
+    stub = StubUpstream(latency=args.latency, rate_limit=args.upstream_rate)
+    stub_url = stub.start()
+    server = None
+    base_url = stub_url
+    if mode == "proxy":
+        server = BackendServer(
+            workers=args.workers,
+            threads=args.threads,
+            environment={"AOIFE_UPSTREAM_MUSICBRAINZ_URL": stub_url},
+        ).start()
+        base_url = f"{server.url}/api/musicbrainz"
+    outcomes = []
+    try:
+        entries = [
+            entry
+            for client in range(args.clients)
+            for entry in session_requests(client, args)
+        ]
+        started = time.perf_counter() + 0.5
+        with ThreadPoolExecutor(len(entries)) as pool:
+            futures = [
+                pool.submit(send, requests.Session(), base_url, started, entry)
+                for entry in entries
+            ]
+            outcomes = [future.result() for future in futures]
+        schedulers = (
+            requests.get(f"{server.url}/api/stats", timeout=30).json()[
+                "upstreamSchedulers"
+            ]
+            if server is not None
+            else None
+        )
+    finally:
+        if server is not None:
+            server.stop()
+        stub.stop()
+    return {
+        "mode": mode,
+        "interactive": summarize(outcomes, INTERACTIVE),
+        "background": summarize(outcomes, BACKGROUND),
+        "upstream_requests": stub.requests,
+        "upstream_throttled": stub.throttled,
+        "scheduler": schedulers,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="MusicBrainz-style searches from several browsers, sent "
+        "straight to a throttling upstream vs. through the paced proxy"
+    )
+    parser.add_argument("--upstream-rate", type=float, default=1.0)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--searches", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=2)
+    parser.add_argument("--typing-interval", type=float, default=1.5)
+    parser.add_argument("--distinct", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = []
+    for mode in ("direct", "proxy"):
+        result = run(mode, args)
+        results.append(result)
+        for kind in (INTERACTIVE, BACKGROUND):
+            summary = result[kind]
+            print(
+                f"{mode:>6}  {kind:>11}  ok {summary['ok_ratio']:.0%}  "
+                f"p50 {summary['ok_p50_ms']} ms  p95 {summary['ok_p95_ms']} ms  "
+                f"{summary['statuses']}"
+            )
+        print(
+            f"{mode:>6}  upstream requests {result['upstream_requests']}  "
+            f"throttled {result['upstream_throttled']}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
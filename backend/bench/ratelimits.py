@@ -0,0 +1,109 @@
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from limits import parse as parse_rate_limit
+from limits.storage import storage_from_string
+from limits.strategies import SlidingWindowCounterRateLimiter
+
+from ratelimitstore import SqliteRateLimitStorage
+
+DEFAULT_PROCESSES = "1,4,8"
+
+
+def hammer(
+    storage_uri: str, limit: str, clients: int, checks: int, start_at: float
+) -> tuple[list[int], list[float], float]:
+    limiter = SlidingWindowCounterRateLimiter(storage_from_string(storage_uri))
+    item = parse_rate_limit(limit)
+    allowed = [0] * clients
+    timings = []
+    while time.time() < start_at:
+        time.sleep(0.001)
+    started_at = time.perf_counter()
+    for index in range(checks):
+        client = index % clients
+        started = time.perf_counter()
+        if limiter.hit(item, f"10.0.0.{client}", "bench"):
+            allowed[client] += 1
+        timings.append(time.perf_counter() - started)
+    return allowed, timings, time.perf_counter() - started_at
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run(storage: str, processes: int, args: argparse.Namespace) -> dict:
+    with tempfile.TemporaryDirectory(prefix="aoife-bench-") as directory:
+        storage_uri = (
+            f"{SqliteRateLimitStorage.STORAGE_SCHEME[0]}://"
+            f"{os.path.join(directory, 'ratelimits')}"
+            if storage == "sqlite"
+            else "memory://"
+        )
+        context = multiprocessing.get_context("spawn")
+        start_at = time.time() + 3.0
+        with context.Pool(processes) as pool:
+            results = pool.starmap(
+                hammer,
+                [
+                    (storage_uri, args.limit, args.clients, args.checks, start_at)
+                    for _ in range(processes)
+                ],
+            )
+    allowed = [sum(counts) for counts in zip(*(result[0] for result in results))]
+    timings = [value for result in results for value in result[1]]
+    elapsed = max(result[2] for result in results)
+    limit = parse_rate_limit(args.limit).amount
+    return {
+        "storage": storage,
+        "processes": processes,
+        "limit_per_client": limit,
+        "allowed_per_client_max": max(allowed),
+        "over_limit_clients": sum(1 for count in allowed if count > limit),
+        "checks_per_second": round(len(timings) / elapsed),
+        "p50_us": round(statistics.median(timings) * 1e6, 1),
+        "p99_us": round(percentile(timings, 0.99) * 1e6, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Rate-limit accuracy and per-check cost across worker processes"
+    )
+    parser.add_argument("--processes", default=DEFAULT_PROCESSES)
+    parser.add_argument("--limit", default="120 per minute")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--checks", type=int, default=20_000)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = []
+    for processes in (int(value) for value in args.processes.split(",")):
+        for storage in ("memory", "sqlite"):
+            result = run(storage, processes, args)
+            results.append(result)
+            print(
+                f"{storage:>6}  {processes:>2} processes  "
+                f"allowed/client {result['allowed_per_client_max']:>5} "
+                f"(limit {result['limit_per_client']})  "
+                f"{result['checks_per_second']:>7} checks/s  "
+                f"p50 {result['p50_us']:>6.1f} us  p99 {result['p99_us']:>7.1f} us"
+            )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
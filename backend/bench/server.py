@@ -0,0 +1,239 @@
+import os
+import re
+import shlex
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Self
+
+import requests
+
+BACKEND_DIRECTORY = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SLUG_WORDS_PATH = os.path.join(BACKEND_DIRECTORY, "..", "data", "slugs.json")
+SYSTEMD_TEMPLATE_PATH = os.path.join(
+    BACKEND_DIRECTORY, "systemd", "aoife.template.service"
+)
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+class BackendServer:
+    def __init__(
+        self,
+        workers: int = 1,
+        threads: int = 8,
+        environment: dict[str, str] | None = None,
+        extra_arguments: list[str] | None = None,
+    ) -> None:
+        self.workers = workers
+        self.threads = threads
+        self.environment = environment or {}
+        self.extra_arguments = extra_arguments or []
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.data_directory = tempfile.mkdtemp(prefix="aoife-bench-data-")
+        shutil.copy(SLUG_WORDS_PATH, self.data_directory)
+        whitelist_path = os.path.join(self.data_directory, "whitelist.txt")
+        with open(whitelist_path, "w", encoding="utf-8") as handle:
+            handle.write("127.0.0.1\n")
+        self._process: subprocess.Popen | None = None
+
+    def start(self, timeout: float = 30.0) -> Self:
+        environment = dict(os.environ)
+        environment.update(
+            {
+                "AOIFE_DATA_DIRECTORY": self.data_directory,
+                "AOIFE_UPSTREAM_POOL_SIZE": str(self.threads),
+            }
+        )
+        environment.update(self.environment)
+        self._process = subprocess.Popen(self.command(), env=environment)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                requests.get(f"{self.url}/api/stats", timeout=1)
+            except requests.exceptions.ConnectionError, requests.exceptions.Timeout:
+                time.sleep(0.1)
+                continue
+            if len(self.worker_pids()) >= self.workers:
+                return self
+            time.sleep(0.1)
+        self.stop()
+        raise RuntimeError("Backend did not start in time")
+
+    def command(self) -> list[str]:
+        return [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "--chdir",
+            BACKEND_DIRECTORY,
+            "--bind",
+            f"127.0.0.1:{self.port}",
+            "--workers",
+            str(self.workers),
+            "--worker-class",
+            "gthread",
+            "--threads",
+            str(self.threads),
+            "--timeout",
+            "60",
+            "--log-level",
+            "warning",
+            *self.extra_arguments,
+            "backend:app",
+        ]
+
+    def worker_pids(self) -> list[int]:
+        if self._process is None:
+            return []
+        path = f"/proc/{self._process.pid}/task/{self._process.pid}/children"
+        with open(path, encoding="utf-8") as handle:
+            return [int(pid) for pid in handle.read().split()]
+
+    def memory_kib(self, include_master: bool = False) -> dict[str, list[int]]:
+        usage: dict[str, list[int]] = {"rss": [], "peak": [], "pss": []}
+        pids = self.worker_pids()
+        if include_master and self._process is not None:
+            pids.insert(0, self._process.pid)
+        for pid in pids:
+            with open(f"/proc/{pid}/status", encoding="utf-8") as handle:
+                for line in handle:
+                    if line.startswith("VmRSS:"):
+                        usage["rss"].append(int(line.split()[1]))
+                    elif line.startswith("VmHWM:"):
+                        usage["peak"].append(int(line.split()[1]))
+            # Pages shared copy-on-write count once, split between the sharers
+            with open(f"/proc/{pid}/smaps_rollup", encoding="utf-8") as handle:
+                for line in handle:
+                    if line.startswith("Pss:"):
+                        usage["pss"].append(int(line.split()[1]))
+        return usage
+
+    def stop(self) -> None:
+        if self._process is not None and self._process.poll() is None:
+            self._process.send_signal(signal.SIGINT)
+            try:
+                self._process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+        shutil.rmtree(self.data_directory, ignore_errors=True)
+
+
+def fill_systemd_values(arguments: list[str], values: dict[str, str]) -> list[str]:
+    for name, value in values.items():
+        arguments = [argument.replace(f"__{name}__", value) for argument in arguments]
+    unfilled = sorted(
+        {name for argument in arguments for name in re.findall(r"__\w+?__", argument)}
+    )
+    if unfilled:
+        raise ValueError(f"Unfilled systemd template values: {', '.join(unfilled)}")
+    return arguments
+
+
+def systemd_gunicorn_arguments(path: str, values: dict[str, str]) -> list[str]:
+    with open(path, encoding="utf-8") as handle:
+        exec_start = next(
+            line.split("=", 1)[1] for line in handle if line.startswith("ExecStart=")
+        )
+    return fill_systemd_values(shlex.split(exec_start)[1:], values)
+
+
+def systemd_environment(path: str, values: dict[str, str]) -> dict[str, str]:
+    with open(path, encoding="utf-8") as handle:
+        assignments = [
+            line.split("=", 1)[1].strip()
+            for line in handle
+            if line.startswith("Environment=")
+        ]
+    return dict(
+        assignment.split("=", 1)
+        for assignment in fill_systemd_values(assignments, values)
+    )
+
+
+class SystemdBackendServer(BackendServer):
+    def __init__(
+        self,
+        workers: int = 1,
+        threads: int = 8,
+        worker_class: str = "gthread",
+        timeout: int = 60,
+        environment: dict[str, str] | None = None,
+        extra_arguments: list[str] | None = None,
+    ) -> None:
+        super().__init__(
+            workers,
+            threads,
+            {
+                **systemd_environment(SYSTEMD_TEMPLATE_PATH, {"threads": str(threads)}),
+                **(environment or {}),
+            },
+            extra_arguments,
+        )
+        self.worker_class = worker_class
+        self.timeout = timeout
+
+    def command(self) -> list[str]:
+        arguments = systemd_gunicorn_arguments(
+            SYSTEMD_TEMPLATE_PATH,
+            {
+                "workdir": BACKEND_DIRECTORY,
+                "port": str(self.port),
+                "workers": str(self.workers),
+                "worker_class": self.worker_class,
+                "threads": str(self.threads),
+                "timeout": str(self.timeout),
+            },
+        )
+        return [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            *arguments[:-1],
+            *self.extra_arguments,
+            arguments[-1],
+        ]
+
+
+class AsgiServer(BackendServer):
+    def command(self) -> list[str]:
+        return [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "--app-dir",
+            BACKEND_DIRECTORY,
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(self.port),
+            "--workers",
+            str(self.workers),
+            "--no-access-log",
+            "--log-level",
+            "warning",
+            *self.extra_arguments,
+            "asgi:app",
+        ]
+
+    def worker_pids(self) -> list[int]:
+        if self._process is None:
+            return []
+        if self.workers == 1:
+            return [self._process.pid]
+        return [pid for pid in super().worker_pids() if not is_helper_process(pid)]
+
+
+def is_helper_process(pid: int) -> bool:
+    with open(f"/proc/{pid}/cmdline", "rb") as handle:
+        return b"resource_tracker" in handle.read()
@@ -0,0 +1,246 @@
+import argparse
+import gzip
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sharecodec import (
+    SHARE_COMPRESSION_LEVEL,
+    SHARE_DICTIONARY_BYTES,
+    ShareCodec,
+    share_document,
+    train_share_dictionary,
+)
+from sharestore import ShareReadCache, SqliteShareStore
+
+PROVIDERS = (
+    (
+        "movies",
+        "tmdb",
+        0.6667,
+        "https://image.tmdb.org/t/p/w500/{key}.jpg",
+        "https://image.tmdb.org/t/p/w185/{key}.jpg",
+    ),
+    (
+        "tv",
+        "tmdb",
+        0.6667,
+        "https://image.tmdb.org/t/p/w500/{key}.jpg",
+        "https://image.tmdb.org/t/p/w185/{key}.jpg",
+    ),
+    (
+        "games",
+        "gamesdb",
+        0.7,
+        "/api/gamesdb/images/boxart/front/{key}-1.jpg",
+        "/api/gamesdb/images/boxart/front/{key}-1.jpg?w=240",
+    ),
+    (
+        "books",
+        "openlibrary",
+        0.65,
+        "https://covers.openlibrary.org/b/id/{key}-L.jpg",
+        "https://covers.openlibrary.org/b/id/{key}-M.jpg",
+    ),
+    (
+        "music",
+        "coverart",
+        1.0,
+        "/api/coverart/image?id={key}&type=release-group",
+        "/api/coverart/image?id={key}&type=release-group&w=240",
+    ),
+)
+WORDS = (
+    "night",
+    "dark",
+    "star",
+    "love",
+    "city",
+    "house",
+    "blood",
+    "king",
+    "ghost",
+    "river",
+    "winter",
+    "summer",
+    "world",
+    "moon",
+    "fire",
+    "song",
+)
+
+
+def build_payload(generator: random.Random) -> str:
+    kind, source, aspect_ratio, cover, thumbnail = generator.choice(PROVIDERS)
+    items = []
+    for _ in range(generator.randint(4, 24)):
+        key = "".join(generator.choices("abcdefghijklmnopqrstuvwxyz0123456789", k=27))
+        items.append(
+            {
+                "id": generator.randrange(1, 2_000_000),
+                "type": kind,
+                "title": " ".join(generator.choices(WORDS, k=generator.randint(1, 4))),
+                "subtitle": None,
+                "caption": None,
+                "year": generator.randint(1950, 2026),
+                "coverUrl": cover.format(key=key),
+                "coverThumbnailUrl": thumbnail.format(key=key),
+                "source": source,
+                "aspectRatio": aspect_ratio,
+            }
+        )
+    return json.dumps(
+        {
+            "gridItems": items,
+            "columns": generator.choice((3, 4, 5, 6)),
+            "minRows": generator.choice((2, 3, 4)),
+            "layoutDimension": generator.choice(("height", "width")),
+            "captionMode": generator.choice(("hidden", "below")),
+            "captionEditsOnly": False,
+        },
+        separators=(",", ":"),
+    )
+
+
+def build_record(generator: random.Random, index: int) -> dict:
+    return {
+        "payload": build_payload(generator),
+        "createdAt": 1_700_000_000 + index,
+        "title": " ".join(generator.choices(WORDS, k=generator.randint(1, 3))),
+        "clientAddress": "127.0.0.1",
+        "userAgent": "aoife-bench",
+    }
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(samples: list[float]) -> dict:
+    return {
+        "p50_us": round(statistics.median(samples) * 1e6, 1),
+        "p99_us": round(percentile(samples, 0.99) * 1e6, 1),
+    }
+
+
+def cache_bytes(store: SqliteShareStore, slugs: list[str]) -> int:
+    # What a worker's read cache holds once every sampled share has been read
+    cache = ShareReadCache(store, len(slugs))
+    tracemalloc.start()
+    for slug in slugs:
+        cache.get(slug)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size
+
+
+def read_body(
+    store: SqliteShareStore, codec: ShareCodec, slug: str, passthrough: bool
+) -> bytes:
+    record = store.get(slug)
+    if record is None:
+        raise RuntimeError(f"Benchmark slug {slug} is missing")
+    if "document" not in record:
+        return share_document(slug, record["payload"], record["title"])
+    if passthrough:
+        return codec.encode(record["document"], record["dictionary"])
+    return codec.decompress(record["document"], record["dictionary"])
+
+
+def measure(
+    mode: str,
+    store: SqliteShareStore,
+    codec: ShareCodec,
+    slugs: list[str],
+    passthrough: bool = False,
+) -> dict:
+    store.vacuum()
+    samples = []
+    wire_bytes = 0
+    for slug in slugs:
+        started = time.perf_counter()
+        body = read_body(store, codec, slug, passthrough)
+        samples.append(time.perf_counter() - started)
+        wire_bytes += len(gzip.compress(body, 6)) if mode == "gzip" else len(body)
+    return {
+        "mode": mode,
+        "disk_bytes": os.path.getsize(store.path),
+        "cache_bytes": cache_bytes(store, slugs),
+        "wire_bytes_per_share": round(wire_bytes / len(slugs)),
+        "read": summarize(samples),
+    }
+
+
+def run(args: argparse.Namespace) -> list[dict]:
+    generator = random.Random(args.seed)
+    with tempfile.TemporaryDirectory(prefix="aoife-bench-") as directory:
+        codec = ShareCodec(os.path.join(directory, "share-dictionaries"), args.level)
+        store = SqliteShareStore(os.path.join(directory, "share.db"), codec=codec)
+        store.insert_many(
+            (f"seed-{index}", build_record(generator, index))
+            for index in range(args.shares)
+        )
+        slugs = [
+            f"seed-{generator.randrange(args.shares)}" for _ in range(args.samples)
+        ]
+        results = [
+            measure("plain", store, codec, slugs),
+            measure("gzip", store, codec, slugs),
+        ]
+
+        started = time.perf_counter()
+        codec.install(
+            train_share_dictionary(store.documents(args.train), args.dictionary_bytes)
+        )
+        trained = time.perf_counter() - started
+        started = time.perf_counter()
+        store.recompress()
+        recompressed = time.perf_counter() - started
+        print(
+            f"trained on {min(args.train, args.shares)} shares in {trained:.1f} s, "
+            f"recompressed {args.shares} in {recompressed:.1f} s"
+        )
+        results.append(measure("zstd-dict", store, codec, slugs))
+        results.append(measure("dcz", store, codec, slugs, passthrough=True))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Disk, read-cache memory, read latency and bytes sent per "
+        "share, plain vs. compressed with a dictionary trained on the store"
+    )
+    parser.add_argument("--shares", type=int, default=20_000)
+    parser.add_argument("--samples", type=int, default=2_000)
+    parser.add_argument("--train", type=int, default=20_000)
+    parser.add_argument("--dictionary-bytes", type=int, default=SHARE_DICTIONARY_BYTES)
+    parser.add_argument("--level", type=int, default=SHARE_COMPRESSION_LEVEL)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = run(args)
+    for result in results:
+        print(
+            f"{result['mode']:>9}  disk {result['disk_bytes'] / 1e6:7.1f} MB  "
+            f"cache {result['cache_bytes'] / 1e6:6.1f} MB  "
+            f"sent {result['wire_bytes_per_share']:>6} B/share  "
+            f"read p50 {result['read']['p50_us']:>7} us  "
+            f"p99 {result['read']['p99_us']:>7} us"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sharestore import (
+    JsonShareStore,
+    SqliteShareStore,
+    persist_share_store,
+)
+
+DEFAULT_SIZES = "1000,10000,100000,1000000"
+PAYLOAD_ITEM = {
+    "id": 603,
+    "type": "movies",
+    "title": "The Matrix",
+    "subtitle": None,
+    "caption": None,
+    "year": 1999,
+    "coverUrl": "https://image.tmdb.org/t/p/w500/f89U3ADr1oiB1s9GkdPOEpXUk5H.jpg",
+    "coverThumbnailUrl": "https://image.tmdb.org/t/p/w185/f89U3ADr1oiB1s9GkdPOEpXUk5H.jpg",
+    "source": "tmdb",
+    "aspectRatio": 0.6667,
+}
+PAYLOAD = json.dumps(
+    {
+        "gridItems": [PAYLOAD_ITEM] * 12,
+        "columns": 4,
+        "minRows": 3,
+        "layoutDimension": "height",
+        "captionMode": "hidden",
+        "captionEditsOnly": False,
+    },
+    separators=(",", ":"),
+)
+
+
+def build_record(index: int) -> dict:
+    return {
+        "payload": PAYLOAD,
+        "createdAt": 1_700_000_000 + index,
+        "title": f"Benchmark grid {index}",
+        "clientAddress": "127.0.0.1",
+        "userAgent": "aoife-bench",
+    }
+
+
+def populate(backend: str, directory: str, size: int):
+    if backend == "sqlite":
+        store = SqliteShareStore(os.path.join(directory, "share.db"))
+        store.insert_many((f"seed-{i}", build_record(i)) for i in range(size))
+        return store
+    path = os.path.join(directory, "share.json")
+    persist_share_store({f"seed-{i}": build_record(i) for i in range(size)}, path)
+    return JsonShareStore(path, os.path.join(directory, "share.lock"))
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(samples: list[float]) -> dict:
+    return {
+        "p50_us": round(statistics.median(samples) * 1e6, 1),
+        "p99_us": round(percentile(samples, 0.99) * 1e6, 1),
+    }
+
+
+def run(backend: str, size: int, samples: int) -> dict:
+    with tempfile.TemporaryDirectory(prefix="aoife-bench-") as directory:
+        started = time.perf_counter()
+        store = populate(backend, directory, size)
+        populate_seconds = time.perf_counter() - started
+
+        create_samples = []
+        for index in range(samples):
+            record = build_record(size + index)
+            started = time.perf_counter()
+            if not store.insert(f"bench-{index}", record):
+                raise RuntimeError("Benchmark slug collided")
+            create_samples.append(time.perf_counter() - started)
+
+        read_samples = []
+        for _ in range(samples):
+            slug = f"seed-{random.randrange(size)}"
+            started = time.perf_counter()
+            if store.get(slug) is None:
+                raise RuntimeError(f"Benchmark slug {slug} is missing")
+            read_samples.append(time.perf_counter() - started)
+
+    return {
+        "backend": backend,
+        "size": size,
+        "populate_s": round(populate_seconds, 2),
+        "create": summarize(create_samples),
+        "read": summarize(read_samples),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure share create/read latency as the store grows"
+    )
+    parser.add_argument("--backend", choices=("sqlite", "json"), default="sqlite")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES)
+    parser.add_argument("--samples", type=int, default=500)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = []
+    for size in (int(value) for value in args.sizes.split(",")):
+        result = run(args.backend, size, args.samples)
+        results.append(result)
+        print(
+            f"{result['backend']:>6} {result['size']:>9} shares  "
+            f"create p50 {result['create']['p50_us']:>9} us  "
+            f"p99 {result['create']['p99_us']:>9} us  "
+            f"read p50 {result['read']['p50_us']:>9} us  "
+            f"p99 {result['read']['p99_us']:>9} us"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench.server import BackendServer
+from bench.stubs import StubUpstream
+
+BROWSER_CONNECTIONS = 6
+SHARE_VIEW_SAMPLE = re.compile(
+    r'^aoife_share_view_images_total\{cache="(\w+)"\} (\S+)$'
+)
+
+
+def cover_url(share: int, index: int) -> str:
+    match index % 3:
+        case 0:
+            return f"/api/gamesdb/images/boxart/front/{share}-{index}.jpg"
+        case 1:
+            return f"/api/coverart/image?type=release&id={share}-{index}&size=500"
+        case _:
+            return f"/api/googlebooks/image?id={share}-{index}&zoom=2"
+
+
+def share_payload(share: int, items: int) -> str:
+    return json.dumps(
+        {
+            "gridItems": [
+                {
+                    "id": index,
+                    "type": "games",
+                    "title": f"Item {index}",
+                    "coverUrl": cover_url(share, index),
+                }
+                for index in range(items)
+            ],
+            "columns": 6,
+            "minRows": 4,
+            "layoutDimension": "height",
+            "captionMode": "hidden",
+            "captionEditsOnly": False,
+        }
+    )
+
+
+def fetch_cover(
+    session: requests.Session, base_url: str, referer: str, path: str
+) -> float:
+    started = time.perf_counter()
+    resp = session.get(f"{base_url}{path}", headers={"Referer": referer}, timeout=60)
+    resp.raise_for_status()
+    return time.perf_counter() - started
+
+
+def share_view_counts(base_url: str) -> dict[str, float]:
+    text = requests.get(f"{base_url}/metrics", timeout=30).text
+    return {
+        match[1]: float(match[2])
+        for line in text.splitlines()
+        if (match := SHARE_VIEW_SAMPLE.match(line))
+    }
+
+
+def run(prefetch: bool, base_url: str, args: argparse.Namespace) -> dict:
+    server = BackendServer(
+        workers=args.workers,
+        threads=args.threads,
+        environment={
+            "AOIFE_UPSTREAM_GAMESDB_IMAGES_URL": base_url,
+            "AOIFE_UPSTREAM_COVERART_URL": base_url,
+            "AOIFE_UPSTREAM_GOOGLEBOOKS_URL": base_url,
+            "AOIFE_IMAGE_PREFETCH_WORKERS": str(args.prefetch_workers)
+            if prefetch
+            else "0",
+        },
+    ).start()
+    create_seconds = []
+    grid_seconds = []
+    image_seconds = []
+    try:
+        session = requests.Session()
+        for share in range(args.shares):
+            started = time.perf_counter()
+            resp = session.post(
+                f"{server.url}/api/share",
+                json={"payload": share_payload(share, args.items), "title": "Bench"},
+                timeout=60,
+            )
+            resp.raise_for_status()
+            create_seconds.append(time.perf_counter() - started)
+            referer = f"{server.url}/?share={resp.json()['slug']}"
+            time.sleep(args.open_delay)
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(BROWSER_CONNECTIONS) as pool:
+                image_seconds.extend(
+                    pool.map(
+                        partial(fetch_cover, requests.Session(), server.url, referer),
+                        [cover_url(share, index) for index in range(args.items)],
+                    )
+                )
+            grid_seconds.append(time.perf_counter() - started)
+        time.sleep(1.5)
+        counts = share_view_counts(server.url)
+        prefetcher = requests.get(f"{server.url}/api/stats", timeout=30).json()[
+            "imagePrefetch"
+        ]
+    finally:
+        server.stop()
+    warm = counts.get("warm", 0)
+    return {
+        "prefetch": prefetch,
+        "create_p50_ms": round(statistics.median(create_seconds) * 1000, 1),
+        "grid_p50_ms": round(statistics.median(grid_seconds) * 1000, 1),
+        "grid_max_ms": round(max(grid_seconds) * 1000, 1),
+        "image_p50_ms": round(statistics.median(image_seconds) * 1000, 1),
+        "warm_ratio": round(warm / max(1, warm + counts.get("cold", 0)), 3),
+        "prefetcher": prefetcher,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="First share-view cover grid latency with and without "
+        "prefetching covers when the share is created"
+    )
+    parser.add_argument("--latency", type=float, default=0.25)
+    parser.add_argument("--shares", type=int, default=5)
+    parser.add_argument("--items", type=int, default=24)
+    parser.add_argument("--open-delay", type=float, default=2.0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--prefetch-workers", type=int, default=4)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    stub = StubUpstream(latency=args.latency)
+    base_url = stub.start()
+    results = []
+    try:
+        for prefetch in (False, True):
+            result = run(prefetch, base_url, args)
+            results.append(result)
+            print(
+                f"prefetch {'on ' if prefetch else 'off'}  "
+                f"create p50 {result['create_p50_ms']} ms  "
+                f"grid p50 {result['grid_p50_ms']} ms  "
+                f"max {result['grid_max_ms']} ms  "
+                f"image p50 {result['image_p50_ms']} ms  "
+                f"warm {result['warm_ratio']:.0%}"
+            )
+    finally:
+        stub.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench.server import BackendServer
+from bench.staticload import build_dist
+
+DEFAULT_WORKERS = "1,2,4,8,16"
+FIRST_WAVE_PATHS = ("/", "/assets/index-C4mK8xQe.js", "/assets/index-Dq3n_P7w.css")
+MODES = {
+    "lazy": ({}, []),
+    "preload": ({"AOIFE_PRELOAD": "1"}, ["--preload"]),
+}
+
+
+def fetch(base_url: str, path: str) -> float:
+    started = time.perf_counter()
+    requests.get(
+        f"{base_url}{path}", headers={"Accept-Encoding": "br, gzip"}, timeout=120
+    ).raise_for_status()
+    return time.perf_counter() - started
+
+
+def first_wave(base_url: str, workers: int) -> list[float]:
+    # A fresh connection per request spreads the wave over the workers, so
+    # each one answers its first page load
+    paths = [path for _ in range(workers * 2) for path in FIRST_WAVE_PATHS]
+    with ThreadPoolExecutor(len(paths)) as pool:
+        return list(pool.map(lambda path: fetch(base_url, path), paths))
+
+
+def run(mode: str, workers: int, dist: str, args: argparse.Namespace) -> dict:
+    environment, arguments = MODES[mode]
+    server = BackendServer(
+        workers=workers,
+        threads=args.threads,
+        environment={"AOIFE_DIST_DIRECTORY": dist, **environment},
+        extra_arguments=arguments,
+    )
+    started = time.perf_counter()
+    server.start(timeout=300)
+    ready = time.perf_counter() - started
+    try:
+        idle = server.memory_kib(include_master=True)
+        timings = first_wave(server.url, workers)
+        loaded = server.memory_kib(include_master=True)
+    finally:
+        server.stop()
+    return {
+        "mode": mode,
+        "workers": workers,
+        "ready_s": round(ready, 2),
+        "first_wave_p50_ms": round(statistics.median(timings) * 1000, 1),
+        "first_wave_max_ms": round(max(timings) * 1000, 1),
+        "idle_rss_kib": sum(idle["rss"]),
+        "rss_kib": sum(loaded["rss"]),
+        "pss_kib": sum(loaded["pss"]),
+        "worker_pss_kib": round(statistics.mean(loaded["pss"][1:])),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Startup time, first page loads and memory of gunicorn with "
+        "per-worker lazy loading vs. data preloaded in the master"
+    )
+    parser.add_argument("--workers", default=DEFAULT_WORKERS)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--js-bytes", type=int, default=2 * 1024 * 1024)
+    parser.add_argument("--css-bytes", type=int, default=256 * 1024)
+    parser.add_argument("--dist", help="built dist/ to serve (default: synthetic)")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="aoife-bench-") as directory:
+        dist = args.dist
+        if dist is None:
+            dist = os.path.join(directory, "dist")
+            build_dist(dist, args.js_bytes, args.css_bytes)
+        for workers in (int(value) for value in args.workers.split(",")):
+            for mode in MODES:
+                result = run(mode, workers, dist, args)
+                results.append(result)
+                print(
+                    f"{mode:>7}  {workers:>2} workers  ready {result['ready_s']:>6} s  "
+                    f"first load p50 {result['first_wave_p50_ms']:>7} ms  "
+                    f"max {result['first_wave_max_ms']:>7} ms  "
+                    f"rss {result['rss_kib'] / 1024:>5.0f} MiB  "
+                    f"pss {result['pss_kib'] / 1024:>5.0f} MiB"
+                )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+from flask import Flask, jsonify, send_from_directory
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend import send_static_asset
+from staticassets import StaticManifest
+
+ACCEPT_ENCODING = "gzip, deflate, br, zstd"
+ASSET_REFERENCE = re.compile(r'(?:src|href)="/([^"]+)"')
+PUBLIC_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "public")
+IDENTIFIERS = (
+    "gridItems",
+    "coverUrl",
+    "useState",
+    "useEffect",
+    "createElement",
+    "className",
+    "onClick",
+    "props",
+    "children",
+    "layoutDimension",
+    "fetch",
+    "response",
+    "Promise",
+    "undefined",
+    "return",
+    "function",
+    "const",
+    "await",
+)
+
+
+def synthetic_source(generator: random.Random, size: int, template: str) -> str:
+    chunks = []
+    while sum(map(len, chunks)) < size:
+        names = generator.sample(IDENTIFIERS, 4)
+        chunks.append(template.format(*names, generator.getrandbits(24)))
+    return "".join(chunks)
+
+
+def build_dist(directory: str, js_bytes: int, css_bytes: int) -> None:
+    generator = random.Random(1)
+    assets = os.path.join(directory, "assets")
+    os.makedirs(assets)
+    with open(os.path.join(assets, "index-C4mK8xQe.js"), "w") as handle:
+        handle.write(
+            synthetic_source(
+                generator,
+                js_bytes,
+                "const {0}_{4:x}=({1},{2})=>{{if(!{1})return {3};"
+                "return {2}.{0}({1},{4});}};",
+            )
+        )
+    with open(os.path.join(assets, "index-Dq3n_P7w.css"), "w") as handle:
+        handle.write(
+            synthetic_source(
+                generator,
+                css_bytes,
+                ".{0}-{4:x}{{display:flex;gap:{4:d}px;color:#{4:06x}}}\n",
+            )
+        )
+    with open(os.path.join(directory, "index.html"), "w") as handle:
+        handle.write(
+            "<!doctype html><html><head>"
+            '<link rel="icon" href="/favicon.png">'
+            '<script type="module" src="/assets/index-C4mK8xQe.js"></script>'
+            '<link rel="stylesheet" href="/assets/index-Dq3n_P7w.css">'
+            '</head><body><div id="root"></div></body></html>'
+        )
+    for name in ("favicon.png", "placeholder.webp"):
+        source = os.path.join(PUBLIC_PATH, name)
+        if os.path.exists(source):
+            shutil.copy(source, directory)
+        else:
+            with open(os.path.join(directory, name), "wb") as handle:
+                handle.write(os.urandom(4096))
+
+
+def legacy_app(dist_path: str) -> Flask:
+    app = Flask(__name__, static_folder=None)
+
+    @app.route("/")
+    def serve_root():
+        return send_from_directory(dist_path, "index.html")
+
+    @app.route("/<path:path>")
+    def serve_static(path):
+        if os.path.exists(os.path.join(dist_path, path)):
+            return send_from_directory(dist_path, path)
+        return send_from_directory(dist_path, "index.html")
+
+    return app
+
+
+def manifest_app(manifest: StaticManifest) -> Flask:
+    app = Flask(__name__, static_folder=None)
+
+    @app.route("/")
+    def serve_root():
+        return serve_static("index.html")
+
+    @app.route("/<path:path>")
+    def serve_static(path):
+        asset = manifest.resolve(path)
+        if asset is None:
+            return jsonify({"error": "Not found"}), 404
+        return send_static_asset(asset)
+
+    return app
+
+
+def page_paths(client) -> list[str]:
+    index = client.get("/").get_data(as_text=True)
+    return ["/", *(f"/{path}" for path in ASSET_REFERENCE.findall(index))]
+
+
+def page_load(client, paths: list[str]) -> dict:
+    cold_bytes = 0
+    validators = {}
+    for path in paths:
+        resp = client.get(path, headers={"Accept-Encoding": ACCEPT_ENCODING})
+        cold_bytes += len(resp.data)
+        validators[path] = resp.headers
+    revalidations = 0
+    for path, headers in validators.items():
+        if "immutable" in headers.get("Cache-Control", ""):
+            continue
+        revalidations += 1
+        conditional = {"Accept-Encoding": ACCEPT_ENCODING}
+        if "ETag" in headers:
+            conditional["If-None-Match"] = headers["ETag"]
+        client.get(path, headers=conditional)
+    return {"cold_bytes": cold_bytes, "repeat_visit_requests": revalidations}
+
+
+def throughput(client, path: str, requests: int) -> float:
+    headers = {"Accept-Encoding": ACCEPT_ENCODING}
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get(path, headers=headers).close()
+    return round(requests / (time.perf_counter() - started))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Cold page-load bytes and static requests per second, "
+        "send_from_directory vs the in-memory manifest"
+    )
+    parser.add_argument("--dist", help="built dist/ to serve (default: synthetic)")
+    parser.add_argument("--js-bytes", type=int, default=512 * 1024)
+    parser.add_argument("--css-bytes", type=int, default=48 * 1024)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="aoife-bench-") as directory:
+        dist_path = args.dist
+        if dist_path is None:
+            dist_path = os.path.join(directory, "dist")
+            build_dist(dist_path, args.js_bytes, args.css_bytes)
+        started = time.perf_counter()
+        manifest = StaticManifest(dist_path)
+        build_seconds = time.perf_counter() - started
+        print(
+            f"manifest: {manifest.stats()['files']} files in "
+            f"{build_seconds * 1000:.0f} ms, brotli {manifest.stats()['brotli']}"
+        )
+
+        results = []
+        for name, app in (
+            ("legacy", legacy_app(dist_path)),
+            ("manifest", manifest_app(manifest)),
+        ):
+            client = app.test_client()
+            paths = page_paths(client)
+            result = {"server": name, **page_load(client, paths)}
+            for label, path in (
+                ("index", "/"),
+                ("asset", next(path for path in paths if path.endswith(".js"))),
+                ("deep_link", "/share/some-slug"),
+            ):
+                result[f"{label}_requests_per_second"] = throughput(
+                    client, path, args.requests
+                )
+            results.append(result)
+            print(
+                f"{name:>8}  cold load {result['cold_bytes'] / 1024:>7.1f} KiB  "
+                f"repeat visit {result['repeat_visit_requests']} requests  "
+                f"index {result['index_requests_per_second']:>6} req/s  "
+                f"asset {result['asset_requests_per_second']:>6} req/s  "
+                f"deep link {result['deep_link_requests_per_second']:>6} req/s"
+            )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(
+                {"manifest_build_ms": round(build_seconds * 1000), "results": results},
+                handle,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
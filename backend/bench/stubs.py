@@ -0,0 +1,255 @@
+import asyncio
+import json
+import os
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def generate_certificate(directory: str) -> tuple[str, str]:
+    certificate_path = os.path.join(directory, "stub.crt")
+    key_path = os.path.join(directory, "stub.key")
+    subprocess.run(
+        [
+            "openssl",
+            "req",
+            "-x509",
+            "-newkey",
+            "rsa:2048",
+            "-nodes",
+            "-days",
+            "1",
+            "-subj",
+            "/CN=localhost",
+            "-addext",
+            "subjectAltName=DNS:localhost,IP:127.0.0.1",
+            "-keyout",
+            key_path,
+            "-out",
+            certificate_path,
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return certificate_path, key_path
+
+
+class StubUpstream:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        json_bytes: int = 4096,
+        image_bytes: int = 65536,
+        tls: bool = False,
+        rate_limit: float = 0.0,
+    ) -> None:
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.throttled = 0
+        self._recent: deque[float] = deque()
+        self.json_body = build_json_body(json_bytes)
+        self.image_body = os.urandom(image_bytes)
+        self.tls = tls
+        self.requests = 0
+        self.certificate_path: str | None = None
+        self._directory: tempfile.TemporaryDirectory | None = None
+        self._server: ThreadingHTTPServer | None = None
+        self._lock = threading.Lock()
+
+    def start(self) -> str:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                return
+
+            def do_GET(self):
+                stub.count_request()
+                if stub.throttle():
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if is_image_path(self.path):
+                    self.send_body(stub.image_body, "image/jpeg")
+                else:
+                    self.send_body(stub.json_body, "application/json")
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", "0"))
+                self.rfile.read(length)
+                self.do_GET()
+
+            def do_HEAD(self):
+                stub.count_request()
+                if stub.latency:
+                    time.sleep(stub.latency)
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(stub.image_body)))
+                self.end_headers()
+
+            def send_body(self, body: bytes, content_type: str):
+                etag = f'"{len(body):x}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", "public, max-age=86400")
+                self.end_headers()
+                self.wfile.write(body)
+
+        class Server(ThreadingHTTPServer):
+            request_queue_size = 1024
+
+        self._server = Server(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._server.handle_error = lambda request, client_address: None
+        scheme = "http"
+        if self.tls:
+            self._directory = tempfile.TemporaryDirectory(prefix="aoife-stub-")
+            certificate_path, key_path = generate_certificate(self._directory.name)
+            context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            context.load_cert_chain(certificate_path, key_path)
+            self._server.socket = context.wrap_socket(
+                self._server.socket, server_side=True
+            )
+            self.certificate_path = certificate_path
+            scheme = "https"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"{scheme}://localhost:{self._server.server_address[1]}"
+
+    def count_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    # Answers 503 like MusicBrainz once more than rate_limit requests arrive
+    # within a second
+    def throttle(self) -> bool:
+        if self.rate_limit <= 0:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0] >= 1:
+                self._recent.popleft()
+            if len(self._recent) >= self.rate_limit:
+                self.throttled += 1
+                return True
+            self._recent.append(now)
+            return False
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        if self._directory is not None:
+            self._directory.cleanup()
+
+
+class AsyncStubUpstream(StubUpstream):
+    def start(self) -> str:
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run() -> None:
+            asyncio.set_event_loop(loop)
+            self._async_server = loop.run_until_complete(
+                asyncio.start_server(self.handle, "127.0.0.1", 0, backlog=4096)
+            )
+            ready.set()
+            loop.run_forever()
+
+        self._loop = loop
+        self._writers: set[asyncio.StreamWriter] = set()
+        threading.Thread(target=run, daemon=True).start()
+        ready.wait()
+        port = self._async_server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self._writers.add(writer)
+        try:
+            while request_line := await reader.readline():
+                path = request_line.decode("latin-1").split(" ")[1]
+                headers: dict[str, str] = {}
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", "0"))
+                if length:
+                    await reader.readexactly(length)
+                self.count_request()
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                if is_image_path(path):
+                    body, content_type = self.image_body, "image/jpeg"
+                else:
+                    body, content_type = self.json_body, "application/json"
+                etag = f'"{len(body):x}"'
+                if headers.get("if-none-match") == etag:
+                    writer.write(
+                        f"HTTP/1.1 304 Not Modified\r\nETag: {etag}\r\n\r\n".encode()
+                    )
+                else:
+                    writer.write(
+                        (
+                            "HTTP/1.1 200 OK\r\n"
+                            f"Content-Type: {content_type}\r\n"
+                            f"Content-Length: {len(body)}\r\n"
+                            f"ETag: {etag}\r\n"
+                            "Cache-Control: public, max-age=86400\r\n\r\n"
+                        ).encode()
+                        + body
+                    )
+                await writer.drain()
+        except ConnectionError, asyncio.IncompleteReadError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def stop(self) -> None:
+        async def shutdown() -> None:
+            self._async_server.close()
+            for writer in list(self._writers):
+                writer.close()
+            pending = [
+                task
+                for task in asyncio.all_tasks()
+                if task is not asyncio.current_task()
+            ]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+def is_image_path(path: str) -> bool:
+    return "/images/" in path or "/books/content" in path or "/front-" in path
+
+
+def build_json_body(size: int) -> bytes:
+    result = {"id": 0, "title": "Stub result", "poster_path": "/stub.jpg"}
+    result_bytes = len(json.dumps(result)) + 2
+    count = max(1, size // result_bytes)
+    return json.dumps(
+        {"page": 1, "results": [dict(result, id=index) for index in range(count)]}
+    ).encode("utf-8")
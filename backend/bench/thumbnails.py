@@ -0,0 +1,96 @@
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend import MAX_SHARE_ITEMS
+from thumbnails import Image, render_thumbnail, thumbnail_formats
+
+try:
+    from PIL import ImageDraw
+except ImportError:
+    ImageDraw = None
+
+
+def build_cover(seed: int, width: int, height: int) -> bytes:
+    if Image is None:
+        raise RuntimeError("Pillow is required to benchmark thumbnails")
+    generator = random.Random(seed)
+    cover = Image.new("RGB", (width, height), generator_color(generator))
+    draw = ImageDraw.Draw(cover)
+    for _ in range(40):
+        left, top = generator.randrange(width), generator.randrange(height)
+        right = left + generator.randrange(20, width // 2)
+        bottom = top + generator.randrange(20, height // 3)
+        shape = draw.ellipse if generator.random() < 0.5 else draw.rectangle
+        shape((left, top, right, bottom), fill=generator_color(generator))
+    noise = Image.effect_noise((width, height), 24).convert("RGB")
+    cover = Image.blend(cover, noise, 0.15)
+    output = io.BytesIO()
+    cover.save(output, "JPEG", quality=90)
+    return output.getvalue()
+
+
+def generator_color(generator: random.Random) -> tuple[int, int, int]:
+    return (
+        generator.randrange(256),
+        generator.randrange(256),
+        generator.randrange(256),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Thumbnail encode throughput and bytes saved per share grid"
+    )
+    parser.add_argument("--width", type=int, default=240)
+    parser.add_argument("--source-size", default="1000x1500")
+    parser.add_argument("--items", type=int, default=MAX_SHARE_ITEMS)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    source_width, source_height = (int(value) for value in args.source_size.split("x"))
+    covers = [
+        build_cover(seed, source_width, source_height) for seed in range(args.items)
+    ]
+    original_bytes = sum(len(cover) for cover in covers)
+    print(
+        f"{args.items} covers at {args.source_size}: "
+        f"{original_bytes / 1024:.0f} KiB as served upstream"
+    )
+
+    results = []
+    for image_format in thumbnail_formats():
+        started = time.perf_counter()
+        encoded = sum(
+            len(render_thumbnail(cover, args.width, image_format)) for cover in covers
+        )
+        elapsed = time.perf_counter() - started
+        result = {
+            "format": image_format,
+            "width": args.width,
+            "items": args.items,
+            "original_bytes": original_bytes,
+            "grid_bytes": encoded,
+            "saved_percent": round(100 * (1 - encoded / original_bytes), 1),
+            "encodes_per_core_second": round(args.items / elapsed, 1),
+        }
+        results.append(result)
+        print(
+            f"{image_format:>5} @ {args.width}px  {encoded / 1024:>7.1f} KiB per grid  "
+            f"({result['saved_percent']:>5.1f}% saved)  "
+            f"{result['encodes_per_core_second']:>6.1f} encodes/s per core"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
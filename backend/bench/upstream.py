@@ -0,0 +1,88 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench.stubs import StubUpstream
+from upstream import UPSTREAM_POOL_HOSTS, build_upstream_session
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure(fetch, count: int, threads: int) -> dict:
+    def timed(_):
+        started = time.perf_counter()
+        fetch()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        samples = list(executor.map(timed, range(count)))
+    elapsed = time.perf_counter() - started
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 2),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 2),
+        "requests_per_s": round(count / elapsed, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare per-request upstream cost with and without pooling"
+    )
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    stub = StubUpstream(latency=args.latency, tls=True)
+    base_url = stub.start()
+    url = f"{base_url}/3/search/movie?query=dune"
+    try:
+        unpooled = measure(
+            lambda: requests.get(url, verify=stub.certificate_path, timeout=10).content,
+            args.requests,
+            args.threads,
+        )
+        session = build_upstream_session(args.threads, UPSTREAM_POOL_HOSTS)
+        pooled = measure(
+            lambda: session.get(url, verify=stub.certificate_path, timeout=10).content,
+            args.requests,
+            args.threads,
+        )
+    finally:
+        stub.stop()
+
+    results = {
+        "threads": args.threads,
+        "requests": args.requests,
+        "unpooled": unpooled,
+        "pooled": pooled,
+        "saved_p50_ms": round(unpooled["p50_ms"] - pooled["p50_ms"], 2),
+    }
+    for name in ("unpooled", "pooled"):
+        row = results[name]
+        print(
+            f"{name:>8}  p50 {row['p50_ms']:>7} ms  p99 {row['p99_ms']:>7} ms  "
+            f"{row['requests_per_s']:>8} req/s"
+        )
+    print(f"   saved  {results['saved_p50_ms']} ms per request at p50")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import argparse
+import ipaddress
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from addresslist import AddressListFile
+
+DEFAULT_SIZES = "0,10,1000,100000"
+
+
+def build_entries(size: int, seed: int) -> list[str]:
+    generator = random.Random(seed)
+    entries = []
+    for index in range(size):
+        address = ipaddress.IPv4Address(generator.getrandbits(32))
+        if index % 4 == 0:
+            prefix = generator.choice((16, 20, 24, 28))
+            entries.append(str(ipaddress.ip_network(f"{address}/{prefix}", False)))
+        elif index % 4 == 1:
+            entries.append(str(ipaddress.IPv6Address(generator.getrandbits(128))))
+        else:
+            entries.append(str(address))
+    return entries
+
+
+def legacy_is_exempt(path: str, address: str) -> bool:
+    if not os.path.exists(path):
+        return False
+    with open(path, "r", encoding="utf-8") as handle:
+        addresses: set[str] = set()
+        for line in handle:
+            entry = line.strip()
+            ipaddress.ip_address(entry.split("/")[0])
+            addresses.add(entry)
+    return address in addresses
+
+
+def measure(check, addresses: list[str], samples: int) -> dict:
+    timings = []
+    for index in range(samples):
+        address = addresses[index % len(addresses)]
+        started = time.perf_counter()
+        check(address)
+        timings.append(time.perf_counter() - started)
+    return {
+        "p50_us": round(statistics.median(timings) * 1e6, 2),
+        "mean_us": round(statistics.fmean(timings) * 1e6, 2),
+    }
+
+
+def run(size: int, samples: int, legacy_samples: int) -> dict:
+    entries = build_entries(size, seed=size)
+    probes = [str(ipaddress.IPv4Address(random.getrandbits(32))) for _ in range(256)]
+    probes += [entry.split("/")[0] for entry in entries[:256]]
+    with tempfile.TemporaryDirectory(prefix="aoife-bench-") as directory:
+        path = os.path.join(directory, "whitelist.txt")
+        if entries:
+            with open(path, "w", encoding="utf-8") as handle:
+                handle.write("\n".join(entries) + "\n")
+        whitelist = AddressListFile(path)
+        started = time.perf_counter()
+        whitelist.matcher()
+        compile_ms = (time.perf_counter() - started) * 1000
+        result = {
+            "entries": size,
+            "compile_ms": round(compile_ms, 2),
+            "matcher": measure(
+                lambda address: address in whitelist.matcher(), probes, samples
+            ),
+        }
+        if legacy_samples:
+            result["legacy"] = measure(
+                lambda address: legacy_is_exempt(path, address),
+                probes,
+                legacy_samples,
+            )
+        return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Per-request cost of the rate-limit exemption check"
+    )
+    parser.add_argument("--sizes", default=DEFAULT_SIZES)
+    parser.add_argument("--samples", type=int, default=50_000)
+    parser.add_argument("--legacy-samples", type=int, default=20)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = []
+    for size in (int(value) for value in args.sizes.split(",")):
+        result = run(size, args.samples, args.legacy_samples)
+        results.append(result)
+        legacy = result.get("legacy")
+        print(
+            f"{size:>7} entries  compile {result['compile_ms']:>8.2f} ms  "
+            f"matcher p50 {result['matcher']['p50_us']:>6.2f} us"
+            + (f"  legacy p50 {legacy['p50_us']:>10.2f} us" if legacy else "")
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bench.server import SystemdBackendServer
+from bench.shares import PAYLOAD, populate
+from bench.stubs import StubUpstream
+from upstream import UPSTREAM_DEFAULT_URLS
+
+WORKLOADS = ("search", "grid", "share-create", "share-read", "mixed")
+DEFAULT_STORE_SIZES = "0,100000"
+GRID_ITEMS = 24
+MIXED_WEIGHTS = {"search": 50, "grid": 35, "share-read": 10, "share-create": 5}
+
+Request = tuple[str, str, dict | None]
+
+
+def parse_overrides(value: str, cast) -> dict:
+    overrides = {}
+    for entry in filter(None, value.split(",")):
+        provider, _, setting = entry.partition("=")
+        if provider not in UPSTREAM_DEFAULT_URLS:
+            raise ValueError(f"Unknown upstream provider {provider!r}")
+        overrides[provider] = cast(setting)
+    return overrides
+
+
+def start_stubs(args: argparse.Namespace) -> tuple[list[StubUpstream], dict[str, str]]:
+    latencies = parse_overrides(args.provider_latency, float)
+    json_sizes = parse_overrides(args.provider_json_bytes, int)
+    stubs = []
+    environment = {}
+    for provider in UPSTREAM_DEFAULT_URLS:
+        stub = StubUpstream(
+            latency=latencies.get(provider, args.latency),
+            json_bytes=json_sizes.get(provider, args.json_bytes),
+            image_bytes=args.image_bytes,
+        )
+        stubs.append(stub)
+        name = provider.upper().replace("-", "_")
+        environment[f"AOIFE_UPSTREAM_{name}_URL"] = stub.start()
+    return stubs, environment
+
+
+def search_request(generator: random.Random, repeat_fraction: float) -> Request:
+    query = (
+        f"popular-{generator.randrange(20)}"
+        if generator.random() < repeat_fraction
+        else f"query-{generator.getrandbits(48):x}"
+    )
+    return generator.choice(
+        (
+            ("GET", f"/api/tmdb/3/search/movie?query={query}", None),
+            ("GET", f"/api/openlibrary/search.json?q={query}", None),
+            ("GET", f"/api/gamesdb/v1.1/Games/ByGameName?name={query}", None),
+        )
+    )
+
+
+def grid_requests(generator: random.Random) -> list[Request]:
+    grid = generator.getrandbits(32)
+    paths = (
+        "/api/gamesdb/images/boxart/front/{grid}-{index}.jpg",
+        "/api/coverart/image?type=release&id={grid}-{index}&size=500",
+        "/api/googlebooks/image?id={grid}-{index}&zoom=1",
+    )
+    return [
+        ("GET", paths[index % len(paths)].format(grid=grid, index=index), None)
+        for index in range(GRID_ITEMS)
+    ]
+
+
+def share_create_request(generator: random.Random) -> Request:
+    title = f"Benchmark grid {generator.getrandbits(64):x}"
+    return ("POST", "/api/share", {"payload": PAYLOAD, "title": title})
+
+
+def share_read_request(generator: random.Random, store_size: int) -> Request:
+    return ("GET", f"/api/share/seed-{generator.randrange(max(store_size, 1))}", None)
+
+
+def build_requests(
+    workload: str, count: int, store_size: int, args: argparse.Namespace
+) -> list[Request]:
+    generator = random.Random(f"{args.seed}-{workload}-{store_size}")
+    weights = {
+        kind: weight
+        for kind, weight in MIXED_WEIGHTS.items()
+        if store_size or kind != "share-read"
+    }
+    planned: list[Request] = []
+    while len(planned) < count:
+        kind = workload
+        if workload == "mixed":
+            kind = generator.choices(list(weights), weights=list(weights.values()))[0]
+        if kind == "search":
+            planned.append(search_request(generator, args.repeat_fraction))
+        elif kind == "grid":
+            planned.extend(grid_requests(generator))
+        elif kind == "share-create":
+            planned.append(share_create_request(generator))
+        else:
+            planned.append(share_read_request(generator, store_size))
+    return planned[:count]
+
+
+def send(session: requests.Session, base_url: str, planned: Request) -> tuple:
+    method, path, body = planned
+    started = time.perf_counter()
+    try:
+        resp = session.request(method, f"{base_url}{path}", json=body, timeout=60)
+    except requests.exceptions.RequestException:
+        return None, time.perf_counter() - started
+    return resp.status_code, time.perf_counter() - started
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def drive(base_url: str, planned: list[Request], concurrency: int) -> dict:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        outcomes = list(pool.map(lambda item: send(session, base_url, item), planned))
+    elapsed = time.perf_counter() - started
+    timings = [seconds for status, seconds in outcomes if status and status < 400]
+    statuses: dict[str, int] = {}
+    for status, _ in outcomes:
+        key = str(status) if status else "error"
+        statuses[key] = statuses.get(key, 0) + 1
+    return {
+        "requests": len(planned),
+        "seconds": round(elapsed, 2),
+        "requests_per_second": round(len(planned) / elapsed, 1),
+        "p50_ms": round(statistics.median(timings) * 1000, 2) if timings else None,
+        "p99_ms": round(percentile(timings, 0.99) * 1000, 2) if timings else None,
+        "statuses": statuses,
+    }
+
+
+def run_store_size(
+    store_size: int, environment: dict[str, str], args: argparse.Namespace
+) -> list[dict]:
+    server = SystemdBackendServer(
+        workers=args.workers,
+        threads=args.threads,
+        worker_class=args.worker_class,
+        timeout=args.timeout,
+        environment=environment,
+        extra_arguments=["--log-level", "warning"],
+    )
+    if store_size:
+        populate("sqlite", server.data_directory, store_size)
+    server.start()
+    results = []
+    try:
+        baseline = server.memory_kib()
+        for workload in args.workloads.split(","):
+            if workload not in WORKLOADS:
+                raise ValueError(f"Unknown workload {workload!r}")
+            if workload == "share-read" and not store_size:
+                continue
+            planned = build_requests(workload, args.requests, store_size, args)
+            result = {
+                "workload": workload,
+                "store_size": store_size,
+                **drive(server.url, planned, args.concurrency),
+            }
+            memory = server.memory_kib()
+            result["rss_kib"] = {
+                "baseline_total": sum(baseline["rss"]),
+                "total": sum(memory["rss"]),
+                "peak_worker": max(memory["peak"]),
+            }
+            results.append(result)
+            print(
+                f"{workload:>12}  store {store_size:>7}  "
+                f"{result['requests_per_second']:>7.1f} req/s  "
+                f"p50 {result['p50_ms']} ms  p99 {result['p99_ms']} ms  "
+                f"rss {result['rss_kib']['total'] / 1024:.0f} MiB  "
+                f"{result['statuses']}"
+            )
+    finally:
+        server.stop()
+    return results
+
+
+def describe_environment(args: argparse.Namespace) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except OSError, subprocess.CalledProcessError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "started_at": int(time.time()),
+        "settings": vars(args),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Mixed workloads against gunicorn and local upstream stubs"
+    )
+    parser.add_argument("--workloads", default=",".join(WORKLOADS))
+    parser.add_argument("--store-sizes", default=DEFAULT_STORE_SIZES)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--worker-class", default="gthread")
+    parser.add_argument("--timeout", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--provider-latency", default="", help="e.g. coverart=0.4")
+    parser.add_argument("--json-bytes", type=int, default=16 * 1024)
+    parser.add_argument("--provider-json-bytes", default="", help="e.g. tmdb=4096")
+    parser.add_argument("--image-bytes", type=int, default=128 * 1024)
+    parser.add_argument("--repeat-fraction", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    stubs, environment = start_stubs(args)
+    results = []
+    try:
+        for store_size in (int(value) for value in args.store_sizes.split(",")):
+            results.extend(run_store_size(store_size, environment, args))
+    finally:
+        for stub in stubs:
+            stub.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(
+                {"environment": describe_environment(args), "results": results},
+                handle,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
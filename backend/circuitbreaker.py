@@ -0,0 +1,112 @@
+import math
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass
+
+import requests
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half-open"
+BREAKER_REJECTED = "rejected"
+
+BreakerObserver = Callable[[str, str], None]
+
+
+@dataclass(frozen=True)
+class BreakerPolicy:
+    window: int = 20
+    minimum_calls: int = 10
+    failure_ratio: float = 0.5
+    slow_call_seconds: float = 5.0
+    open_seconds: float = 30.0
+    probe_calls: int = 1
+
+
+# Caught by the sync handlers as a requests error and by the async ones as a
+# builtin ConnectionError
+class UpstreamUnavailable(requests.exceptions.ConnectionError, ConnectionError):
+    def __init__(self, provider: str, retry_after: int) -> None:
+        super().__init__(f"Upstream {provider} is temporarily unavailable")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+def is_failed_status(status: int) -> bool:
+    return status == 429 or status >= 500
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        provider: str,
+        policy: BreakerPolicy,
+        observer: BreakerObserver | None = None,
+    ) -> None:
+        self.provider = provider
+        self.policy = policy
+        self.observer = observer
+        self.state = BREAKER_CLOSED
+        self.opened = 0
+        self.rejected = 0
+        self._outcomes: deque[bool] = deque(maxlen=policy.window)
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str) -> None:
+        self.state = state
+        if state == BREAKER_OPEN:
+            self.opened += 1
+            self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self._probes = 0
+        if self.observer is not None:
+            self.observer(self.provider, state)
+
+    def _reject(self) -> UpstreamUnavailable:
+        self.rejected += 1
+        if self.observer is not None:
+            self.observer(self.provider, BREAKER_REJECTED)
+        remaining = self.policy.open_seconds - (time.monotonic() - self._opened_at)
+        return UpstreamUnavailable(self.provider, max(1, math.ceil(remaining)))
+
+    def before_request(self) -> bool:
+        with self._lock:
+            if self.state == BREAKER_OPEN:
+                if time.monotonic() - self._opened_at < self.policy.open_seconds:
+                    raise self._reject()
+                self._transition(BREAKER_HALF_OPEN)
+            if self.state == BREAKER_HALF_OPEN:
+                if self._probes >= self.policy.probe_calls:
+                    raise self._reject()
+                self._probes += 1
+                return True
+            return False
+
+    def record(self, failed: bool, seconds: float, probe: bool) -> None:
+        failed = failed or seconds >= self.policy.slow_call_seconds
+        with self._lock:
+            if probe:
+                if self.state == BREAKER_HALF_OPEN:
+                    self._transition(BREAKER_OPEN if failed else BREAKER_CLOSED)
+                return
+            if self.state != BREAKER_CLOSED:
+                return
+            self._outcomes.append(failed)
+            if len(self._outcomes) >= self.policy.minimum_calls and (
+                sum(self._outcomes) >= self.policy.failure_ratio * len(self._outcomes)
+            ):
+                self._transition(BREAKER_OPEN)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "recentCalls": len(self._outcomes),
+                "recentFailures": sum(self._outcomes),
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
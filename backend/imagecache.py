@@ -0,0 +1,297 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+
+from sqlitedb import SqliteConnections
+
+IMAGE_CACHE_TOUCH_INTERVAL_SECONDS = 60
+IMAGE_CACHE_EVICTION_BATCH = 64
+
+
+@dataclass(frozen=True)
+class CachedImage:
+    key: str
+    path: str
+    relative_path: str
+    status: int
+    content_type: str
+    etag: str | None
+    last_modified: str | None
+
+
+class ImageCacheFill:
+    def __init__(
+        self,
+        cache: ImageCache,
+        key: str,
+        content_type: str,
+        etag: str | None,
+        last_modified: str | None,
+    ) -> None:
+        self.cache = cache
+        self.key = key
+        self.content_type = content_type
+        self.etag = etag
+        self.last_modified = last_modified
+        self.size = 0
+        self._descriptor, self.temporary_path = tempfile.mkstemp(
+            dir=cache.directory, prefix="fill-", suffix=".tmp"
+        )
+
+    def write(self, chunk: bytes) -> None:
+        view = memoryview(chunk)
+        while view:
+            written = os.write(self._descriptor, view)
+            view = view[written:]
+        self.size += len(chunk)
+
+    def commit(self) -> None:
+        os.close(self._descriptor)
+        if self.size > self.cache.max_bytes:
+            os.unlink(self.temporary_path)
+            return
+        self.cache.store(self)
+
+    def abort(self) -> None:
+        os.close(self._descriptor)
+        try:
+            os.unlink(self.temporary_path)
+        except FileNotFoundError:
+            pass
+
+
+class ImageCache:
+    def __init__(self, directory: str, max_bytes: int, negative_ttl: float) -> None:
+        if not os.path.isdir(os.path.dirname(directory)):
+            raise FileNotFoundError(f"Missing cache directory at {directory}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.fills = 0
+        self.evictions = 0
+        self._counter_lock = threading.Lock()
+        self._connections = SqliteConnections(os.path.join(directory, "index.db"))
+        with self._connections.get() as connection:
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS images (
+                    key TEXT PRIMARY KEY,
+                    digest TEXT NOT NULL,
+                    status INTEGER NOT NULL,
+                    content_type TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    size INTEGER NOT NULL,
+                    expires_at REAL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS images_accessed_at ON images (accessed_at)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS usage (id INTEGER PRIMARY KEY, bytes INTEGER)"
+            )
+            connection.execute("INSERT OR IGNORE INTO usage (id, bytes) VALUES (1, 0)")
+
+    def _count(self, counter: str) -> None:
+        with self._counter_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def relative_path(self, digest: str) -> str:
+        return os.path.join(digest[:2], digest[2:4], digest)
+
+    def get(self, key: str) -> CachedImage | None:
+        connection = self._connections.get()
+        row = connection.execute(
+            "SELECT digest, status, content_type, etag, last_modified, "
+            "expires_at, accessed_at FROM images WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+        digest, status, content_type, etag, last_modified, expires_at, accessed_at = row
+        now = time.time()
+        if expires_at is not None and now >= expires_at:
+            self._count("misses")
+            return None
+        if now - accessed_at > IMAGE_CACHE_TOUCH_INTERVAL_SECONDS:
+            with connection:
+                connection.execute(
+                    "UPDATE images SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+        self._count("hits" if status == 200 else "negative_hits")
+        relative_path = self.relative_path(digest)
+        return CachedImage(
+            key,
+            os.path.join(self.directory, relative_path),
+            relative_path,
+            status,
+            content_type,
+            etag,
+            last_modified,
+        )
+
+    def contains(self, key: str) -> bool:
+        row = (
+            self._connections.get()
+            .execute("SELECT expires_at FROM images WHERE key = ?", (key,))
+            .fetchone()
+        )
+        return row is not None and (row[0] is None or time.time() < row[0])
+
+    def open_fill(
+        self,
+        key: str,
+        content_type: str,
+        etag: str | None,
+        last_modified: str | None,
+    ) -> ImageCacheFill:
+        return ImageCacheFill(self, key, content_type, etag, last_modified)
+
+    def put(
+        self,
+        key: str,
+        content_type: str,
+        etag: str | None,
+        last_modified: str | None,
+        body: bytes,
+    ) -> None:
+        fill = self.open_fill(key, content_type, etag, last_modified)
+        fill.write(body)
+        fill.commit()
+
+    def store(self, fill: ImageCacheFill) -> None:
+        digest = hashlib.sha256(fill.key.encode("utf-8")).hexdigest()
+        path = os.path.join(self.directory, self.relative_path(digest))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(fill.temporary_path, path)
+        self._index(
+            fill.key,
+            digest,
+            200,
+            fill.content_type,
+            fill.etag,
+            fill.last_modified,
+            fill.size,
+            None,
+        )
+        self._count("fills")
+
+    def remember_missing(self, key: str) -> None:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        self._index(
+            key, digest, 404, "", None, None, 0, time.time() + self.negative_ttl
+        )
+
+    def forget(self, key: str) -> None:
+        with self._connections.get() as connection:
+            row = connection.execute(
+                "SELECT size FROM images WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return
+            connection.execute("DELETE FROM images WHERE key = ?", (key,))
+            connection.execute(
+                "UPDATE usage SET bytes = bytes - ? WHERE id = 1", (row[0],)
+            )
+
+    def _index(
+        self,
+        key: str,
+        digest: str,
+        status: int,
+        content_type: str,
+        etag: str | None,
+        last_modified: str | None,
+        size: int,
+        expires_at: float | None,
+    ) -> None:
+        now = time.time()
+        with self._connections.get() as connection:
+            previous = connection.execute(
+                "SELECT size FROM images WHERE key = ?", (key,)
+            ).fetchone()
+            connection.execute(
+                "INSERT OR REPLACE INTO images "
+                "(key, digest, status, content_type, etag, last_modified, size, "
+                "expires_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    digest,
+                    status,
+                    content_type,
+                    etag,
+                    last_modified,
+                    size,
+                    expires_at,
+                    now,
+                ),
+            )
+            delta = size - (previous[0] if previous else 0)
+            connection.execute(
+                "UPDATE usage SET bytes = bytes + ? WHERE id = 1", (delta,)
+            )
+            evicted = self._evict(connection, now)
+        for evicted_digest in evicted:
+            try:
+                os.unlink(
+                    os.path.join(self.directory, self.relative_path(evicted_digest))
+                )
+            except FileNotFoundError:
+                pass
+
+    def _evict(self, connection: sqlite3.Connection, now: float) -> list[str]:
+        connection.execute(
+            "DELETE FROM images WHERE status != 200 AND expires_at <= ?", (now,)
+        )
+        (used,) = connection.execute("SELECT bytes FROM usage WHERE id = 1").fetchone()
+        evicted: list[str] = []
+        while used > self.max_bytes:
+            rows = connection.execute(
+                "SELECT key, digest, size FROM images WHERE status = 200 "
+                "ORDER BY accessed_at LIMIT ?",
+                (IMAGE_CACHE_EVICTION_BATCH,),
+            ).fetchall()
+            if not rows:
+                break
+            for key, digest, size in rows:
+                connection.execute("DELETE FROM images WHERE key = ?", (key,))
+                evicted.append(digest)
+                used -= size
+                if used <= self.max_bytes:
+                    break
+        if evicted:
+            connection.execute(
+                "UPDATE usage SET bytes = ? WHERE id = 1", (max(used, 0),)
+            )
+            with self._counter_lock:
+                self.evictions += len(evicted)
+        return evicted
+
+    def stats(self) -> dict:
+        (used,) = (
+            self._connections.get()
+            .execute("SELECT bytes FROM usage WHERE id = 1")
+            .fetchone()
+        )
+        with self._counter_lock:
+            return {
+                "bytes": used,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "negativeHits": self.negative_hits,
+                "fills": self.fills,
+                "evictions": self.evictions,
+            }
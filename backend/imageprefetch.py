@@ -0,0 +1,107 @@
+import os
+import queue
+import threading
+from collections.abc import Callable
+
+PREFETCH_FETCHED = "fetched"
+PREFETCH_CACHED = "cached"
+PREFETCH_MISSING = "missing"
+PREFETCH_FAILED = "failed"
+PREFETCH_DROPPED = "dropped"
+PREFETCH_DUPLICATE = "duplicate"
+
+PrefetchJob = Callable[[], str]
+PrefetchObserver = Callable[[str], None]
+
+
+class ImagePrefetcher:
+    def __init__(
+        self,
+        workers: int,
+        queue_depth: int,
+        observer: PrefetchObserver | None = None,
+    ) -> None:
+        self.workers = workers
+        self.observer = observer
+        self.counts = {
+            result: 0
+            for result in (
+                PREFETCH_FETCHED,
+                PREFETCH_CACHED,
+                PREFETCH_MISSING,
+                PREFETCH_FAILED,
+                PREFETCH_DROPPED,
+                PREFETCH_DUPLICATE,
+            )
+        }
+        self.queued = 0
+        self._queue: queue.Queue[tuple[str, PrefetchJob]] = queue.Queue(queue_depth)
+        self._pending: set[str] = set()
+        self._lock = threading.Lock()
+        self._pid: int | None = None
+
+    def _record(self, result: str) -> None:
+        with self._lock:
+            self.counts[result] += 1
+        if self.observer is not None:
+            self.observer(result)
+
+    def _start_workers(self) -> None:
+        # Called with the lock held; threads do not survive a fork, so each
+        # worker process starts its own
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._pending.clear()
+        self._queue = queue.Queue(self._queue.maxsize)
+        for index in range(self.workers):
+            threading.Thread(
+                target=self._run, name=f"image-prefetch-{index}", daemon=True
+            ).start()
+
+    def submit(self, key: str, job: PrefetchJob) -> bool:
+        with self._lock:
+            self._start_workers()
+            if key in self._pending:
+                result = PREFETCH_DUPLICATE
+            else:
+                try:
+                    self._queue.put_nowait((key, job))
+                except queue.Full:
+                    result = PREFETCH_DROPPED
+                else:
+                    self._pending.add(key)
+                    self.queued += 1
+                    return True
+        self._record(result)
+        return False
+
+    def _run(self) -> None:
+        pid = os.getpid()
+        while self._pid == pid:
+            key, job = self._queue.get()
+            # A job that fails in any way must not take the worker down with it
+            try:
+                result = job()
+            except Exception:  # noqa: BLE001
+                result = PREFETCH_FAILED
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+            self._record(result)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queueDepth": self._queue.qsize(),
+                "maxQueueDepth": self._queue.maxsize,
+                "pending": len(self._pending),
+                "queued": self.queued,
+                "fetched": self.counts[PREFETCH_FETCHED],
+                "alreadyCached": self.counts[PREFETCH_CACHED],
+                "missing": self.counts[PREFETCH_MISSING],
+                "failed": self.counts[PREFETCH_FAILED],
+                "dropped": self.counts[PREFETCH_DROPPED],
+                "duplicates": self.counts[PREFETCH_DUPLICATE],
+            }
@@ -0,0 +1,43 @@
+import json
+import os
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_CODECS = ("orjson", "json")
+
+
+def select_json_codec(name: str) -> str:
+    if name == "auto":
+        return "orjson" if orjson is not None else "json"
+    if name not in JSON_CODECS:
+        raise ValueError(
+            f"Unknown JSON codec {name!r}; expected auto or one of "
+            f"{', '.join(JSON_CODECS)}"
+        )
+    if name == "orjson" and orjson is None:
+        raise RuntimeError("orjson is not installed")
+    return name
+
+
+JSON_CODEC = select_json_codec(os.getenv("AOIFE_JSON_CODEC", "auto"))
+
+
+def json_loads(data: bytes | str) -> Any:
+    if JSON_CODEC == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(data: object) -> bytes:
+    if JSON_CODEC == "orjson":
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+
+def is_json_content_type(content_type: str | None) -> bool:
+    media_type = (content_type or "").split(";", 1)[0].strip().lower()
+    return media_type == "application/json" or media_type.endswith("+json")
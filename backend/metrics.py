@@ -0,0 +1,352 @@
+import atexit
+import bisect
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from circuitbreaker import BREAKER_REJECTED
+from sqlitedb import SqliteConnections
+from upstreamscheduler import SCHEDULE_DISPATCHED
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LOCK_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+METRICS_FLUSH_INTERVAL_SECONDS = 1.0
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+SQLITE_ADD_SAMPLE = """
+    INSERT INTO samples (family, labels, suffix, bucket, value)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (family, labels, suffix, bucket)
+    DO UPDATE SET value = value + excluded.value
+"""
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    return ",".join(
+        f'{name}="{escape_label_value(value)}"'
+        for name, value in zip(names, values, strict=True)
+    )
+
+
+def format_value(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+@dataclass(frozen=True, eq=False)
+class Metric:
+    registry: MetricsRegistry
+    name: str
+    kind: str
+    help: str
+    label_names: tuple[str, ...]
+    buckets: tuple[float, ...] = ()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self.registry.record(self, labels, amount)
+
+    def observe(self, value: float, *labels: str) -> None:
+        self.registry.record(self, labels, value)
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def samples(
+        self, labels: tuple[str, ...], pending: float | list[float]
+    ) -> Iterator[tuple[str, str, str, int, float]]:
+        label_text = format_labels(self.label_names, labels)
+        if isinstance(pending, float):
+            yield self.name, label_text, "", 0, pending
+            return
+        cumulative = 0.0
+        for index, count in enumerate(pending[:-1]):
+            cumulative += count
+            yield self.name, label_text, "_bucket", index, cumulative
+        yield self.name, label_text, "_count", 0, cumulative
+        yield self.name, label_text, "_sum", 0, pending[-1]
+
+    def bucket_bound(self, index: int) -> str:
+        if index >= len(self.buckets):
+            return "+Inf"
+        return format_value(self.buckets[index])
+
+
+@dataclass
+class Gauge:
+    name: str
+    help: str
+    value: float
+    labels: dict[str, str] = field(default_factory=dict)
+
+
+class MetricsRegistry:
+    def __init__(
+        self, path: str, flush_interval: float = METRICS_FLUSH_INTERVAL_SECONDS
+    ) -> None:
+        self.path = path
+        self.flush_interval = flush_interval
+        self.failed_flushes = 0
+        self._metrics: dict[str, Metric] = {}
+        self._connections = SqliteConnections(path)
+        self._pending: dict[tuple[Metric, tuple[str, ...]], float | list[float]] = {}
+        self._lock = threading.Lock()
+        self._pid: int | None = None
+        self._initialized = False
+        atexit.register(self._try_flush)
+
+    def counter(self, name: str, help: str, label_names: Iterable[str] = ()) -> Metric:
+        return self._register(Metric(self, name, "counter", help, tuple(label_names)))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        label_names: Iterable[str] = (),
+        buckets: Iterable[float] = LATENCY_BUCKETS,
+    ) -> Metric:
+        return self._register(
+            Metric(self, name, "histogram", help, tuple(label_names), tuple(buckets))
+        )
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name!r} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def record(self, metric: Metric, labels: tuple[str, ...], value: float) -> None:
+        with self._lock:
+            if self._pid != os.getpid():
+                # Samples recorded before a fork belong to the parent
+                self._pending = {}
+                self._pid = os.getpid()
+                threading.Thread(
+                    target=self._flush_periodically, name="metrics-flush", daemon=True
+                ).start()
+            key = (metric, labels)
+            if metric.kind == "counter":
+                self._pending[key] = self._pending.get(key, 0.0) + value
+                return
+            pending = self._pending.get(key)
+            if not isinstance(pending, list):
+                pending = [0.0] * (len(metric.buckets) + 2)
+                self._pending[key] = pending
+            pending[bisect.bisect_left(metric.buckets, value)] += 1
+            pending[-1] += value
+
+    def _flush_periodically(self) -> None:
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.flush_interval)
+            self._try_flush()
+
+    def _try_flush(self) -> None:
+        try:
+            self.flush()
+        except sqlite3.Error:
+            self.failed_flushes += 1
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = self._connections.get()
+        if not self._initialized:
+            with connection:
+                connection.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS samples (
+                        family TEXT NOT NULL,
+                        labels TEXT NOT NULL,
+                        suffix TEXT NOT NULL,
+                        bucket INTEGER NOT NULL,
+                        value REAL NOT NULL,
+                        PRIMARY KEY (family, labels, suffix, bucket)
+                    ) WITHOUT ROWID
+                    """
+                )
+            self._initialized = True
+        return connection
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        rows = [
+            sample
+            for (metric, labels), value in pending.items()
+            for sample in metric.samples(labels, value)
+        ]
+        with self._connection() as connection:
+            connection.executemany(SQLITE_ADD_SAMPLE, rows)
+
+    def render(self, gauges: Iterable[Gauge] = ()) -> str:
+        self.flush()
+        rows = self._connection().execute(
+            "SELECT family, labels, suffix, bucket, value FROM samples "
+            "ORDER BY family, labels, suffix, bucket"
+        )
+        families: dict[str, list[str]] = {}
+        for family, labels, suffix, bucket, value in rows:
+            metric = self._metrics.get(family)
+            if metric is None:
+                continue
+            if suffix == "_bucket":
+                bound = f'le="{metric.bucket_bound(bucket)}"'
+                labels = f"{labels},{bound}" if labels else bound
+            families.setdefault(family, []).append(
+                f"{family}{suffix}{{{labels}}} {format_value(value)}"
+                if labels
+                else f"{family}{suffix} {format_value(value)}"
+            )
+
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(families.get(name, ()))
+        described = set()
+        for gauge in gauges:
+            if gauge.name not in described:
+                described.add(gauge.name)
+                lines.append(f"# HELP {gauge.name} {gauge.help}")
+                lines.append(f"# TYPE {gauge.name} gauge")
+            labels = format_labels(gauge.labels, gauge.labels.values())
+            lines.append(
+                f"{gauge.name}{{{labels}}} {format_value(gauge.value)}"
+                if labels
+                else f"{gauge.name} {format_value(gauge.value)}"
+            )
+        return "\n".join(lines) + "\n"
+
+
+class ServiceMetrics:
+    def __init__(self, registry: MetricsRegistry) -> None:
+        self.registry = registry
+        self.http_requests = registry.counter(
+            "aoife_http_requests_total",
+            "Requests by endpoint, method and status",
+            ("endpoint", "method", "status"),
+        )
+        self.http_duration = registry.histogram(
+            "aoife_http_request_duration_seconds",
+            "Time to produce a response by endpoint",
+            ("endpoint",),
+        )
+        self.upstream_requests = registry.counter(
+            "aoife_upstream_requests_total",
+            "Upstream requests by provider and status, timeout or error",
+            ("provider", "status"),
+        )
+        self.upstream_duration = registry.histogram(
+            "aoife_upstream_request_duration_seconds",
+            "Time to upstream response headers by provider",
+            ("provider",),
+        )
+        self.share_lock_wait = registry.histogram(
+            "aoife_share_lock_wait_seconds",
+            "Time spent waiting for share.lock",
+            ("mode",),
+            LOCK_BUCKETS,
+        )
+        self.share_lock_hold = registry.histogram(
+            "aoife_share_lock_hold_seconds",
+            "Time share.lock was held",
+            ("mode",),
+            LOCK_BUCKETS,
+        )
+        self.share_persist = registry.histogram(
+            "aoife_share_persist_seconds",
+            "Time to persist a new share by store",
+            ("store",),
+            LOCK_BUCKETS,
+        )
+        self.breaker_transitions = registry.counter(
+            "aoife_upstream_breaker_transitions_total",
+            "Circuit breaker state changes by provider and new state",
+            ("provider", "state"),
+        )
+        self.breaker_rejections = registry.counter(
+            "aoife_upstream_breaker_rejections_total",
+            "Upstream requests failed fast by an open circuit breaker",
+            ("provider",),
+        )
+        self.upstream_schedules = registry.counter(
+            "aoife_upstream_schedule_total",
+            "Paced upstream requests by provider and whether they were sent, "
+            "rejected by a full queue or expired in it",
+            ("provider", "result"),
+        )
+        self.upstream_queue_wait = registry.histogram(
+            "aoife_upstream_queue_wait_seconds",
+            "Time paced upstream requests waited for their turn by provider",
+            ("provider",),
+        )
+        self.image_prefetches = registry.counter(
+            "aoife_image_prefetch_total",
+            "Share cover prefetches by result",
+            ("result",),
+        )
+        self.share_view_images = registry.counter(
+            "aoife_share_view_images_total",
+            "Cover images requested by share pages by whether the cache was warm",
+            ("cache",),
+        )
+        self.rate_limit_rejections = registry.counter(
+            "aoife_rate_limit_rejections_total",
+            "Requests rejected by a rate limit by endpoint",
+            ("endpoint",),
+        )
+
+    def request_finished(
+        self, endpoint: str, method: str, status: int, seconds: float
+    ) -> None:
+        self.http_requests.inc(endpoint, method, str(status))
+        self.http_duration.observe(seconds, endpoint)
+
+    def upstream_finished(self, provider: str, status: str, seconds: float) -> None:
+        self.upstream_requests.inc(provider, status)
+        self.upstream_duration.observe(seconds, provider)
+
+    def breaker_event(self, provider: str, event: str) -> None:
+        if event == BREAKER_REJECTED:
+            self.breaker_rejections.inc(provider)
+        else:
+            self.breaker_transitions.inc(provider, event)
+
+    def upstream_scheduled(self, provider: str, result: str, seconds: float) -> None:
+        self.upstream_schedules.inc(provider, result)
+        if result == SCHEDULE_DISPATCHED:
+            self.upstream_queue_wait.observe(seconds, provider)
+
+    def image_prefetched(self, result: str) -> None:
+        self.image_prefetches.inc(result)
+
+    def share_view_image(self, warm: bool) -> None:
+        self.share_view_images.inc("warm" if warm else "cold")
+
+    def lock_acquired(self, exclusive: bool, seconds: float) -> None:
+        self.share_lock_wait.observe(seconds, "exclusive" if exclusive else "shared")
+
+    def lock_released(self, exclusive: bool, seconds: float) -> None:
+        self.share_lock_hold.observe(seconds, "exclusive" if exclusive else "shared")
+
+    def persisted(self, store: str, seconds: float) -> None:
+        self.share_persist.observe(seconds, store)
+
+    def rate_limited(self, endpoint: str) -> None:
+        self.rate_limit_rejections.inc(endpoint)
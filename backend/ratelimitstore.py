@@ -0,0 +1,198 @@
+import fcntl
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import ClassVar
+
+from limits.storage import SlidingWindowCounterSupport, Storage
+from limits.storage.base import TimestampedSlidingWindow
+
+from sqlitedb import SqliteConnections
+
+RATE_LIMIT_STORE_SHARDS = 8
+RATE_LIMIT_STORE_SWEEP_INTERVAL_SECONDS = 60
+
+
+class SqliteRateLimitStorage(
+    Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow
+):
+    STORAGE_SCHEME: ClassVar[list[str]] = ["aoife-sqlite"]
+
+    def __init__(
+        self,
+        uri: str | None = None,
+        wrap_exceptions: bool = False,
+        shards: int = RATE_LIMIT_STORE_SHARDS,
+        **options: float | str | bool,
+    ) -> None:
+        self.directory = (uri or "").removeprefix("aoife-sqlite://")
+        if not self.directory:
+            raise ValueError("Rate limit storage URI needs a directory")
+        self._shards: list[SqliteConnections] | None = None
+        self._shard_count = int(shards)
+        self._swept_at = [0.0] * self._shard_count
+        self._lock = threading.Lock()
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self) -> type[Exception] | tuple[type[Exception], ...]:
+        return sqlite3.Error
+
+    def _get_shards(self) -> list[SqliteConnections]:
+        if self._shards is not None:
+            return self._shards
+        with self._lock:
+            if self._shards is None:
+                os.makedirs(self.directory, exist_ok=True)
+                shards = [
+                    SqliteConnections(os.path.join(self.directory, f"{index:02d}.db"))
+                    for index in range(self._shard_count)
+                ]
+                # Switching a new database to WAL fails rather than waits when
+                # several workers start at once, so create the shards one at a time
+                lock_path = os.path.join(self.directory, "init.lock")
+                with open(lock_path, "a", encoding="utf-8") as lock_handle:
+                    fcntl.flock(lock_handle.fileno(), fcntl.LOCK_EX)
+                    for shard in shards:
+                        with shard.get() as connection:
+                            connection.execute(
+                                """
+                                CREATE TABLE IF NOT EXISTS counters (
+                                    key TEXT PRIMARY KEY,
+                                    count INTEGER NOT NULL,
+                                    expires_at REAL NOT NULL
+                                ) WITHOUT ROWID
+                                """
+                            )
+                self._shards = shards
+            return self._shards
+
+    def _shard_index(self, key: str) -> int:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big") % self._shard_count
+
+    def _connection(self, key: str) -> sqlite3.Connection:
+        return self._get_shards()[self._shard_index(key)].get()
+
+    def _sweep(self, connection: sqlite3.Connection, shard: int, now: float) -> None:
+        if now - self._swept_at[shard] < RATE_LIMIT_STORE_SWEEP_INTERVAL_SECONDS:
+            return
+        self._swept_at[shard] = now
+        connection.execute("DELETE FROM counters WHERE expires_at <= ?", (now,))
+
+    def _count(self, connection: sqlite3.Connection, key: str, now: float) -> int:
+        row = connection.execute(
+            "SELECT count FROM counters WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _increment(
+        self,
+        connection: sqlite3.Connection,
+        key: str,
+        expiry: float,
+        amount: int,
+        now: float,
+    ) -> int:
+        (count,) = connection.execute(
+            "INSERT INTO counters (key, count, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET "
+            "count = CASE WHEN expires_at <= ?4 THEN excluded.count "
+            "ELSE count + excluded.count END, "
+            "expires_at = CASE WHEN expires_at <= ?4 THEN excluded.expires_at "
+            "ELSE expires_at END "
+            "RETURNING count",
+            (key, amount, now + expiry, now),
+        ).fetchone()
+        return count
+
+    def incr(self, key: str, expiry: float, amount: int = 1) -> int:
+        now = time.time()
+        shard = self._shard_index(key)
+        connection = self._get_shards()[shard].get()
+        with connection:
+            count = self._increment(connection, key, expiry, amount, now)
+            self._sweep(connection, shard, now)
+        return count
+
+    def get(self, key: str) -> int:
+        return self._count(self._connection(key), key, time.time())
+
+    def get_expiry(self, key: str) -> float:
+        now = time.time()
+        row = (
+            self._connection(key)
+            .execute(
+                "SELECT expires_at FROM counters WHERE key = ? AND expires_at > ?",
+                (key, now),
+            )
+            .fetchone()
+        )
+        return row[0] if row else now
+
+    def check(self) -> bool:
+        try:
+            for shard in self._get_shards():
+                shard.get().execute("SELECT 1").fetchone()
+        except sqlite3.Error, OSError:
+            return False
+        return True
+
+    def reset(self) -> int | None:
+        cleared = 0
+        for shard in self._get_shards():
+            with shard.get() as connection:
+                cleared += connection.execute("DELETE FROM counters").rowcount
+        return cleared
+
+    def clear(self, key: str) -> None:
+        with self._connection(key) as connection:
+            connection.execute("DELETE FROM counters WHERE key = ?", (key,))
+
+    def _sliding_window(
+        self, connection: sqlite3.Connection, key: str, expiry: int, now: float
+    ) -> tuple[int, float, int, float]:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous_count = self._count(connection, previous_key, now)
+        current_count = self._count(connection, current_key, now)
+        previous_ttl = (
+            (1 - (((now - expiry) / expiry) % 1)) * expiry if previous_count else 0.0
+        )
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return previous_count, previous_ttl, current_count, current_ttl
+
+    def acquire_sliding_window_entry(
+        self, key: str, limit: int, expiry: int, amount: int = 1
+    ) -> bool:
+        if amount > limit:
+            return False
+        now = time.time()
+        shard = self._shard_index(key)
+        connection = self._get_shards()[shard].get()
+        with connection:
+            # Take the shard's write lock first so the read and the increment are atomic
+            connection.execute("BEGIN IMMEDIATE")
+            previous_count, previous_ttl, current_count, _ = self._sliding_window(
+                connection, key, expiry, now
+            )
+            weighted_count = previous_count * previous_ttl / expiry + current_count
+            if int(weighted_count) + amount > limit:
+                return False
+            _, current_key = self.sliding_window_keys(key, expiry, now)
+            self._increment(connection, current_key, 2 * expiry, amount, now)
+            self._sweep(connection, shard, now)
+        return True
+
+    def get_sliding_window(
+        self, key: str, expiry: int
+    ) -> tuple[int, float, int, float]:
+        return self._sliding_window(self._connection(key), key, expiry, time.time())
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        with self._connection(key) as connection:
+            connection.execute(
+                "DELETE FROM counters WHERE key IN (?, ?)", (previous_key, current_key)
+            )
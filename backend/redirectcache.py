@@ -0,0 +1,157 @@
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+from sqlitedb import SqliteConnections
+
+REDIRECT_CACHE_TOUCH_INTERVAL_SECONDS = 60
+REDIRECT_CACHE_EVICTION_BATCH = 256
+
+
+@dataclass(frozen=True)
+class ResolvedLocation:
+    status: int
+    location: str | None
+    body: bytes | None
+    expires_at: float
+
+
+class RedirectCache:
+    def __init__(self, directory: str, max_entries: int) -> None:
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"Missing cache directory at {directory}")
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.evictions = 0
+        self._counter_lock = threading.Lock()
+        self._connections = SqliteConnections(os.path.join(directory, "redirects.db"))
+        with self._connections.get() as connection:
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS redirects (
+                    key TEXT PRIMARY KEY,
+                    status INTEGER NOT NULL,
+                    location TEXT,
+                    body BLOB,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS redirects_accessed_at "
+                "ON redirects (accessed_at)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS usage (id INTEGER PRIMARY KEY, entries INTEGER)"
+            )
+            connection.execute(
+                "INSERT OR IGNORE INTO usage (id, entries) VALUES (1, 0)"
+            )
+
+    def _count(self, counter: str) -> None:
+        with self._counter_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key: str) -> ResolvedLocation | None:
+        connection = self._connections.get()
+        row = connection.execute(
+            "SELECT status, location, body, expires_at, accessed_at "
+            "FROM redirects WHERE key = ?",
+            (key,),
+        ).fetchone()
+        now = time.time()
+        if row is None or now >= row[3]:
+            self._count("misses")
+            return None
+        status, location, body, expires_at, accessed_at = row
+        if now - accessed_at > REDIRECT_CACHE_TOUCH_INTERVAL_SECONDS:
+            with connection:
+                connection.execute(
+                    "UPDATE redirects SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+        self._count("hits" if status == 200 else "negative_hits")
+        return ResolvedLocation(status, location, body, expires_at)
+
+    def put(
+        self,
+        key: str,
+        status: int,
+        location: str | None,
+        body: bytes | None,
+        ttl_seconds: float | None,
+    ) -> ResolvedLocation:
+        now = time.time()
+        entry = ResolvedLocation(status, location, body, now + (ttl_seconds or 0))
+        if ttl_seconds is None:
+            return entry
+        with self._connections.get() as connection:
+            previous = connection.execute(
+                "SELECT 1 FROM redirects WHERE key = ?", (key,)
+            ).fetchone()
+            connection.execute(
+                "INSERT OR REPLACE INTO redirects "
+                "(key, status, location, body, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, status, location, body, entry.expires_at, now),
+            )
+            if previous is None:
+                connection.execute(
+                    "UPDATE usage SET entries = entries + 1 WHERE id = 1"
+                )
+            self._evict(connection, now)
+        return entry
+
+    def forget(self, key: str) -> None:
+        with self._connections.get() as connection:
+            deleted = connection.execute(
+                "DELETE FROM redirects WHERE key = ?", (key,)
+            ).rowcount
+            if deleted:
+                connection.execute(
+                    "UPDATE usage SET entries = entries - 1 WHERE id = 1"
+                )
+
+    def _evict(self, connection: sqlite3.Connection, now: float) -> None:
+        (entries,) = connection.execute(
+            "SELECT entries FROM usage WHERE id = 1"
+        ).fetchone()
+        if entries <= self.max_entries:
+            return
+        entries -= connection.execute(
+            "DELETE FROM redirects WHERE expires_at <= ?", (now,)
+        ).rowcount
+        evicted = 0
+        if entries > self.max_entries:
+            evicted = connection.execute(
+                "DELETE FROM redirects WHERE key IN "
+                "(SELECT key FROM redirects ORDER BY accessed_at LIMIT ?)",
+                (entries - self.max_entries + REDIRECT_CACHE_EVICTION_BATCH,),
+            ).rowcount
+            entries -= evicted
+        connection.execute(
+            "UPDATE usage SET entries = ? WHERE id = 1", (max(entries, 0),)
+        )
+        if evicted:
+            with self._counter_lock:
+                self.evictions += evicted
+
+    def stats(self) -> dict:
+        (entries,) = (
+            self._connections.get()
+            .execute("SELECT entries FROM usage WHERE id = 1")
+            .fetchone()
+        )
+        with self._counter_lock:
+            return {
+                "entries": entries,
+                "maxEntries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "negativeHits": self.negative_hits,
+                "evictions": self.evictions,
+            }
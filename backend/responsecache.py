@@ -0,0 +1,423 @@
+import asyncio
+import fcntl
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Awaitable, Callable, Iterator, Mapping
+from contextlib import contextmanager
+from dataclasses import dataclass
+from urllib.parse import urlencode
+
+import requests
+
+from sqlitedb import SqliteConnections
+
+RESPONSE_CACHE_SECRET_PARAMS = frozenset(("api_key", "apikey"))
+RESPONSE_CACHE_TOUCH_INTERVAL_SECONDS = 60
+RESPONSE_CACHE_EVICTION_BATCH = 64
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    ttl_seconds: float
+    stale_seconds: float
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    status: int
+    body: bytes
+    content_type: str
+    expires_at: float
+    stale_until: float
+
+
+UpstreamLoader = Callable[[], tuple[int, bytes, str]]
+AsyncUpstreamLoader = Callable[[], Awaitable[tuple[int, bytes, str]]]
+
+
+def response_cache_key(
+    provider: str, path: str, params: Mapping[str, str | None]
+) -> str:
+    query = urlencode(
+        sorted(
+            (name, value or "")
+            for name, value in params.items()
+            if name.lower() not in RESPONSE_CACHE_SECRET_PARAMS
+        )
+    )
+    return f"{provider}:{path.strip('/')}?{query}"
+
+
+class ResponseCache:
+    def __init__(
+        self, directory: str, max_bytes: int, serve_stale_on_error: bool = False
+    ) -> None:
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"Missing cache directory at {directory}")
+        self.max_bytes = max_bytes
+        self.serve_stale_on_error = serve_stale_on_error
+        self.lock_directory = os.path.join(directory, "locks")
+        os.makedirs(self.lock_directory, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.coalesced = 0
+        self.revalidations = 0
+        self.fallbacks = 0
+        self._counter_lock = threading.Lock()
+        self._refreshing: set[str] = set()
+        self._pending: dict[str, asyncio.Task[tuple[CachedResponse, str]]] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._connections = SqliteConnections(os.path.join(directory, "responses.db"))
+        with self._connections.get() as connection:
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    provider TEXT NOT NULL,
+                    status INTEGER NOT NULL,
+                    content_type TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    stale_until REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed_at "
+                "ON responses (accessed_at)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS usage (id INTEGER PRIMARY KEY, bytes INTEGER)"
+            )
+            connection.execute("INSERT OR IGNORE INTO usage (id, bytes) VALUES (1, 0)")
+
+    def _count(self, counter: str) -> None:
+        with self._counter_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key: str) -> CachedResponse | None:
+        connection = self._connections.get()
+        row = connection.execute(
+            "SELECT status, content_type, body, expires_at, stale_until, accessed_at "
+            "FROM responses WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        status, content_type, body, expires_at, stale_until, accessed_at = row
+        now = time.time()
+        if now >= stale_until:
+            return None
+        if now - accessed_at > RESPONSE_CACHE_TOUCH_INTERVAL_SECONDS:
+            with connection:
+                connection.execute(
+                    "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+        return CachedResponse(status, body, content_type, expires_at, stale_until)
+
+    def fallback(self, key: str) -> CachedResponse | None:
+        if not self.serve_stale_on_error:
+            return None
+        row = (
+            self._connections.get()
+            .execute(
+                "SELECT status, content_type, body, expires_at, stale_until "
+                "FROM responses WHERE key = ?",
+                (key,),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        self._count("fallbacks")
+        status, content_type, body, expires_at, stale_until = row
+        return CachedResponse(status, body, content_type, expires_at, stale_until)
+
+    def put(
+        self,
+        key: str,
+        provider: str,
+        policy: CachePolicy,
+        status: int,
+        body: bytes,
+        content_type: str,
+    ) -> CachedResponse:
+        now = time.time()
+        entry = CachedResponse(
+            status,
+            body,
+            content_type,
+            now + policy.ttl_seconds,
+            now + policy.ttl_seconds + policy.stale_seconds,
+        )
+        if len(body) > self.max_bytes:
+            return entry
+        with self._connections.get() as connection:
+            previous = connection.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, provider, status, content_type, body, size, "
+                "expires_at, stale_until, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    provider,
+                    status,
+                    content_type,
+                    body,
+                    len(body),
+                    entry.expires_at,
+                    entry.stale_until,
+                    now,
+                ),
+            )
+            delta = len(body) - (previous[0] if previous else 0)
+            connection.execute(
+                "UPDATE usage SET bytes = bytes + ? WHERE id = 1", (delta,)
+            )
+            self._evict(connection, now)
+        return entry
+
+    def _evict(self, connection: sqlite3.Connection, now: float) -> None:
+        (used,) = connection.execute("SELECT bytes FROM usage WHERE id = 1").fetchone()
+        if used <= self.max_bytes:
+            return
+        (expired,) = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses WHERE stale_until <= ?",
+            (now,),
+        ).fetchone()
+        connection.execute("DELETE FROM responses WHERE stale_until <= ?", (now,))
+        used -= expired
+        while used > self.max_bytes:
+            rows = connection.execute(
+                "SELECT key, size FROM responses ORDER BY accessed_at LIMIT ?",
+                (RESPONSE_CACHE_EVICTION_BATCH,),
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                used -= size
+                if used <= self.max_bytes:
+                    break
+        connection.execute("UPDATE usage SET bytes = ? WHERE id = 1", (max(used, 0),))
+
+    def _lock_path(self, key: str) -> str:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+        return os.path.join(self.lock_directory, f"{digest}.lock")
+
+    @contextmanager
+    def _fill_lock(self, key: str, blocking: bool = True) -> Iterator[bool]:
+        # One lock file per key: a fill waiting out upstream pacing only holds
+        # up requests for the same key. The holder unlinks the file on release,
+        # so a waiter that wakes holding an unlinked file starts over
+        path = self._lock_path(key)
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        while True:
+            with open(path, "a", encoding="utf-8") as lock_handle:
+                try:
+                    fcntl.flock(lock_handle.fileno(), flags)
+                except BlockingIOError:
+                    yield False
+                    return
+                try:
+                    linked = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if not os.path.samestat(linked, os.fstat(lock_handle.fileno())):
+                    continue
+                try:
+                    yield True
+                finally:
+                    os.unlink(path)
+                return
+
+    def lookup(self, key: str) -> tuple[CachedResponse | None, str]:
+        entry = self.get(key)
+        if entry is None:
+            return None, "MISS"
+        if time.time() < entry.expires_at:
+            self._count("hits")
+            return entry, "HIT"
+        self._count("stale")
+        return entry, "STALE"
+
+    def fetch(
+        self,
+        key: str,
+        provider: str,
+        policy: CachePolicy,
+        loader: UpstreamLoader,
+    ) -> tuple[CachedResponse, str]:
+        entry, state = self.lookup(key)
+        if entry is not None:
+            if state == "STALE":
+                self._revalidate(key, provider, policy, loader)
+            return entry, state
+
+        with self._fill_lock(key):
+            entry = self.get(key)
+            if entry is not None and time.time() < entry.expires_at:
+                self._count("coalesced")
+                return entry, "HIT"
+            self._count("misses")
+            try:
+                status, body, content_type = loader()
+            except requests.exceptions.RequestException:
+                entry = self.fallback(key)
+                if entry is None:
+                    raise
+                return entry, "STALE"
+            if status != 200:
+                return CachedResponse(status, body, content_type, 0, 0), "MISS"
+            return self.put(key, provider, policy, status, body, content_type), "MISS"
+
+    def _revalidate(
+        self,
+        key: str,
+        provider: str,
+        policy: CachePolicy,
+        loader: UpstreamLoader,
+    ) -> None:
+        with self._counter_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh() -> None:
+            try:
+                with self._fill_lock(key, blocking=False) as acquired:
+                    if not acquired:
+                        return
+                    entry = self.get(key)
+                    if entry is not None and time.time() < entry.expires_at:
+                        return
+                    self._count("revalidations")
+                    try:
+                        status, body, content_type = loader()
+                    except requests.exceptions.RequestException, ValueError:
+                        return
+                    if status == 200:
+                        self.put(key, provider, policy, status, body, content_type)
+            finally:
+                with self._counter_lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    async def fetch_async(
+        self,
+        key: str,
+        provider: str,
+        policy: CachePolicy,
+        loader: AsyncUpstreamLoader,
+    ) -> tuple[CachedResponse, str]:
+        entry, state = await asyncio.to_thread(self.lookup, key)
+        if entry is not None:
+            if state == "STALE":
+                self._revalidate_async(key, provider, policy, loader)
+            return entry, state
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            self._count("coalesced")
+            entry, _ = await asyncio.shield(pending)
+            if time.time() < entry.expires_at:
+                return entry, "HIT"
+            return entry, "STALE" if entry.stale_until else "MISS"
+
+        # The fill is a task of its own, so cancelling the request that started
+        # it leaves it running for the requests coalesced onto it
+        task = asyncio.get_running_loop().create_task(
+            self._fill_async(key, provider, policy, loader)
+        )
+        self._pending[key] = task
+        self._tasks.add(task)
+        task.add_done_callback(lambda done: self._fill_done(key, done))
+        return await asyncio.shield(task)
+
+    async def _fill_async(
+        self,
+        key: str,
+        provider: str,
+        policy: CachePolicy,
+        loader: AsyncUpstreamLoader,
+    ) -> tuple[CachedResponse, str]:
+        self._count("misses")
+        try:
+            status, body, content_type = await loader()
+        except OSError:
+            fallback = await asyncio.to_thread(self.fallback, key)
+            if fallback is None:
+                raise
+            return fallback, "STALE"
+        if status != 200:
+            return CachedResponse(status, body, content_type, 0, 0), "MISS"
+        entry = await asyncio.to_thread(
+            self.put, key, provider, policy, status, body, content_type
+        )
+        return entry, "MISS"
+
+    def _fill_done(self, key: str, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if self._pending.get(key) is task:
+            del self._pending[key]
+        # Nobody may be left to await a failed fill
+        if not task.cancelled():
+            task.exception()
+
+    def _revalidate_async(
+        self,
+        key: str,
+        provider: str,
+        policy: CachePolicy,
+        loader: AsyncUpstreamLoader,
+    ) -> None:
+        with self._counter_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        async def refresh() -> None:
+            try:
+                self._count("revalidations")
+                status, body, content_type = await loader()
+                if status == 200:
+                    await asyncio.to_thread(
+                        self.put, key, provider, policy, status, body, content_type
+                    )
+            except OSError, ValueError:
+                return
+            finally:
+                with self._counter_lock:
+                    self._refreshing.discard(key)
+
+        task = asyncio.get_running_loop().create_task(refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def stats(self) -> dict:
+        (used,) = (
+            self._connections.get()
+            .execute("SELECT bytes FROM usage WHERE id = 1")
+            .fetchone()
+        )
+        with self._counter_lock:
+            return {
+                "bytes": used,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "coalesced": self.coalesced,
+                "revalidations": self.revalidations,
+                "fallbacks": self.fallbacks,
+            }
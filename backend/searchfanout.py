@@ -0,0 +1,348 @@
+import os
+import time
+from collections.abc import Callable, Hashable
+from dataclasses import dataclass
+
+import requests
+
+from circuitbreaker import UpstreamUnavailable
+from jsoncodec import json_dumps, json_loads
+
+SEARCH_OK = "ok"
+SEARCH_ERROR = "error"
+SEARCH_TIMEOUT = "timeout"
+SEARCH_UNAVAILABLE = "unavailable"
+SEARCH_RATE_LIMITED = "rate-limited"
+SEARCH_DONE = "done"
+SEARCH_CONTENT_TYPE = "application/x-ndjson"
+SEARCH_MAX_QUERY_LENGTH = 200
+SEARCH_RESULT_LIMIT = 20
+TMDB_IMAGE_BASE = "https://image.tmdb.org/t/p"
+OPENLIBRARY_COVER_BASE = "https://covers.openlibrary.org/b/id"
+GAMESDB_IMAGE_ROUTE = "/api/gamesdb/images"
+
+SearchNormalizer = Callable[[object], list[dict]]
+
+
+@dataclass(frozen=True)
+class SearchSource:
+    name: str
+    provider: str
+    path: str
+    query_param: str
+    # Legs count against the rate limit of this proxy endpoint
+    endpoint: str
+    deadline: float
+    normalize: SearchNormalizer
+    extra_params: tuple[tuple[str, str], ...] = ()
+    # Sources on a paced host are only searched when asked for by name
+    default: bool = True
+
+    def params(self, query: str) -> dict[str, str | None]:
+        return {self.query_param: query, **dict(self.extra_params)}
+
+
+def search_deadline(name: str, default: float) -> float:
+    return float(os.getenv(f"AOIFE_SEARCH_{name.upper()}_DEADLINE", default))
+
+
+def object_at(data: object, *path: str) -> object:
+    for name in path:
+        data = data.get(name) if isinstance(data, dict) else None
+    return data
+
+
+def object_list(data: object, *path: str) -> list[dict]:
+    data = object_at(data, *path)
+    if not isinstance(data, list):
+        return []
+    return [item for item in data if isinstance(item, dict)]
+
+
+def year_of(date: object) -> int | None:
+    if isinstance(date, str) and date[:4].isdigit():
+        return int(date[:4])
+    return None
+
+
+def search_result(
+    result_id: object,
+    media_type: str,
+    title: object,
+    year: int | None,
+    cover_url: str | None,
+    cover_thumbnail_url: str | None,
+    source: str,
+    subtitle: str | None = None,
+) -> dict | None:
+    if not isinstance(result_id, (str, int)) or not isinstance(title, str):
+        return None
+    if not title.strip():
+        return None
+    return {
+        "id": result_id,
+        "type": media_type,
+        "title": title,
+        "subtitle": subtitle or (str(year) if year else None),
+        "year": year,
+        "coverUrl": cover_url,
+        "coverThumbnailUrl": cover_thumbnail_url,
+        "source": source,
+    }
+
+
+def normalize_tmdb(media_type: str) -> SearchNormalizer:
+    title_field, date_field = (
+        ("name", "first_air_date") if media_type == "tv" else ("title", "release_date")
+    )
+
+    def normalize(data: object) -> list[dict]:
+        results = []
+        for item in object_list(data, "results")[:SEARCH_RESULT_LIMIT]:
+            poster = item.get("poster_path")
+            poster = poster if isinstance(poster, str) and poster else None
+            result = search_result(
+                item.get("id"),
+                media_type,
+                item.get(title_field),
+                year_of(item.get(date_field)),
+                f"{TMDB_IMAGE_BASE}/w780{poster}" if poster else None,
+                f"{TMDB_IMAGE_BASE}/w200{poster}" if poster else None,
+                "TMDB",
+            )
+            if result is not None:
+                results.append(result)
+        return results
+
+    return normalize
+
+
+def gamesdb_boxart(images: list[dict]) -> str | None:
+    boxart = [image for image in images if image.get("type") == "boxart"]
+    front = next((image for image in boxart if image.get("side") == "front"), None)
+    filename = (front or (boxart[0] if boxart else {})).get("filename")
+    if not isinstance(filename, str) or not filename:
+        return None
+    if filename.startswith(("http://", "https://")):
+        return filename
+    return f"{GAMESDB_IMAGE_ROUTE}/{filename.lstrip('/')}"
+
+
+def normalize_gamesdb(data: object) -> list[dict]:
+    images = object_at(data, "include", "boxart", "data")
+    results = []
+    for game in object_list(data, "data", "games")[:SEARCH_RESULT_LIMIT]:
+        cover_url = gamesdb_boxart(object_list(images, str(game.get("id"))))
+        result = search_result(
+            game.get("id"),
+            "games",
+            game.get("game_title"),
+            year_of(game.get("release_date")),
+            cover_url,
+            cover_url,
+            "TheGamesDB",
+        )
+        if result is not None:
+            results.append(result)
+    return results
+
+
+def normalize_openlibrary(data: object) -> list[dict]:
+    results = []
+    for doc in object_list(data, "docs")[:SEARCH_RESULT_LIMIT]:
+        key = doc.get("key")
+        work_id = key.removeprefix("/works/") if isinstance(key, str) else None
+        cover_id = doc.get("cover_i")
+        cover_id = cover_id if isinstance(cover_id, int) else None
+        authors = object_at(doc, "author_name")
+        if not isinstance(authors, list):
+            authors = []
+        year = doc.get("first_publish_year")
+        result = search_result(
+            f"ol:{work_id or cover_id or doc.get('title')}",
+            "books",
+            doc.get("title"),
+            year if isinstance(year, int) else None,
+            f"{OPENLIBRARY_COVER_BASE}/{cover_id}-L.jpg" if cover_id else None,
+            f"{OPENLIBRARY_COVER_BASE}/{cover_id}-S.jpg" if cover_id else None,
+            "OpenLibrary",
+            ", ".join(name for name in authors if isinstance(name, str)) or None,
+        )
+        if result is not None:
+            results.append(result)
+    return results
+
+
+def itunes_artwork(url: object, size: int) -> str | None:
+    if not isinstance(url, str) or not url:
+        return None
+    return url.replace("100x100", f"{size}x{size}")
+
+
+def normalize_itunes(data: object) -> list[dict]:
+    results = []
+    for album in object_list(data, "results")[:SEARCH_RESULT_LIMIT]:
+        collection = album.get("collectionId")
+        artist = album.get("artistName")
+        result = search_result(
+            f"itunes:{collection}" if isinstance(collection, int) else None,
+            "music",
+            album.get("collectionName"),
+            year_of(album.get("releaseDate")),
+            itunes_artwork(album.get("artworkUrl100"), 600),
+            itunes_artwork(album.get("artworkUrl100"), 200),
+            "iTunes",
+            artist if isinstance(artist, str) else None,
+        )
+        if result is not None:
+            results.append(result)
+    return results
+
+
+SEARCH_SOURCES = {
+    source.name: source
+    for source in (
+        SearchSource(
+            "movies",
+            "tmdb",
+            "3/search/movie",
+            "query",
+            "proxy_tmdb",
+            search_deadline("movies", 4),
+            normalize_tmdb("movies"),
+        ),
+        SearchSource(
+            "tv",
+            "tmdb",
+            "3/search/tv",
+            "query",
+            "proxy_tmdb",
+            search_deadline("tv", 4),
+            normalize_tmdb("tv"),
+        ),
+        SearchSource(
+            "games",
+            "gamesdb",
+            "v1/Games/ByGameName",
+            "name",
+            "proxy_gamesdb",
+            search_deadline("games", 5),
+            normalize_gamesdb,
+            (("include", "boxart"),),
+        ),
+        SearchSource(
+            "books",
+            "openlibrary",
+            "search.json",
+            "q",
+            "proxy_openlibrary",
+            search_deadline("books", 6),
+            normalize_openlibrary,
+            (("limit", str(SEARCH_RESULT_LIMIT)),),
+        ),
+        SearchSource(
+            "music",
+            "itunes",
+            "search",
+            "term",
+            "proxy_itunes",
+            search_deadline("music", 4),
+            normalize_itunes,
+            (
+                ("media", "music"),
+                ("entity", "album"),
+                ("limit", str(SEARCH_RESULT_LIMIT)),
+            ),
+            default=False,
+        ),
+    )
+}
+
+
+def parse_search_sources(value: str | None) -> list[SearchSource]:
+    if not value:
+        return [source for source in SEARCH_SOURCES.values() if source.default]
+    sources = []
+    for name in dict.fromkeys(part.strip() for part in value.split(",")):
+        source = SEARCH_SOURCES.get(name)
+        if source is None:
+            raise ValueError(f"Unknown search source {name!r}")
+        sources.append(source)
+    return sources
+
+
+def parse_search_query(value: str | None) -> str:
+    query = (value or "").strip()
+    if not query:
+        raise ValueError("q must be a non-empty string")
+    if len(query) > SEARCH_MAX_QUERY_LENGTH:
+        raise ValueError("q is too long")
+    return query
+
+
+def search_outcome(
+    source: SearchSource, status: int, body: bytes, cache_state: str
+) -> dict:
+    outcome = {"source": source.name, "cache": cache_state}
+    if status != 200:
+        return {**outcome, "status": SEARCH_ERROR, "error": f"Upstream {status}"}
+    try:
+        results = source.normalize(json_loads(body))
+    except ValueError as exc:
+        return {**outcome, "status": SEARCH_ERROR, "error": str(exc)}
+    return {**outcome, "status": SEARCH_OK, "results": results}
+
+
+def search_failure(source: SearchSource, exc: OSError | ValueError) -> dict:
+    if isinstance(exc, UpstreamUnavailable):
+        return {
+            "source": source.name,
+            "status": SEARCH_UNAVAILABLE,
+            "retryAfter": exc.retry_after,
+        }
+    if isinstance(exc, (TimeoutError, requests.exceptions.Timeout)):
+        return {"source": source.name, "status": SEARCH_TIMEOUT}
+    return {"source": source.name, "status": SEARCH_ERROR, "error": str(exc)}
+
+
+def search_line(outcome: dict, elapsed: float) -> bytes:
+    return json_dumps({**outcome, "elapsedMs": round(elapsed * 1000)}) + b"\n"
+
+
+class SearchFanout[Leg: Hashable]:
+    # Front-ends start and wait on the legs and charge the rate limit
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.pending: dict[Leg, SearchSource] = {}
+
+    def start(self, leg: Leg, source: SearchSource) -> None:
+        self.pending[leg] = source
+
+    def rate_limited(self, source: SearchSource) -> bytes:
+        return search_line({"source": source.name, "status": SEARCH_RATE_LIMITED}, 0)
+
+    def timeout(self) -> float:
+        deadline = min(
+            self.started + source.deadline for source in self.pending.values()
+        )
+        return max(0, deadline - time.perf_counter())
+
+    # Returns the line and the source to charge, if the leg called upstream
+    def finish(self, leg: Leg, outcome: dict) -> tuple[bytes, SearchSource | None]:
+        source = self.pending.pop(leg)
+        line = search_line(outcome, time.perf_counter() - self.started)
+        return line, source if outcome.get("cache") != "HIT" else None
+
+    # Late legs keep running and still fill the response cache
+    def expire(self) -> list[tuple[bytes, SearchSource]]:
+        now = time.perf_counter()
+        expired = []
+        for leg, source in list(self.pending.items()):
+            if self.started + source.deadline <= now:
+                del self.pending[leg]
+                outcome = {"source": source.name, "status": SEARCH_TIMEOUT}
+                expired.append((search_line(outcome, now - self.started), source))
+        return expired
+
+    def done(self) -> bytes:
+        return search_line({"status": SEARCH_DONE}, time.perf_counter() - self.started)
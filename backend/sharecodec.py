@@ -0,0 +1,160 @@
+import base64
+import hashlib
+import os
+import tempfile
+import threading
+from collections.abc import Iterable
+from compression import zstd
+from dataclasses import dataclass
+
+from jsoncodec import json_dumps
+
+SHARE_DICTIONARY_SUFFIX = ".dict"
+SHARE_DICTIONARY_CURRENT = "current"
+SHARE_DICTIONARY_BYTES = 16 * 1024
+SHARE_COMPRESSION_LEVEL = 9
+SHARE_CONTENT_ENCODING = "dcz"
+# RFC 9842: a dcz body is this magic, the dictionary's SHA-256, then one
+# zstd frame compressed against the dictionary as raw content
+DCZ_MAGIC = b"\x5e\x2a\x4d\x18\x20\x00\x00\x00"
+
+
+@dataclass(frozen=True)
+class ShareDictionary:
+    content: bytes
+    digest: str
+    available: str
+    prefix: tuple[zstd.ZstdDict, int]
+
+    @property
+    def dcz_header(self) -> bytes:
+        return DCZ_MAGIC + bytes.fromhex(self.digest)
+
+
+def share_dictionary(content: bytes) -> ShareDictionary:
+    sha256 = hashlib.sha256(content).digest()
+    return ShareDictionary(
+        content=content,
+        digest=sha256.hex(),
+        available=f":{base64.b64encode(sha256).decode('ascii')}:",
+        # Browsers load a dictionary as plain history, so the zstd header the
+        # trainer writes is never parsed as entropy tables on either side
+        prefix=zstd.ZstdDict(content, is_raw=True).as_prefix,
+    )
+
+
+def share_document(slug: str, payload: str, title: str | None) -> bytes:
+    return json_dumps({"slug": slug, "payload": payload, "title": title})
+
+
+def train_share_dictionary(samples: Iterable[bytes], size: int) -> bytes:
+    return zstd.train_dict(list(samples), size).dict_content
+
+
+def write_atomically(path: str, data: bytes) -> None:
+    directory = os.path.dirname(path)
+    with tempfile.NamedTemporaryFile(
+        dir=directory, prefix="dictionary-", suffix=".tmp", delete=False
+    ) as handle:
+        handle.write(data)
+        temporary_path = handle.name
+    os.replace(temporary_path, path)
+
+
+class ShareCodec:
+    def __init__(self, directory: str, level: int = SHARE_COMPRESSION_LEVEL) -> None:
+        self.directory = directory
+        self.level = level
+        self.compressed = 0
+        self.decompressed = 0
+        self.passthrough = 0
+        self._dictionaries: dict[str, ShareDictionary] = {}
+        self._current: ShareDictionary | None = None
+        self._current_identity: tuple[int, int] | None = None
+        self._lock = threading.Lock()
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}{SHARE_DICTIONARY_SUFFIX}")
+
+    def dictionary(self, digest: str) -> ShareDictionary:
+        with self._lock:
+            dictionary = self._dictionaries.get(digest)
+        if dictionary is not None:
+            return dictionary
+        with open(self._path(digest), "rb") as handle:
+            dictionary = share_dictionary(handle.read())
+        if dictionary.digest != digest:
+            raise ValueError(f"Share dictionary {digest} does not match its digest")
+        with self._lock:
+            return self._dictionaries.setdefault(digest, dictionary)
+
+    def current(self) -> ShareDictionary | None:
+        path = os.path.join(self.directory, SHARE_DICTIONARY_CURRENT)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        identity = (stat.st_ino, stat.st_mtime_ns)
+        with self._lock:
+            if identity == self._current_identity:
+                return self._current
+        with open(path, "r", encoding="utf-8") as handle:
+            current = self.dictionary(handle.read().strip())
+        with self._lock:
+            self._current = current
+            self._current_identity = identity
+        return current
+
+    def install(self, content: bytes) -> ShareDictionary:
+        os.makedirs(self.directory, exist_ok=True)
+        dictionary = share_dictionary(content)
+        write_atomically(self._path(dictionary.digest), content)
+        write_atomically(
+            os.path.join(self.directory, SHARE_DICTIONARY_CURRENT),
+            dictionary.digest.encode("ascii"),
+        )
+        return dictionary
+
+    def prune(self, in_use: set[str]) -> int:
+        current = self.current()
+        keep = in_use | ({current.digest} if current else set())
+        removed = 0
+        for name in os.listdir(self.directory):
+            digest, suffix = os.path.splitext(name)
+            if suffix == SHARE_DICTIONARY_SUFFIX and digest not in keep:
+                # Loaded copies stay so frames already in read caches still inflate
+                os.remove(os.path.join(self.directory, name))
+                removed += 1
+        return removed
+
+    def compress(self, document: bytes) -> tuple[bytes, str] | None:
+        dictionary = self.current()
+        if dictionary is None:
+            return None
+        frame = zstd.compress(document, self.level, zstd_dict=dictionary.prefix)
+        with self._lock:
+            self.compressed += 1
+        return frame, dictionary.digest
+
+    def decompress(self, frame: bytes, digest: str) -> bytes:
+        document = zstd.decompress(frame, zstd_dict=self.dictionary(digest).prefix)
+        with self._lock:
+            self.decompressed += 1
+        return document
+
+    def encode(self, frame: bytes, digest: str) -> bytes:
+        body = self.dictionary(digest).dcz_header + frame
+        with self._lock:
+            self.passthrough += 1
+        return body
+
+    def stats(self) -> dict:
+        current = self.current()
+        with self._lock:
+            return {
+                "dictionary": current.digest if current else None,
+                "loaded": len(self._dictionaries),
+                "compressed": self.compressed,
+                "decompressed": self.decompressed,
+                "passthrough": self.passthrough,
+            }
@@ -0,0 +1,565 @@
+import fcntl
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from typing import IO, Protocol
+
+from jsoncodec import json_loads
+from sharecodec import ShareCodec, share_document
+from sqlitedb import SqliteConnections
+
+SHARE_STORE_BACKENDS = ("sqlite", "json")
+SQLITE_MIGRATION_BATCH_SIZE = 5_000
+SQLITE_INSERT_SHARE = (
+    "INSERT INTO shares "
+    "(slug, payload, title, created_at, client_address, user_agent, digest, "
+    "document, dictionary) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(digest) DO NOTHING ON CONFLICT(slug) DO NOTHING"
+)
+# Legacy stores can hold the same grid under several slugs; each keeps its
+# slug, and only the first claims the digest
+SQLITE_IMPORT_SHARE = (
+    "INSERT OR IGNORE INTO shares "
+    "(slug, payload, title, created_at, client_address, user_agent, digest, "
+    "document, dictionary) "
+    "SELECT ?1, ?2, ?3, ?4, ?5, ?6, "
+    "(SELECT ?7 WHERE NOT EXISTS (SELECT 1 FROM shares WHERE digest = ?7)), ?8, ?9"
+)
+SQLITE_SHARE_COLUMNS = (
+    "payload, title, created_at, client_address, user_agent, document, dictionary"
+)
+
+
+class ShareStoreObserver(Protocol):
+    def lock_acquired(self, exclusive: bool, seconds: float) -> None: ...
+
+    def lock_released(self, exclusive: bool, seconds: float) -> None: ...
+
+    def persisted(self, store: str, seconds: float) -> None: ...
+
+
+class ShareStore(Protocol):
+    path: str
+
+    def get(self, slug: str) -> dict | None: ...
+
+    def insert(self, slug: str, record: dict) -> bool: ...
+
+    def find(self, digest: str) -> str | None: ...
+
+    def count(self) -> int: ...
+
+    def items(self) -> Iterator[tuple[str, dict]]: ...
+
+
+@contextmanager
+def acquire_share_store_lock(
+    lock_path: str, exclusive: bool, observer: ShareStoreObserver | None = None
+) -> Iterator[IO[str]]:
+    directory = os.path.dirname(lock_path)
+    if not os.path.isdir(directory):
+        raise FileNotFoundError(f"Missing data directory at {directory}")
+    with open(lock_path, "a", encoding="utf-8") as lock_handle:
+        lock_type = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        started = time.perf_counter()
+        fcntl.flock(lock_handle.fileno(), lock_type)
+        acquired = time.perf_counter()
+        if observer is not None:
+            observer.lock_acquired(exclusive, acquired - started)
+        try:
+            yield lock_handle
+        finally:
+            if observer is not None:
+                observer.lock_released(exclusive, time.perf_counter() - acquired)
+
+
+def share_content_digest(payload: str, title: str | None) -> str:
+    digest = hashlib.sha256(payload.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update((title or "").encode("utf-8"))
+    return digest.hexdigest()
+
+
+def share_store_identity(path: str) -> tuple[int, int, int, int] | None:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def load_share_store(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as handle:
+        data = json.load(handle)
+        if not isinstance(data, dict):
+            raise TypeError("Share store file is invalid")
+        return data
+
+
+def persist_share_store(store: dict, path: str) -> None:
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        raise FileNotFoundError(f"Missing data directory at {directory}")
+    with tempfile.NamedTemporaryFile(
+        mode="w",
+        encoding="utf-8",
+        dir=directory,
+        prefix="share-",
+        suffix=".tmp",
+        delete=False,
+    ) as handle:
+        json.dump(store, handle)
+        temporary_path = handle.name
+    os.replace(temporary_path, path)
+
+
+class JsonShareStore:
+    def __init__(
+        self, path: str, lock_path: str, observer: ShareStoreObserver | None = None
+    ) -> None:
+        self.path = path
+        self.lock_path = lock_path
+        self.observer = observer
+        self.reloads = 0
+        self._snapshot: dict | None = None
+        self._snapshot_identity: tuple[int, int, int, int] | None = None
+        self._snapshot_lock = threading.Lock()
+        self._digests: dict[str, str] = {}
+        self._digests_snapshot: dict | None = None
+
+    def _load_snapshot(self) -> dict:
+        identity = share_store_identity(self.path)
+        with self._snapshot_lock:
+            if self._snapshot is None or identity != self._snapshot_identity:
+                with acquire_share_store_lock(
+                    self.lock_path, exclusive=False, observer=self.observer
+                ):
+                    identity = share_store_identity(self.path)
+                    self._snapshot = load_share_store(self.path)
+                self._snapshot_identity = identity
+                self.reloads += 1
+            return self._snapshot
+
+    def get(self, slug: str) -> dict | None:
+        return self._load_snapshot().get(slug)
+
+    def insert(self, slug: str, record: dict) -> bool:
+        with acquire_share_store_lock(
+            self.lock_path, exclusive=True, observer=self.observer
+        ):
+            store = load_share_store(self.path)
+            if slug in store:
+                return False
+            store[slug] = record
+            started = time.perf_counter()
+            persist_share_store(store, self.path)
+            if self.observer is not None:
+                self.observer.persisted("json", time.perf_counter() - started)
+            identity = share_store_identity(self.path)
+        with self._snapshot_lock:
+            self._snapshot = store
+            self._snapshot_identity = identity
+        return True
+
+    def find(self, digest: str) -> str | None:
+        snapshot = self._load_snapshot()
+        with self._snapshot_lock:
+            if self._digests_snapshot is not snapshot:
+                self._digests = {}
+                for slug, record in snapshot.items():
+                    payload = record.get("payload")
+                    if isinstance(payload, str):
+                        self._digests.setdefault(
+                            share_content_digest(payload, record.get("title")), slug
+                        )
+                self._digests_snapshot = snapshot
+            return self._digests.get(digest)
+
+    def count(self) -> int:
+        return len(self._load_snapshot())
+
+    def items(self) -> Iterator[tuple[str, dict]]:
+        yield from self._load_snapshot().items()
+
+
+class SqliteShareStore:
+    def __init__(
+        self,
+        path: str,
+        observer: ShareStoreObserver | None = None,
+        codec: ShareCodec | None = None,
+    ) -> None:
+        self.path = path
+        self.observer = observer
+        self.codec = codec
+        self._connections = SqliteConnections(path)
+        with self._connection() as connection:
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS shares (
+                    slug TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    title TEXT,
+                    created_at INTEGER NOT NULL,
+                    client_address TEXT,
+                    user_agent TEXT,
+                    digest TEXT,
+                    document BLOB,
+                    dictionary TEXT
+                )
+                """
+            )
+        self._add_digests()
+        self._unique_digests()
+        self._add_documents()
+
+    def _add_digests(self) -> None:
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            columns = {
+                row[1] for row in connection.execute("PRAGMA table_info(shares)")
+            }
+            if "digest" not in columns:
+                connection.execute("ALTER TABLE shares ADD COLUMN digest TEXT")
+        last_rowid = 0
+        while True:
+            rows = connection.execute(
+                "SELECT rowid, payload, title FROM shares "
+                "WHERE rowid > ? AND digest IS NULL ORDER BY rowid LIMIT ?",
+                (last_rowid, SQLITE_MIGRATION_BATCH_SIZE),
+            ).fetchall()
+            if not rows:
+                return
+            with connection:
+                # Duplicates of a grid that already owns its digest stay NULL
+                connection.executemany(
+                    "UPDATE OR IGNORE shares SET digest = ? WHERE rowid = ?",
+                    [
+                        (share_content_digest(payload, title), rowid)
+                        for rowid, payload, title in rows
+                    ],
+                )
+            last_rowid = rows[-1][0]
+
+    def _unique_digests(self) -> None:
+        with self._connection() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            indexes = {
+                row[1]: row[2]
+                for row in connection.execute("PRAGMA index_list(shares)")
+            }
+            if indexes.get("shares_digest"):
+                return
+            # Creates that raced past find() before the index was unique minted
+            # extra slugs for one grid; those keep their slugs but not the digest
+            connection.execute(
+                "UPDATE shares SET digest = NULL WHERE digest IS NOT NULL "
+                "AND rowid NOT IN "
+                "(SELECT MIN(rowid) FROM shares WHERE digest IS NOT NULL GROUP BY digest)"
+            )
+            connection.execute("DROP INDEX IF EXISTS shares_digest")
+            connection.execute("CREATE UNIQUE INDEX shares_digest ON shares (digest)")
+
+    def _add_documents(self) -> None:
+        with self._connection() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            columns = {
+                row[1] for row in connection.execute("PRAGMA table_info(shares)")
+            }
+            if "document" not in columns:
+                connection.execute("ALTER TABLE shares ADD COLUMN document BLOB")
+            if "dictionary" not in columns:
+                connection.execute("ALTER TABLE shares ADD COLUMN dictionary TEXT")
+
+    def _connection(self) -> sqlite3.Connection:
+        return self._connections.get()
+
+    def _row(self, slug: str, record: dict) -> tuple:
+        row = share_record_row(slug, record)
+        if self.codec is None:
+            return row
+        compressed = self.codec.compress(share_document(slug, row[1], row[2]))
+        if compressed is None:
+            return row
+        # The served document carries the payload; the column stays NOT NULL
+        return (row[0], "", *row[2:7], *compressed)
+
+    def _payload(self, slug: str, record: dict) -> dict:
+        document = record.pop("document", None)
+        dictionary = record.pop("dictionary", None)
+        if document is not None:
+            if self.codec is None:
+                raise RuntimeError(f"Share {slug} is compressed but no codec is set")
+            record["payload"] = json_loads(self.codec.decompress(document, dictionary))[
+                "payload"
+            ]
+        return record
+
+    def get(self, slug: str) -> dict | None:
+        row = (
+            self._connection()
+            .execute(
+                f"SELECT {SQLITE_SHARE_COLUMNS} FROM shares WHERE slug = ?", (slug,)
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return share_record_from_row(row)
+
+    def insert(self, slug: str, record: dict) -> bool:
+        row = self._row(slug, record)
+        started = time.perf_counter()
+        with self._connection() as connection:
+            cursor = connection.execute(SQLITE_INSERT_SHARE, row)
+        if self.observer is not None:
+            self.observer.persisted("sqlite", time.perf_counter() - started)
+        return cursor.rowcount == 1
+
+    def find(self, digest: str) -> str | None:
+        row = (
+            self._connection()
+            .execute("SELECT slug FROM shares WHERE digest = ?", (digest,))
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def insert_many(self, records: Iterable[tuple[str, dict]]) -> int:
+        inserted = 0
+        batch: list[tuple] = []
+        connection = self._connection()
+        for slug, record in records:
+            batch.append(self._row(slug, record))
+            if len(batch) >= SQLITE_MIGRATION_BATCH_SIZE:
+                inserted += self._insert_batch(connection, batch)
+                batch = []
+        if batch:
+            inserted += self._insert_batch(connection, batch)
+        return inserted
+
+    def _insert_batch(self, connection: sqlite3.Connection, batch: list[tuple]) -> int:
+        with connection:
+            before = connection.total_changes
+            connection.executemany(SQLITE_IMPORT_SHARE, batch)
+            return connection.total_changes - before
+
+    def vacuum(self) -> None:
+        connection = self._connection()
+        connection.execute("VACUUM")
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def count(self) -> int:
+        row = self._connection().execute("SELECT COUNT(*) FROM shares").fetchone()
+        return row[0]
+
+    def is_empty(self) -> bool:
+        row = self._connection().execute("SELECT 1 FROM shares LIMIT 1").fetchone()
+        return row is None
+
+    def items(self) -> Iterator[tuple[str, dict]]:
+        cursor = self._connection().execute(
+            f"SELECT slug, {SQLITE_SHARE_COLUMNS} FROM shares ORDER BY rowid"
+        )
+        for row in cursor:
+            yield row[0], self._payload(row[0], share_record_from_row(row[1:]))
+
+    def documents(self, limit: int) -> Iterator[bytes]:
+        cursor = self._connection().execute(
+            f"SELECT slug, {SQLITE_SHARE_COLUMNS} FROM shares "
+            "ORDER BY rowid DESC LIMIT ?",
+            (limit,),
+        )
+        for row in cursor:
+            record = self._payload(row[0], share_record_from_row(row[1:]))
+            yield share_document(row[0], record["payload"], record["title"])
+
+    def dictionaries(self) -> set[str]:
+        rows = self._connection().execute(
+            "SELECT DISTINCT dictionary FROM shares WHERE dictionary IS NOT NULL"
+        )
+        return {row[0] for row in rows}
+
+    def recompress(self) -> int:
+        # Rewrites every share not yet compressed against the current
+        # dictionary, a batch per transaction so readers are never blocked long
+        current = self.codec.current() if self.codec is not None else None
+        if current is None:
+            return 0
+        connection = self._connection()
+        recompressed = 0
+        last_rowid = 0
+        while True:
+            rows = connection.execute(
+                f"SELECT rowid, slug, {SQLITE_SHARE_COLUMNS} FROM shares "
+                "WHERE rowid > ? AND dictionary IS NOT ? ORDER BY rowid LIMIT ?",
+                (last_rowid, current.digest, SQLITE_MIGRATION_BATCH_SIZE),
+            ).fetchall()
+            if not rows:
+                return recompressed
+            updates = []
+            for rowid, slug, *columns in rows:
+                record = self._payload(slug, share_record_from_row(tuple(columns)))
+                row = self._row(slug, record)
+                updates.append((row[1], row[7], row[8], rowid))
+            with connection:
+                connection.executemany(
+                    "UPDATE shares SET payload = ?, document = ?, dictionary = ? "
+                    "WHERE rowid = ?",
+                    updates,
+                )
+            recompressed += len(updates)
+            last_rowid = rows[-1][0]
+
+
+class ShareReadCache:
+    def __init__(self, store: ShareStore, max_entries: int) -> None:
+        if max_entries < 1:
+            raise ValueError("Share read cache needs at least one entry")
+        self.store = store
+        self.path = store.path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._identity: tuple[int, int, int, int] | None = None
+        # Shares are immutable and SQLite rows are evicted with forget(); only
+        # a JSON store rewritten by another process invalidates the whole cache
+        self._watches_file = isinstance(store, JsonShareStore)
+        self._lock = threading.Lock()
+
+    def get(self, slug: str) -> dict | None:
+        identity = share_store_identity(self.path) if self._watches_file else None
+        with self._lock:
+            if identity != self._identity:
+                self._entries.clear()
+                self._identity = identity
+                self.invalidations += 1
+            record = self._entries.get(slug)
+            if record is not None:
+                self._entries.move_to_end(slug)
+                self.hits += 1
+                return record
+            self.misses += 1
+
+        record = self.store.get(slug)
+        if record is None:
+            return None
+        with self._lock:
+            if identity == self._identity:
+                self._entries[slug] = record
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return record
+
+    def forget(self, slug: str) -> None:
+        with self._lock:
+            self._entries.pop(slug, None)
+
+    def insert(self, slug: str, record: dict) -> bool:
+        return self.store.insert(slug, record)
+
+    def find(self, digest: str) -> str | None:
+        return self.store.find(digest)
+
+    def count(self) -> int:
+        return self.store.count()
+
+    def items(self) -> Iterator[tuple[str, dict]]:
+        return self.store.items()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+        if isinstance(self.store, JsonShareStore):
+            stats["reloads"] = self.store.reloads
+        return stats
+
+
+def share_record_from_row(row: tuple) -> dict:
+    payload, title, created_at, client_address, user_agent, document, dictionary = row
+    record = {
+        "payload": payload,
+        "createdAt": created_at,
+        "title": title,
+        "clientAddress": client_address,
+        "userAgent": user_agent,
+    }
+    if document is not None:
+        # Left compressed so the read cache holds frames; the share route
+        # serves or inflates them per request
+        record["payload"] = None
+        record["document"] = document
+        record["dictionary"] = dictionary
+    return record
+
+
+def share_record_row(slug: str, record: dict) -> tuple:
+    payload = record.get("payload")
+    if not isinstance(payload, str):
+        raise TypeError(f"Share record {slug} payload is invalid")
+    created_at = record.get("createdAt")
+    if not isinstance(created_at, int):
+        raise TypeError(f"Share record {slug} createdAt is invalid")
+    return (
+        slug,
+        payload,
+        record.get("title"),
+        created_at,
+        record.get("clientAddress"),
+        record.get("userAgent"),
+        share_content_digest(payload, record.get("title")),
+        None,
+        None,
+    )
+
+
+def migrate_json_share_store(
+    json_path: str, lock_path: str, target: SqliteShareStore
+) -> int:
+    if not os.path.exists(json_path):
+        return 0
+    with acquire_share_store_lock(lock_path, exclusive=True, observer=target.observer):
+        legacy = load_share_store(json_path)
+        return target.insert_many(legacy.items())
+
+
+def open_share_store(
+    backend: str,
+    json_path: str,
+    database_path: str,
+    lock_path: str,
+    observer: ShareStoreObserver | None = None,
+    codec: ShareCodec | None = None,
+) -> ShareStore:
+    if backend == "json":
+        return JsonShareStore(json_path, lock_path, observer)
+    if backend == "sqlite":
+        store = SqliteShareStore(database_path, observer, codec)
+        if store.is_empty():
+            migrate_json_share_store(json_path, lock_path, store)
+        return store
+    raise ValueError(
+        f"Unknown share store backend {backend!r}; "
+        f"expected one of {', '.join(SHARE_STORE_BACKENDS)}"
+    )
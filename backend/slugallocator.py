@@ -0,0 +1,121 @@
+import hashlib
+import os
+import threading
+from collections.abc import Callable
+
+from sqlitedb import SqliteConnections
+
+SLUG_PERMUTATION_ROUNDS = 4
+
+
+class SlugAllocator:
+    def __init__(
+        self, words: list[str], path: str, existing_shares: Callable[[], int]
+    ) -> None:
+        if len(set(words)) != len(words):
+            raise ValueError("Slug word list contains duplicates")
+        self.words = words
+        self.keyspace = len(words) ** 3
+        self._half_bits = (max(self.keyspace - 1, 1).bit_length() + 1) // 2
+        self._half_mask = (1 << self._half_bits) - 1
+        self.allocated = 0
+        self.collisions = 0
+        self._counter_lock = threading.Lock()
+        self._connections = SqliteConnections(path)
+        with self._connections.get() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS allocator (
+                    id INTEGER PRIMARY KEY,
+                    key BLOB NOT NULL,
+                    cursor INTEGER NOT NULL
+                )
+                """
+            )
+            columns = {
+                row[1] for row in connection.execute("PRAGMA table_info(allocator)")
+            }
+            if "seeded" not in columns:
+                connection.execute("ALTER TABLE allocator ADD COLUMN seeded INTEGER")
+            connection.execute(
+                "INSERT OR IGNORE INTO allocator (id, key, cursor) VALUES (1, ?, 0)",
+                (os.urandom(16),),
+            )
+            self._key, cursor, seeded = connection.execute(
+                "SELECT key, cursor, seeded FROM allocator WHERE id = 1"
+            ).fetchone()
+            if seeded is None:
+                # Shares the cursor did not hand out were drawn at random
+                # before the allocator and occupy the keyspace all the same
+                connection.execute(
+                    "UPDATE allocator SET seeded = ? WHERE id = 1",
+                    (max(0, existing_shares() - cursor),),
+                )
+
+    def _round(self, round_index: int, value: int) -> int:
+        digest = hashlib.blake2b(
+            value.to_bytes(8, "big"),
+            digest_size=8,
+            key=self._key,
+            salt=round_index.to_bytes(16, "big"),
+        ).digest()
+        return int.from_bytes(digest, "big") & self._half_mask
+
+    def _permute_once(self, value: int) -> int:
+        left, right = value >> self._half_bits, value & self._half_mask
+        for round_index in range(SLUG_PERMUTATION_ROUNDS):
+            left, right = right, left ^ self._round(round_index, right)
+        return (left << self._half_bits) | right
+
+    def permute(self, index: int) -> int:
+        # Cycle-walk the Feistel permutation until it lands back inside the keyspace
+        value = self._permute_once(index)
+        while value >= self.keyspace:
+            value = self._permute_once(value)
+        return value
+
+    def slug_at(self, index: int) -> str:
+        count = len(self.words)
+        value = self.permute(index)
+        return "-".join(
+            (
+                self.words[value // (count * count)],
+                self.words[value // count % count],
+                self.words[value % count],
+            )
+        )
+
+    def allocate(self) -> str:
+        with self._connections.get() as connection:
+            (cursor,) = connection.execute(
+                "UPDATE allocator SET cursor = cursor + 1 WHERE id = 1 "
+                "RETURNING cursor - 1"
+            ).fetchone()
+        if cursor >= self.keyspace:
+            raise RuntimeError("Share slug keyspace is exhausted")
+        with self._counter_lock:
+            self.allocated += 1
+        return self.slug_at(cursor)
+
+    def collided(self) -> None:
+        with self._counter_lock:
+            self.collisions += 1
+
+    def stats(self) -> dict:
+        cursor, seeded = (
+            self._connections.get()
+            .execute("SELECT cursor, seeded FROM allocator WHERE id = 1")
+            .fetchone()
+        )
+        used = min(cursor + seeded, self.keyspace)
+        with self._counter_lock:
+            return {
+                "keyspace": self.keyspace,
+                "used": used,
+                "seeded": seeded,
+                "remaining": self.keyspace - used,
+                "occupancy": round(used / self.keyspace, 6),
+                "allocated": self.allocated,
+                "collisions": self.collisions,
+            }
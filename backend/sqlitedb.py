@@ -0,0 +1,30 @@
+import os
+import sqlite3
+import threading
+
+SQLITE_BUSY_TIMEOUT_MS = 5_000
+
+
+class SqliteConnections:
+    def __init__(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"Missing data directory at {directory}")
+        self.path = path
+        self._local = threading.local()
+
+    def get(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+        connection = sqlite3.connect(
+            self.path,
+            timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
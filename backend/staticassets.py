@@ -0,0 +1,128 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from dataclasses import dataclass, field
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_INDEX_PATH = "index.html"
+STATIC_MIN_COMPRESS_BYTES = 1024
+STATIC_COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/javascript",
+    "application/json",
+    "application/manifest+json",
+    "application/wasm",
+    "image/svg+xml",
+)
+STATIC_PRECOMPRESSED_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+# Vite names build output assets/<name>-<hash>.<ext> with an eight-character hash
+HASHED_ASSET_PATTERN = re.compile(r"^assets/.+-[A-Za-z0-9_-]{8}\.[A-Za-z0-9]+$")
+
+
+@dataclass
+class StaticAsset:
+    path: str
+    content_type: str
+    body: bytes
+    etag: str
+    last_modified: float
+    immutable: bool
+    encodings: dict[str, bytes] = field(default_factory=dict)
+
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.startswith(STATIC_COMPRESSIBLE_TYPES)
+
+
+def compress(body: bytes, encoding: str) -> bytes | None:
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=9, mtime=0)
+    if encoding == "br" and brotli is not None:
+        return brotli.compress(body, quality=11)
+    return None
+
+
+def read_file(path: str) -> bytes | None:
+    try:
+        with open(path, "rb") as handle:
+            return handle.read()
+    except FileNotFoundError:
+        return None
+
+
+class StaticManifest:
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.assets: dict[str, StaticAsset] = {}
+        self.precompressed = 0
+        self.compressed = 0
+        self._build()
+
+    def _build(self) -> None:
+        if not os.path.isdir(self.directory):
+            return
+        suffixes = tuple(STATIC_PRECOMPRESSED_SUFFIXES.values())
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                file_path = os.path.join(root, name)
+                if name.endswith(suffixes) and os.path.exists(file_path[:-3]):
+                    continue
+                path = os.path.relpath(file_path, self.directory).replace(os.sep, "/")
+                self.assets[path] = self._load(path, file_path)
+
+    def _load(self, path: str, file_path: str) -> StaticAsset:
+        with open(file_path, "rb") as handle:
+            body = handle.read()
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if content_type.startswith("text/") and "charset" not in content_type:
+            content_type = f"{content_type}; charset=utf-8"
+        asset = StaticAsset(
+            path,
+            content_type,
+            body,
+            hashlib.blake2b(body, digest_size=16).hexdigest(),
+            os.stat(file_path).st_mtime,
+            HASHED_ASSET_PATTERN.match(path) is not None,
+        )
+        for encoding, suffix in STATIC_PRECOMPRESSED_SUFFIXES.items():
+            variant = read_file(file_path + suffix)
+            if variant is not None:
+                self.precompressed += 1
+            elif is_compressible(content_type) and len(body) >= (
+                STATIC_MIN_COMPRESS_BYTES
+            ):
+                variant = compress(body, encoding)
+                if variant is not None:
+                    self.compressed += 1
+            if variant is not None and len(variant) < len(body):
+                asset.encodings[encoding] = variant
+        return asset
+
+    def get(self, path: str) -> StaticAsset | None:
+        return self.assets.get(path)
+
+    def resolve(self, path: str) -> StaticAsset | None:
+        asset = self.assets.get(path)
+        if asset is not None or path.startswith("assets/"):
+            return asset
+        return self.assets.get(STATIC_INDEX_PATH)
+
+    def stats(self) -> dict:
+        return {
+            "files": len(self.assets),
+            "bytes": sum(len(asset.body) for asset in self.assets.values()),
+            "encodedBytes": sum(
+                len(variant)
+                for asset in self.assets.values()
+                for variant in asset.encodings.values()
+            ),
+            "precompressed": self.precompressed,
+            "compressed": self.compressed,
+            "brotli": brotli is not None,
+        }
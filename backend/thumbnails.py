@@ -0,0 +1,114 @@
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+    features = None
+
+THUMBNAIL_WIDTHS = (160, 240, 320, 480, 640)
+THUMBNAIL_FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "avif": ("AVIF", "image/avif", {"quality": 55, "speed": 8}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 82, "optimize": True}),
+}
+# Pillow rejects sources past MAX_IMAGE_PIXELS with an error that is not an
+# OSError; those covers are served unresized like any other undecodable one
+THUMBNAIL_RENDER_ERRORS: tuple[type[Exception], ...] = (
+    FutureTimeoutError,
+    BrokenProcessPool,
+    OSError,
+    ValueError,
+    *((Image.DecompressionBombError,) if Image is not None else ()),
+)
+
+
+def thumbnail_formats() -> tuple[str, ...]:
+    if Image is None or features is None:
+        return ()
+    available = ["webp", "jpeg"] if features.check("webp") else ["jpeg"]
+    if features.check("avif"):
+        available.insert(0, "avif")
+    return tuple(available)
+
+
+def snap_thumbnail_width(width: int) -> int:
+    for candidate in THUMBNAIL_WIDTHS:
+        if width <= candidate:
+            return candidate
+    return THUMBNAIL_WIDTHS[-1]
+
+
+def render_thumbnail(source: bytes, width: int, image_format: str) -> bytes:
+    if Image is None:
+        raise RuntimeError("Pillow is required to render thumbnails")
+    encoder, _, options = THUMBNAIL_FORMATS[image_format]
+    with Image.open(io.BytesIO(source)) as image:
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image.draft("RGB", (width, height))
+        keep_alpha = image_format != "jpeg" and image.mode in ("RGBA", "LA", "P")
+        frame = image.convert("RGBA" if keep_alpha else "RGB")
+        frame.thumbnail((width, frame.height), Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        frame.save(output, encoder, **options)
+        return output.getvalue()
+
+
+class ThumbnailRenderer:
+    def __init__(self, processes: int, queue_depth: int, timeout: float) -> None:
+        self.processes = processes
+        self.timeout = timeout
+        self.rendered = 0
+        self.rejected = 0
+        self.failed = 0
+        self._slots = threading.BoundedSemaphore(queue_depth)
+        self._executor: ProcessPoolExecutor | None = None
+        self._executor_pid: int | None = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("forkserver"),
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def render(self, source: bytes, width: int, image_format: str) -> bytes | None:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            return None
+        try:
+            future = self._get_executor().submit(
+                render_thumbnail, source, width, image_format
+            )
+            variant = future.result(timeout=self.timeout)
+        except THUMBNAIL_RENDER_ERRORS:
+            with self._lock:
+                self.failed += 1
+            return None
+        finally:
+            self._slots.release()
+        with self._lock:
+            self.rendered += 1
+        return variant
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "processes": self.processes,
+                "formats": list(thumbnail_formats()),
+                "rendered": self.rendered,
+                "rejected": self.rejected,
+                "failed": self.failed,
+            }
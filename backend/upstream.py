@@ -0,0 +1,280 @@
+import os
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from circuitbreaker import (
+    BreakerObserver,
+    BreakerPolicy,
+    CircuitBreaker,
+    is_failed_status,
+)
+from upstreamscheduler import SchedulePolicy
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+UPSTREAM_DEFAULT_URLS = {
+    "tmdb": "https://api.themoviedb.org",
+    "openlibrary": "https://openlibrary.org",
+    "gamesdb": "https://api.thegamesdb.net",
+    "gamesdb-images": "https://cdn.thegamesdb.net",
+    "coverart": "https://coverartarchive.org",
+    "googlebooks": "https://books.google.com",
+    "musicbrainz": "https://musicbrainz.org",
+    "itunes": "https://itunes.apple.com",
+}
+UPSTREAM_PROVIDERS = {
+    provider: os.getenv(
+        f"AOIFE_UPSTREAM_{provider.upper().replace('-', '_')}_URL", url
+    ).rstrip("/")
+    for provider, url in UPSTREAM_DEFAULT_URLS.items()
+}
+
+
+@dataclass(frozen=True)
+class UpstreamPolicy:
+    connect_timeout: float
+    read_timeout: float
+    breaker: BreakerPolicy = field(default_factory=BreakerPolicy)
+
+
+def upstream_policy(
+    provider: str, connect_timeout: float, read_timeout: float, slow_seconds: float
+) -> UpstreamPolicy:
+    name = provider.upper().replace("-", "_")
+    return UpstreamPolicy(
+        float(os.getenv(f"AOIFE_UPSTREAM_{name}_CONNECT_TIMEOUT", connect_timeout)),
+        float(os.getenv(f"AOIFE_UPSTREAM_{name}_READ_TIMEOUT", read_timeout)),
+        BreakerPolicy(slow_call_seconds=slow_seconds),
+    )
+
+
+UPSTREAM_POLICIES = {
+    "tmdb": upstream_policy("tmdb", 3.05, 10, 4),
+    "openlibrary": upstream_policy("openlibrary", 3.05, 15, 8),
+    "gamesdb": upstream_policy("gamesdb", 3.05, 10, 5),
+    "gamesdb-images": upstream_policy("gamesdb-images", 3.05, 10, 5),
+    "coverart": upstream_policy("coverart", 3.05, 15, 8),
+    "googlebooks": upstream_policy("googlebooks", 3.05, 10, 5),
+    "musicbrainz": upstream_policy("musicbrainz", 3.05, 10, 5),
+    "itunes": upstream_policy("itunes", 3.05, 10, 5),
+}
+UPSTREAM_QUEUE_DEPTH = int(os.getenv("AOIFE_UPSTREAM_QUEUE_DEPTH", "4"))
+UPSTREAM_QUEUE_WAIT = float(os.getenv("AOIFE_UPSTREAM_QUEUE_WAIT", "4"))
+UPSTREAM_BACKGROUND_QUEUE_WAIT = float(
+    os.getenv("AOIFE_UPSTREAM_BACKGROUND_QUEUE_WAIT", "8")
+)
+
+
+def schedule_policy(provider: str, rate: float, burst: int) -> SchedulePolicy:
+    name = provider.upper().replace("-", "_")
+    return SchedulePolicy(
+        float(os.getenv(f"AOIFE_UPSTREAM_{name}_RATE", rate)),
+        int(os.getenv(f"AOIFE_UPSTREAM_{name}_BURST", burst)),
+        UPSTREAM_QUEUE_DEPTH,
+        UPSTREAM_QUEUE_WAIT,
+        UPSTREAM_BACKGROUND_QUEUE_WAIT,
+    )
+
+
+# Requests per second summed over every worker, a little under the published
+# limits (1/s for MusicBrainz, about 20/min for iTunes) so network jitter never
+# lands two requests in one of their windows
+UPSTREAM_SCHEDULES = {
+    "musicbrainz": schedule_policy("musicbrainz", 0.9, 1),
+    "itunes": schedule_policy("itunes", 18 / 60, 1),
+}
+UPSTREAM_USER_AGENT = os.getenv(
+    "AOIFE_UPSTREAM_USER_AGENT", "aoife (https://github.com/brege/aoife)"
+)
+UPSTREAM_BREAKERS_ENABLED = os.getenv("AOIFE_UPSTREAM_BREAKERS", "1") != "0"
+UPSTREAM_POOL_SIZE = int(os.getenv("AOIFE_UPSTREAM_POOL_SIZE", "8"))
+UPSTREAM_POOL_HOSTS = int(os.getenv("AOIFE_UPSTREAM_POOL_HOSTS", "4"))
+UPSTREAM_ASYNC_CONNECTIONS = int(os.getenv("AOIFE_UPSTREAM_ASYNC_CONNECTIONS", "512"))
+
+UpstreamObserver = Callable[[str, str, float], None]
+
+_SESSIONS: dict[str, requests.Session] = {}
+_SESSIONS_LOCK = threading.Lock()
+_ASYNC_SESSIONS: dict[str, aiohttp.ClientSession] = {}
+_OBSERVERS: list[UpstreamObserver] = []
+_BREAKERS: dict[str, CircuitBreaker] = {}
+_BREAKER_OBSERVERS: list[BreakerObserver] = []
+
+
+def upstream_url(provider: str, path: str) -> str:
+    return f"{UPSTREAM_PROVIDERS[provider]}/{path.lstrip('/')}"
+
+
+def observe_upstream_requests(observer: UpstreamObserver) -> None:
+    _OBSERVERS.append(observer)
+
+
+def notify_upstream_observers(provider: str, status: str, seconds: float) -> None:
+    for observer in _OBSERVERS:
+        observer(provider, status, seconds)
+
+
+def observe_breaker_events(observer: BreakerObserver) -> None:
+    _BREAKER_OBSERVERS.append(observer)
+
+
+def notify_breaker_observers(provider: str, event: str) -> None:
+    for observer in _BREAKER_OBSERVERS:
+        observer(provider, event)
+
+
+def upstream_timeout(provider: str) -> tuple[float, float]:
+    policy = UPSTREAM_POLICIES[provider]
+    return policy.connect_timeout, policy.read_timeout
+
+
+def upstream_breaker(provider: str) -> CircuitBreaker | None:
+    if not UPSTREAM_BREAKERS_ENABLED:
+        return None
+    breaker = _BREAKERS.get(provider)
+    if breaker is not None:
+        return breaker
+    with _SESSIONS_LOCK:
+        breaker = _BREAKERS.get(provider)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                provider,
+                UPSTREAM_POLICIES[provider].breaker,
+                notify_breaker_observers,
+            )
+            _BREAKERS[provider] = breaker
+        return breaker
+
+
+def upstream_breaker_stats() -> dict:
+    return {
+        provider: breaker.stats()
+        for provider in UPSTREAM_POLICIES
+        if (breaker := upstream_breaker(provider)) is not None
+    }
+
+
+def finish_upstream_request(
+    provider: str, status: str, seconds: float, probe: bool
+) -> None:
+    notify_upstream_observers(provider, status, seconds)
+    breaker = upstream_breaker(provider)
+    if breaker is not None:
+        failed = not status.isdigit() or is_failed_status(int(status))
+        breaker.record(failed, seconds, probe)
+
+
+def start_upstream_request(provider: str) -> bool:
+    breaker = upstream_breaker(provider)
+    return breaker.before_request() if breaker is not None else False
+
+
+class ObservedHTTPAdapter(HTTPAdapter):
+    def __init__(
+        self, provider: str, pool_connections: int, pool_maxsize: int, pool_block: bool
+    ) -> None:
+        self.provider = provider
+        super().__init__(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+        )
+
+    def send(self, request, *args, **kwargs) -> requests.Response:
+        probe = start_upstream_request(self.provider)
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = super().send(request, *args, **kwargs)
+            status = str(response.status_code)
+            return response
+        except requests.exceptions.Timeout:
+            status = "timeout"
+            raise
+        finally:
+            finish_upstream_request(
+                self.provider, status, time.perf_counter() - started, probe
+            )
+
+
+def build_upstream_session(
+    pool_size: int, pool_hosts: int, provider: str | None = None
+) -> requests.Session:
+    session = requests.Session()
+    session.headers["User-Agent"] = UPSTREAM_USER_AGENT
+    if provider is None:
+        adapter = HTTPAdapter(
+            pool_connections=pool_hosts, pool_maxsize=pool_size, pool_block=False
+        )
+    else:
+        adapter = ObservedHTTPAdapter(
+            provider,
+            pool_connections=pool_hosts,
+            pool_maxsize=pool_size,
+            pool_block=False,
+        )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def upstream_session(provider: str) -> requests.Session:
+    session = _SESSIONS.get(provider)
+    if session is not None:
+        return session
+    if provider not in UPSTREAM_PROVIDERS:
+        raise ValueError(f"Unknown upstream provider {provider!r}")
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(provider)
+        if session is None:
+            session = build_upstream_session(
+                UPSTREAM_POOL_SIZE, UPSTREAM_POOL_HOSTS, provider
+            )
+            _SESSIONS[provider] = session
+        return session
+
+
+def async_upstream_session(provider: str) -> aiohttp.ClientSession:
+    session = _ASYNC_SESSIONS.get(provider)
+    if session is not None:
+        return session
+    if aiohttp is None:
+        raise RuntimeError("aiohttp is required for the async backend")
+    if provider not in UPSTREAM_PROVIDERS:
+        raise ValueError(f"Unknown upstream provider {provider!r}")
+    connect_timeout, read_timeout = upstream_timeout(provider)
+    session = aiohttp.ClientSession(
+        headers={"User-Agent": UPSTREAM_USER_AGENT},
+        connector=aiohttp.TCPConnector(limit=UPSTREAM_ASYNC_CONNECTIONS),
+        timeout=aiohttp.ClientTimeout(
+            total=None, sock_connect=connect_timeout, sock_read=read_timeout
+        ),
+    )
+    _ASYNC_SESSIONS[provider] = session
+    return session
+
+
+async def close_async_upstream_sessions() -> None:
+    while _ASYNC_SESSIONS:
+        _, session = _ASYNC_SESSIONS.popitem()
+        await session.close()
+
+
+def reset_upstream_sessions() -> None:
+    global _SESSIONS_LOCK
+    _SESSIONS_LOCK = threading.Lock()
+    _SESSIONS.clear()
+    _ASYNC_SESSIONS.clear()
+    _BREAKERS.clear()
+
+
+# Pooled sockets must never be shared between a forked worker and its parent
+os.register_at_fork(after_in_child=reset_upstream_sessions)
@@ -0,0 +1,193 @@
+import asyncio
+import fcntl
+import heapq
+import itertools
+import math
+import os
+import struct
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from circuitbreaker import UpstreamUnavailable
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_HEADER = "X-Aoife-Priority"
+SCHEDULE_DISPATCHED = "dispatched"
+SCHEDULE_REJECTED = "rejected"
+SCHEDULE_EXPIRED = "expired"
+SCHEDULE_POLL_SECONDS = 0.05
+
+ScheduleObserver = Callable[[str, str, float], None]
+
+
+@dataclass(frozen=True)
+class SchedulePolicy:
+    rate: float
+    burst: int = 1
+    queue_depth: int = 4
+    interactive_wait: float = 4.0
+    background_wait: float = 8.0
+
+    def max_wait(self, priority: int) -> float:
+        if priority == PRIORITY_INTERACTIVE:
+            return self.interactive_wait
+        return self.background_wait
+
+
+def request_priority(value: str | None) -> int:
+    if (value or "").strip().lower() == "background":
+        return PRIORITY_BACKGROUND
+    return PRIORITY_INTERACTIVE
+
+
+class PacingBucket:
+    # A token bucket kept as the next free send time in a shared file, so every
+    # gunicorn and uvicorn worker draws from the same allowance per host
+    def __init__(self, path: str, rate: float, burst: int) -> None:
+        self.path = path
+        self.interval = 1 / rate
+        self.tolerance = (max(1, burst) - 1) * self.interval
+
+    def take(self) -> float:
+        # flock belongs to the open file description, so a descriptor per call
+        # keeps threads of one worker apart as well as workers
+        descriptor = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(descriptor, fcntl.LOCK_EX)
+            now = time.time()
+            data = os.pread(descriptor, 8, 0)
+            arrival = struct.unpack("d", data)[0] if len(data) == 8 else now
+            # Only a clock that moved backwards leaves a slot this far ahead
+            if arrival > now + self.tolerance + self.interval:
+                arrival = now
+            arrival = max(arrival, now)
+            if arrival - now > self.tolerance:
+                return arrival - now - self.tolerance
+            os.pwrite(descriptor, struct.pack("d", arrival + self.interval), 0)
+            return 0.0
+        finally:
+            os.close(descriptor)
+
+
+class UpstreamScheduler:
+    def __init__(
+        self,
+        provider: str,
+        policy: SchedulePolicy,
+        bucket_path: str,
+        observer: ScheduleObserver | None = None,
+    ) -> None:
+        self.provider = provider
+        self.policy = policy
+        self.observer = observer
+        self.bucket = PacingBucket(bucket_path, policy.rate, policy.burst)
+        self.counts = {
+            SCHEDULE_DISPATCHED: 0,
+            SCHEDULE_REJECTED: 0,
+            SCHEDULE_EXPIRED: 0,
+        }
+        self.wait_seconds = 0.0
+        self._waiting: list[tuple[int, int]] = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def _record(self, result: str, waited: float) -> None:
+        with self._lock:
+            self.counts[result] += 1
+            if result == SCHEDULE_DISPATCHED:
+                self.wait_seconds += waited
+        if self.observer is not None:
+            self.observer(self.provider, result, waited)
+
+    def _reject(self, result: str, waited: float, delay: float) -> UpstreamUnavailable:
+        self._record(result, waited)
+        return UpstreamUnavailable(self.provider, max(1, math.ceil(delay)))
+
+    def _enqueue(self, priority: int) -> tuple[int, int]:
+        with self._lock:
+            ahead = sum(1 for queued, _ in self._waiting if queued <= priority)
+            # Refuse up front what could not be sent before its deadline
+            if (
+                len(self._waiting) < self.policy.queue_depth
+                and ahead * self.bucket.interval <= self.policy.max_wait(priority)
+            ):
+                ticket = (priority, next(self._sequence))
+                heapq.heappush(self._waiting, ticket)
+                return ticket
+        raise self._reject(SCHEDULE_REJECTED, 0.0, (ahead + 1) * self.bucket.interval)
+
+    def _leave(self, ticket: tuple[int, int]) -> None:
+        with self._lock:
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+
+    def _is_head(self, ticket: tuple[int, int]) -> bool:
+        # Only the head of the queue draws from the bucket, so an interactive
+        # request overtakes background ones that arrived earlier
+        with self._lock:
+            return self._waiting[0] == ticket
+
+    def _settle(
+        self, ticket: tuple[int, int], delay: float, started: float, deadline: float
+    ) -> float:
+        now = time.monotonic()
+        if delay == 0:
+            self._leave(ticket)
+            self._record(SCHEDULE_DISPATCHED, now - started)
+            return 0.0
+        if now + delay > deadline:
+            self._leave(ticket)
+            raise self._reject(SCHEDULE_EXPIRED, now - started, delay)
+        return delay
+
+    def acquire(self, priority: int) -> None:
+        started = time.monotonic()
+        ticket = self._enqueue(priority)
+        deadline = started + self.policy.max_wait(priority)
+        try:
+            while True:
+                if self._is_head(ticket):
+                    delay = self.bucket.take()
+                else:
+                    delay = SCHEDULE_POLL_SECONDS
+                if not (delay := self._settle(ticket, delay, started, deadline)):
+                    return
+                time.sleep(delay)
+        except BaseException:
+            self._leave(ticket)
+            raise
+
+    async def acquire_async(self, priority: int) -> None:
+        started = time.monotonic()
+        ticket = self._enqueue(priority)
+        deadline = started + self.policy.max_wait(priority)
+        try:
+            while True:
+                # The bucket's flock can wait on other workers; keep it off the loop
+                if self._is_head(ticket):
+                    delay = await asyncio.to_thread(self.bucket.take)
+                else:
+                    delay = SCHEDULE_POLL_SECONDS
+                if not (delay := self._settle(ticket, delay, started, deadline)):
+                    return
+                await asyncio.sleep(delay)
+        except BaseException:
+            self._leave(ticket)
+            raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rate": self.policy.rate,
+                "burst": self.policy.burst,
+                "queueDepth": self.policy.queue_depth,
+                "waiting": len(self._waiting),
+                "dispatched": self.counts[SCHEDULE_DISPATCHED],
+                "rejected": self.counts[SCHEDULE_REJECTED],
+                "expired": self.counts[SCHEDULE_EXPIRED],
+                "waitSeconds": round(self.wait_seconds, 3),
+            }
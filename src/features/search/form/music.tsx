@@ -94,7 +94,7 @@ const MusicForm = ({
         fmt: 'json',
         limit: '8',
       });
-      const endpoint = `https://musicbrainz.org/ws/2/artist?${params.toString()}`;
+      const endpoint = `/api/musicbrainz/ws/2/artist?${params.toString()}`;
 
       fetchSuggestions(requestKey, endpoint, parseMusicBrainzArtistSuggestions)
         .then((mapped) => {
@@ -263,8 +263,14 @@ const fetchArtistReleaseGroups = async (
         limit: String(RELEASE_GROUP_PAGE_SIZE),
         offset: String(offset),
       });
-      const endpoint = `https://musicbrainz.org/ws/2/release-group?${params.toString()}`;
-      const response = await fetch(endpoint);
+      const endpoint = `/api/musicbrainz/ws/2/release-group?${params.toString()}`;
+      // Later pages wait behind interactive searches in the backend's queue
+      const response = await fetch(
+        endpoint,
+        offset > 0
+          ? { headers: { 'X-Aoife-Priority': 'background' } }
+          : undefined,
+      );
       if (!response.ok) {
         throw new Error('Release group request failed');
       }
@@ -210,6 +210,35 @@ export const createApiMiddleware = (env: Record<string, string>) => {
         res.writeHead(502, { 'Content-Type': 'application/json' });
         res.end(JSON.stringify({ error: String(error) }));
       });
+    } else if (
+      (path.startsWith('/musicbrainz/') || path.startsWith('/itunes/')) &&
+      req.method === 'GET'
+    ) {
+      const isMusicBrainz = path.startsWith('/musicbrainz/');
+      const targetUrl = isMusicBrainz
+        ? `https://musicbrainz.org${path.replace('/musicbrainz', '')}${url.search}`
+        : `https://itunes.apple.com${path.replace('/itunes', '')}${url.search}`;
+      const musicReq = https.get(
+        targetUrl,
+        { headers: { 'User-Agent': 'aoife (https://github.com/brege/aoife)' } },
+        (musicRes) => {
+          let responseBody = '';
+          musicRes.on('data', (chunk) => {
+            responseBody += chunk;
+          });
+          musicRes.on('end', () => {
+            res.writeHead(musicRes.statusCode || 500, {
+              'Content-Type': 'application/json',
+            });
+            res.end(responseBody);
+          });
+        },
+      );
+
+      musicReq.on('error', (error) => {
+        res.writeHead(502, { 'Content-Type': 'application/json' });
+        res.end(JSON.stringify({ error: String(error) }));
+      });
     } else if (path === '/googlebooks/image' && req.method === 'GET') {
       const volumeId = url.searchParams.get('id');
       const zoomValue = url.searchParams.get('zoom');
@@ -1,5 +1,4 @@
 import axios from 'axios';
-import packageJson from '../../package.json';
 import logger from '../lib/logger';
 import {
   CoverArtArchiveMetadataResponseSchema,
@@ -19,8 +18,23 @@ interface CoverArtSource {
   getThumbnailUrl(release: MusicBrainzRelease): Promise<string | null>;
 }
 
-const appVersion = packageJson.version ?? 'unknown';
-const USER_AGENT = `aoife/${appVersion} (https://github.com/brege/aoife)`;
+// Cover fallbacks wait behind searches in the backend's request queue
+const BACKGROUND_PRIORITY_HEADERS = { 'X-Aoife-Priority': 'background' };
+// Outlasts the backend's background queue wait (8 s) plus its upstream
+// connect and read timeouts, so a paced slot is never abandoned mid-request
+const BACKGROUND_REQUEST_TIMEOUT_MS = 22000;
+
+const apiUrl = (path: string): string => {
+  if (typeof window !== 'undefined') {
+    return path;
+  }
+  const serverBase =
+    process.env.AOIFE_API_BASE || process.env.VITE_DEV_SERVER_ORIGIN;
+  if (!serverBase) {
+    throw new Error('Missing AOIFE_API_BASE or VITE_DEV_SERVER_ORIGIN');
+  }
+  return `${serverBase}${path}`;
+};
 
 const normalizeSearchToken = (value: string): string =>
   value
@@ -88,7 +102,7 @@ class CoverArtArchiveSource implements CoverArtSource {
       id: releaseId,
     });
     const request = axios
-      .get(`/api/coverart/metadata?${params.toString()}`, {
+      .get(apiUrl(`/api/coverart/metadata?${params.toString()}`), {
         timeout: 5000,
         validateStatus: (status) => status >= 200 && status < 600,
       })
@@ -195,14 +209,15 @@ class iTunesSource implements CoverArtSource {
     if (!artist || !album) return null;
 
     try {
-      const response = await axios.get('https://itunes.apple.com/search', {
+      const response = await axios.get(apiUrl('/api/itunes/search'), {
         params: {
           term: `${artist} ${album}`,
           media: 'music',
           entity: 'album',
           limit: 5,
         },
-        timeout: 3000,
+        headers: BACKGROUND_PRIORITY_HEADERS,
+        timeout: BACKGROUND_REQUEST_TIMEOUT_MS,
       });
 
       const parsed = iTunesSearchResponseSchema.parse(response.data);
@@ -335,10 +350,9 @@ export class MusicService extends MediaService {
 
     try {
       const response = await axios.get(
-        `https://musicbrainz.org/ws/2/release/${mbid}`,
+        apiUrl(`/api/musicbrainz/ws/2/release/${mbid}`),
         {
           params: { fmt: 'json', inc: 'artist-credits+labels+release-groups' },
-          headers: { 'User-Agent': USER_AGENT },
           timeout: 5000,
         },
       );
@@ -398,14 +412,13 @@ export class MusicService extends MediaService {
       searchQuery = parts.join(' AND ');
     }
 
-    const response = await axios.get('https://musicbrainz.org/ws/2/release', {
+    const response = await axios.get(apiUrl('/api/musicbrainz/ws/2/release'), {
       params: {
         query: searchQuery,
         fmt: 'json',
         limit: 50,
         inc: 'artist-credits+release-groups+cover-art-archive',
       },
-      headers: { 'User-Agent': USER_AGENT },
       timeout: 5000,
     });
 
@@ -416,14 +429,13 @@ export class MusicService extends MediaService {
   private async searchMusicBrainzReleaseGroup(
     releaseGroupId: string,
   ): Promise<MusicBrainzRelease[]> {
-    const response = await axios.get('https://musicbrainz.org/ws/2/release', {
+    const response = await axios.get(apiUrl('/api/musicbrainz/ws/2/release'), {
       params: {
         query: `rgid:${releaseGroupId}`,
         fmt: 'json',
         limit: 50,
         inc: 'artist-credits+release-groups+cover-art-archive',
       },
-      headers: { 'User-Agent': USER_AGENT },
       timeout: 5000,
     });
 